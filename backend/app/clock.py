@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time as _time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+CLOCKS = ("wall", "virtual")
+
+
+class Clock:
+    """Wall-clock time, sleeps and timers: what the simulator uses unless told otherwise."""
+
+    name = "wall"
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def epoch(self) -> float:
+        return _time.time()
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> Any:
+        """Run ``callback(*args)`` after ``delay`` seconds; the handle returned has ``cancel()``."""
+        return asyncio.get_running_loop().call_later(delay, callback, *args)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"clock": self.name, "now": self.now().isoformat(), "speed": 1.0}
+
+
+class _Timer:
+    __slots__ = ("when", "order", "callback", "args", "loop", "pending", "handle", "cancelled")
+
+    def __init__(
+        self,
+        when: float,
+        order: int,
+        callback: Callable[..., Any],
+        args: tuple,
+        loop: asyncio.AbstractEventLoop,
+        pending: set[_Timer],
+    ):
+        self.when = when
+        self.order = order
+        self.callback = callback
+        self.args = args
+        self.loop = loop
+        # The owning clock's set of timers not yet fired or cancelled.
+        self.pending = pending
+        self.handle: asyncio.TimerHandle | None = None
+        self.cancelled = False
+
+    def __lt__(self, other: _Timer) -> bool:
+        return (self.when, self.order) < (other.when, other.order)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.pending.discard(self)
+        if self.handle is not None:
+            self.handle.cancel()
+
+
+class VirtualClock(Clock):
+    """Simulated time that runs ``speed`` times faster than the wall clock and can jump ahead.
+
+    It starts at ``start`` (epoch seconds, default now). Sleeps and timers are
+    kept against simulated deadlines, so :meth:`advance` and :meth:`set_speed`
+    wake whatever falls due, earliest deadline first, and re-aim the rest.
+    Timers may belong to several event loops (the API loop and the protocol
+    engine thread); each is fired on its own loop.
+    """
+
+    name = "virtual"
+
+    def __init__(self, speed: float = 1.0, start: float | None = None):
+        if speed <= 0:
+            raise ValueError("clock speed must be positive")
+        self.speed = speed
+        self._real_origin = _time.monotonic()
+        self._origin = 0.0
+        self._epoch_origin = _time.time() if start is None else start
+        self._timers: set[_Timer] = set()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self._origin + (_time.monotonic() - self._real_origin) * self.speed
+
+    def epoch(self) -> float:
+        return self._epoch_origin + self.monotonic()
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.epoch(), timezone.utc)
+
+    async def sleep(self, delay: float) -> None:
+        if delay <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        timer = self.call_later(delay, _resolve, future)
+        try:
+            await future
+        finally:
+            timer.cancel()
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> _Timer:
+        timer = _Timer(
+            self.monotonic() + max(0.0, delay), next(self._order), callback, args, asyncio.get_running_loop(), self._timers
+        )
+        self._timers.add(timer)
+        self._arm(timer)
+        return timer
+
+    def advance(self, seconds: float) -> None:
+        """Jump ``seconds`` of simulated time ahead at once."""
+        if seconds < 0:
+            raise ValueError("the clock cannot go backwards")
+        with self._lock:
+            self._origin += seconds
+        self._reschedule()
+
+    def set_speed(self, speed: float) -> None:
+        if speed <= 0:
+            raise ValueError("clock speed must be positive")
+        with self._lock:
+            self._origin = self.monotonic()
+            self._real_origin = _time.monotonic()
+            self.speed = speed
+        self._reschedule()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"clock": self.name, "now": self.now().isoformat(), "speed": self.speed, "pending_timers": len(self._timers)}
+
+    def _arm(self, timer: _Timer) -> None:
+        delay = max(0.0, (timer.when - self.monotonic()) / self.speed)
+        timer.handle = timer.loop.call_later(delay, self._fire, timer)
+
+    def _fire(self, timer: _Timer) -> None:
+        if timer.cancelled:
+            return
+        if timer.when > self.monotonic():
+            # Armed before the clock slowed down.
+            self._arm(timer)
+            return
+        timer.cancelled = True
+        self._timers.discard(timer)
+        timer.callback(*timer.args)
+
+    def _reschedule(self) -> None:
+        timers = sorted(list(self._timers))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        # In deadline order, so timers that fell due together wake in the order they were due.
+        for timer in timers:
+            if timer.loop is running:
+                self._rearm(timer)
+            else:
+                timer.loop.call_soon_threadsafe(self._rearm, timer)
+
+    def _rearm(self, timer: _Timer) -> None:
+        if timer.cancelled:
+            return
+        if timer.handle is not None:
+            timer.handle.cancel()
+        if timer.when <= self.monotonic():
+            self._fire(timer)
+        else:
+            self._arm(timer)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def from_settings(settings: Any) -> Clock:
+    kind = settings.sim_clock
+    if kind not in CLOCKS:
+        raise ValueError(f"unknown clock {kind!r}; expected one of {', '.join(CLOCKS)}")
+    if kind == "wall":
+        return Clock()
+    start = datetime.fromisoformat(settings.sim_clock_start).timestamp() if settings.sim_clock_start else None
+    return VirtualClock(speed=settings.sim_clock_speed, start=start)
+
+
+_current: Clock = Clock()
+# Read these as ``clock.monotonic()`` / ``clock.epoch()``: install() rebinds them,
+# and with the wall clock they are the plain ``time`` functions.
+monotonic: Callable[[], float] = _time.monotonic
+epoch: Callable[[], float] = _time.time
+
+
+def install(clock: Clock) -> None:
+    """Make ``clock`` the time source of everything that reads the module-level functions."""
+    global _current, monotonic, epoch
+    _current = clock
+    if type(clock) is Clock:
+        monotonic, epoch = _time.monotonic, _time.time
+    else:
+        monotonic, epoch = clock.monotonic, clock.epoch
+
+
+def current() -> Clock:
+    return _current
+
+
+def now() -> datetime:
+    return _current.now()
+
+
+async def sleep(delay: float) -> None:
+    await _current.sleep(delay)
+
+
+def call_later(delay: float, callback: Callable[..., Any], *args: Any) -> Any:
+    return _current.call_later(delay, callback, *args)
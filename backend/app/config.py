@@ -22,6 +22,27 @@ class Settings:
     sim_max_sessions: int = 10
     sim_keepalive_timeout_sec: int = 15
     sim_inactivity_keepalive_hint_sec: int = 10
+    sim_stream_buffer: int = 1000
+    sim_workers: int = 0
+    sim_engine: str = "inline"
+    sim_controllers_file: str = ""
+    sim_transport: str = "stream"
+    sim_read_buffer: int = 65536
+    sim_listen_backlog: int = 100
+    sim_capture_keepalive: str = "all"
+    sim_trace_latency: bool = False
+    sim_loop_monitor: bool = True
+    sim_loop_lag_threshold_ms: int = 100
+    sim_ipc_path: str = ""
+    sim_link_buffer_bytes: int = 89811
+    sim_link_timeout_sec: int = 10
+    sim_link_window: int = 1
+    sim_link_ack_timeout_ms: int = 10000
+    sim_link_max_retransmits: int = 3
+    sim_link_queue_limit: int = 1000
+    sim_clock: str = "wall"
+    sim_clock_speed: float = 1.0
+    sim_clock_start: str = ""
 
     data_dir: Path = Path(__file__).resolve().parent.parent / "data"
 
@@ -36,6 +57,15 @@ class Settings:
             except ValueError:
                 return default
 
+        def _float(name: str, default: float) -> float:
+            raw = os.getenv(name)
+            if raw is None:
+                return default
+            try:
+                return float(raw)
+            except ValueError:
+                return default
+
         def _bool(name: str, default: bool) -> bool:
             raw = os.getenv(name)
             if raw is None:
@@ -54,5 +84,26 @@ class Settings:
             sim_max_sessions=_int("SIM_MAX_SESSIONS", 10),
             sim_keepalive_timeout_sec=_int("SIM_KEEPALIVE_TIMEOUT_SEC", 15),
             sim_inactivity_keepalive_hint_sec=_int("SIM_INACTIVITY_KEEPALIVE_HINT_SEC", 10),
+            sim_stream_buffer=_int("SIM_STREAM_BUFFER", 1000),
+            sim_workers=_int("SIM_WORKERS", 0),
+            sim_engine=os.getenv("SIM_ENGINE", "inline").strip().lower(),
+            sim_controllers_file=os.getenv("SIM_CONTROLLERS_FILE", ""),
+            sim_transport=os.getenv("SIM_TRANSPORT", "stream").strip().lower(),
+            sim_read_buffer=_int("SIM_READ_BUFFER", 65536),
+            sim_listen_backlog=_int("SIM_LISTEN_BACKLOG", 100),
+            sim_capture_keepalive=os.getenv("SIM_CAPTURE_KEEPALIVE", "all").strip().lower(),
+            sim_trace_latency=_bool("SIM_TRACE_LATENCY", False),
+            sim_loop_monitor=_bool("SIM_LOOP_MONITOR", True),
+            sim_loop_lag_threshold_ms=_int("SIM_LOOP_LAG_THRESHOLD_MS", 100),
+            sim_ipc_path=os.getenv("SIM_IPC_PATH", ""),
+            sim_link_buffer_bytes=_int("SIM_LINK_BUFFER_BYTES", 89811),
+            sim_link_timeout_sec=_int("SIM_LINK_TIMEOUT_SEC", 10),
+            sim_link_window=_int("SIM_LINK_WINDOW", 1),
+            sim_link_ack_timeout_ms=_int("SIM_LINK_ACK_TIMEOUT_MS", 10000),
+            sim_link_max_retransmits=_int("SIM_LINK_MAX_RETRANSMITS", 3),
+            sim_link_queue_limit=_int("SIM_LINK_QUEUE_LIMIT", 1000),
+            sim_clock=os.getenv("SIM_CLOCK", "wall").strip().lower(),
+            sim_clock_speed=_float("SIM_CLOCK_SPEED", 1.0),
+            sim_clock_start=os.getenv("SIM_CLOCK_START", ""),
         )
 
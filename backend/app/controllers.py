@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any
+
+from .config import Settings
+from .dispatcher import OpenProtocolDispatcher
+from .engine import ProtocolEngine
+from .generator import TighteningGenerator
+from .metrics import ProtocolMetrics
+from .mid_catalog import MidCatalog
+from .payload_layouts import PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES
+from .payloads import CodecRegistry
+from .persistence import PersistenceStore
+from .profiles import ProfileStore
+from .scenarios import ScenarioRunner, ScenarioTimeline
+from .state import SimulatorState
+from .stream import StreamHub
+from .tcp_server import TcpService
+from .types import ScenarioDefinition
+
+DEFAULT_CONTROLLER_ID = "default"
+_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+@dataclass
+class ControllerSpec:
+    id: str
+    classic_port: int
+    actor_port: int
+    viewer_port: int
+    profile: str
+    max_sessions: int
+    name: str = ""
+
+
+def load_controller_specs(path: Path, settings: Settings) -> list[ControllerSpec]:
+    """Read a controllers file.
+
+    Format::
+
+        {
+          "port_base": 5000,
+          "defaults": {"profile": "atlas_pf", "max_sessions": 10},
+          "controllers": [
+            {"id": "st01"},
+            {"id": "st02", "profile": "cleco", "classic_port": 6000, "actor_port": 6001, "viewer_port": 6002}
+          ]
+        }
+
+    Controllers without explicit ports get ``port_base + 3 * index`` (+1 actor, +2 viewer).
+    """
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    defaults = raw.get("defaults", {})
+    port_base = int(raw.get("port_base", settings.classic_port))
+    specs: list[ControllerSpec] = []
+    for index, item in enumerate(raw.get("controllers", [])):
+        merged = {**defaults, **item}
+        controller_id = str(merged.get("id", ""))
+        if not _ID_PATTERN.match(controller_id):
+            raise ValueError(f"invalid controller id {controller_id!r}")
+        classic = int(merged.get("classic_port", port_base + 3 * index))
+        specs.append(
+            ControllerSpec(
+                id=controller_id,
+                name=str(merged.get("name", controller_id)),
+                classic_port=classic,
+                actor_port=int(merged.get("actor_port", classic + 1)),
+                viewer_port=int(merged.get("viewer_port", classic + 2)),
+                profile=str(merged.get("profile", settings.sim_profile)),
+                max_sessions=int(merged.get("max_sessions", settings.sim_max_sessions)),
+            )
+        )
+    if not specs:
+        raise ValueError(f"no controllers declared in {path}")
+    ids = [spec.id for spec in specs]
+    if len(set(ids)) != len(ids):
+        raise ValueError("controller ids must be unique")
+    ports = [p for spec in specs for p in (spec.classic_port, spec.actor_port, spec.viewer_port)]
+    if len(set(ports)) != len(ports):
+        raise ValueError("controller ports must not overlap")
+    return specs
+
+
+def single_controller_spec(settings: Settings) -> ControllerSpec:
+    return ControllerSpec(
+        id=DEFAULT_CONTROLLER_ID,
+        name=settings.app_name,
+        classic_port=settings.classic_port,
+        actor_port=settings.actor_port,
+        viewer_port=settings.viewer_port,
+        profile=settings.sim_profile,
+        max_sessions=settings.sim_max_sessions,
+    )
+
+
+class Controller:
+    """One virtual controller: its own ports, state, sessions and event sources.
+
+    The MID catalog, loaded profiles, payload codecs and compiled scenario
+    timelines are shared between controllers; everything mutable is per controller.
+    """
+
+    def __init__(
+        self,
+        spec: ControllerSpec,
+        *,
+        settings: Settings,
+        catalog: MidCatalog,
+        profiles: ProfileStore,
+        persistence: PersistenceStore,
+        engine: ProtocolEngine,
+        scenarios: dict[str, ScenarioDefinition],
+        timelines: dict[str, ScenarioTimeline] | None = None,
+        codecs: CodecRegistry | None = None,
+    ):
+        self.id = spec.id
+        self.name = spec.name
+        self.engine = engine
+        self.settings = replace(
+            settings,
+            classic_port=spec.classic_port,
+            actor_port=spec.actor_port,
+            viewer_port=spec.viewer_port,
+            sim_profile=spec.profile,
+            sim_max_sessions=spec.max_sessions,
+        )
+        self.catalog = catalog
+        self.profiles = profiles.view(spec.profile)
+        self.stream = StreamHub(buffer_size=settings.sim_stream_buffer)
+        self.state = SimulatorState(
+            catalog=catalog,
+            profiles=self.profiles,
+            persistence=persistence,
+            keepalive_timeout_sec=settings.sim_keepalive_timeout_sec,
+            inactivity_hint_sec=settings.sim_inactivity_keepalive_hint_sec,
+            max_sessions=spec.max_sessions,
+            stream=self.stream,
+            codecs=codecs,
+        )
+        self.dispatcher = OpenProtocolDispatcher(settings=self.settings, catalog=catalog, profiles=self.profiles, state=self.state)
+        self.tcp_service = TcpService(settings=self.settings, state=self.state, dispatcher=self.dispatcher)
+        self.generator = TighteningGenerator(self.publish_events)
+        self.scenario_runner = ScenarioRunner(scenarios, self.publish_event, timelines=timelines)
+
+    async def publish_event(self, event_type: str, payload: dict | None = None) -> dict:
+        return await self.engine.call(self.tcp_service.publish_event, event_type, payload)
+
+    async def publish_events(self, batch: list[tuple[str, dict]]) -> dict:
+        return await self.engine.call(self.tcp_service.publish_events, batch)
+
+    @property
+    def metrics(self) -> ProtocolMetrics:
+        return self.state.metrics
+
+    async def collect_metrics(self) -> None:
+        self.metrics.collect(self.state)
+
+    async def stop_sources(self) -> None:
+        await self.scenario_runner.stop()
+        await self.generator.stop()
+
+    def ports(self) -> dict[str, int]:
+        return {
+            "classic": self.settings.classic_port,
+            "actor": self.settings.actor_port,
+            "viewer": self.settings.viewer_port,
+        }
+
+    def summary(self, sessions: int) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "profile": self.profiles.active_name,
+            "sessions": sessions,
+            "ports": self.ports(),
+        }
+
+
+class ControllerRegistry:
+    """All controllers hosted by this process; the first one is the default."""
+
+    def __init__(
+        self,
+        specs: list[ControllerSpec],
+        *,
+        settings: Settings,
+        catalog: MidCatalog,
+        profiles: ProfileStore,
+        engine: ProtocolEngine,
+        scenarios: dict[str, ScenarioDefinition],
+    ):
+        self.engine = engine
+        self._controllers: dict[str, Controller] = {}
+        timelines: dict[str, ScenarioTimeline] | None = None
+        codecs = CodecRegistry(catalog, PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES)
+        multi = len(specs) > 1
+        for spec in specs:
+            controller_settings = settings
+            if multi and settings.sim_ipc_path:
+                controller_settings = replace(settings, sim_ipc_path=f"{settings.sim_ipc_path}.{spec.id}")
+            controller = Controller(
+                spec,
+                settings=controller_settings,
+                catalog=catalog,
+                profiles=profiles,
+                persistence=PersistenceStore(
+                    enabled=settings.sim_persist,
+                    db_path=_controller_db_path(settings.sim_db_path, spec.id) if multi else settings.sim_db_path,
+                ),
+                engine=engine,
+                scenarios=scenarios,
+                timelines=timelines,
+                codecs=codecs,
+            )
+            timelines = controller.scenario_runner.timelines
+            self._controllers[spec.id] = controller
+        self.default = next(iter(self._controllers.values()))
+
+    def get(self, controller_id: str) -> Controller | None:
+        return self._controllers.get(controller_id)
+
+    def all(self) -> list[Controller]:
+        return list(self._controllers.values())
+
+    def __len__(self) -> int:
+        return len(self._controllers)
+
+    async def start(self) -> None:
+        for controller in self._controllers.values():
+            await controller.tcp_service.start()
+
+    async def stop(self) -> None:
+        for controller in self._controllers.values():
+            await controller.tcp_service.stop()
+
+
+def _controller_db_path(db_path: str, controller_id: str) -> str:
+    path = Path(db_path)
+    return str(path.with_name(f"{path.stem}-{controller_id}{path.suffix}"))
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any
+
+from .metrics import Histogram, MetricFamily
+
+LOG = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Stall reports kept per loop.
+MAX_STALLS = 50
+# Innermost frames kept from a blocked loop's stack.
+STACK_DEPTH = 30
+# Innermost frames where a thread is parked rather than running Python code.
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    # uvloop polls in C, so an idle uvloop thread's innermost Python frame is the runner.
+    ("runners.py", "run"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+}
+
+
+class LoopMonitor:
+    """Measures scheduling delay on one event loop and catches what blocks it.
+
+    A task on the monitored loop sleeps for ``interval`` and records how late
+    it woke up. A watchdog thread checks the task's heartbeat; once the loop has
+    been silent for longer than ``threshold`` it samples the loop thread's
+    stack, which points at the synchronous call holding the loop. The stall is
+    completed with its measured duration and logged when the loop comes back.
+    """
+
+    def __init__(self, name: str, *, interval: float = 0.05, threshold: float = 0.1):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram(LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.stalls: deque[dict[str, Any]] = deque(maxlen=MAX_STALLS)
+        self.stall_count = 0
+        self._beat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._pending: dict[str, Any] | None = None
+        self._guard = threading.Lock()
+        self._stop = threading.Event()
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+
+    async def start(self) -> None:
+        """Start monitoring the running loop; must be awaited on that loop."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name=f"loop-watchdog-{self.name}", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, 1)
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._guard:
+                stall, self._pending = self._pending, None
+            if stall is not None:
+                stall["duration_ms"] = round((now - stall.pop("_since")) * 1000.0, 1)
+                self.stalls.append(stall)
+                LOG.warning(
+                    "Event loop %r blocked for %.0f ms in:\n%s",
+                    self.name,
+                    stall["duration_ms"],
+                    "".join(stall["stack"]),
+                )
+
+    def _watch(self) -> None:
+        period = min(self.interval, self.threshold / 2)
+        while not self._stop.wait(period):
+            since = self._beat
+            if time.monotonic() - since - self.interval <= self.threshold:
+                continue
+            with self._guard:
+                if self._pending is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                self.stall_count += 1
+                self._pending = {
+                    "detected_at": datetime.now(timezone.utc).isoformat(),
+                    "stack": traceback.format_stack(frame)[-STACK_DEPTH:],
+                    "_since": since + self.interval,
+                }
+
+    def snapshot(self) -> dict[str, Any]:
+        count = self.lag.count
+        return {
+            "loop": self.name,
+            "interval_ms": self.interval * 1000.0,
+            "threshold_ms": self.threshold * 1000.0,
+            "samples": count,
+            "mean_lag_ms": round(self.lag.sum / count * 1000.0, 3) if count else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000.0, 3),
+            "histogram": {
+                ("+Inf" if bound is None else f"{bound * 1000.0:g}ms"): n
+                for bound, n in zip((*self.lag.bounds, None), self.lag.counts)
+            },
+            "stall_count": self.stall_count,
+            "stalls": list(self.stalls),
+        }
+
+
+def loop_metric_families(monitors: list[LoopMonitor]) -> list[MetricFamily]:
+    lag = MetricFamily("opsim_loop_lag_seconds", "histogram", "Event loop scheduling delay.", ("loop",), LAG_BUCKETS)
+    stalls = MetricFamily("opsim_loop_stalls_total", "counter", "Event loop stalls longer than the monitor threshold.", ("loop",))
+    for monitor in monitors:
+        # The monitor's own histogram is rendered under the family; no copy is kept.
+        lag.children[(monitor.name,)] = monitor.lag
+        stalls.labels(monitor.name).inc(monitor.stall_count)
+    return [lag, stalls]
+
+
+class ProfileBusy(RuntimeError):
+    pass
+
+
+class StackSampler:
+    """Sampling CPU profiler over every thread in the process.
+
+    A background thread reads ``sys._current_frames()`` at ``hz`` for a fixed
+    window, so the profiled code runs unmodified and nothing is installed when
+    no profile is running. Only one profile runs at a time.
+    """
+
+    def __init__(self) -> None:
+        self._busy = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._busy.locked()
+
+    def run(self, seconds: float, hz: int = 100, include_idle: bool = False) -> dict[str, Any]:
+        """Sample for ``seconds``; blocking, so call it via ``asyncio.to_thread``."""
+        if not self._busy.acquire(blocking=False):
+            raise ProfileBusy("a profile is already running")
+        try:
+            return self._sample(seconds, 1.0 / hz, include_idle)
+        finally:
+            self._busy.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> dict[str, Any]:
+        own = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                calls.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(calls))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"duration_sec": round(time.monotonic() - started, 3), "samples": samples, "stacks": stacks}
+
+    @staticmethod
+    def collapsed(result: dict[str, Any]) -> str:
+        """Folded stacks (``thread;outer;...;inner count``), as read by flamegraph tools."""
+        return "".join(f"{stack} {count}\n" for stack, count in result["stacks"].most_common())
+
+    @staticmethod
+    def top(result: dict[str, Any], limit: int = 30) -> dict[str, Any]:
+        """Per-function self and total sample counts."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in result["stacks"].items():
+            calls = stack.split(";")[1:]
+            own[calls[-1]] += count
+            for call in set(calls):
+                total[call] += count
+        return {
+            "duration_sec": result["duration_sec"],
+            "samples": result["samples"],
+            "functions": [
+                {"function": name, "self": own[name], "total": count} for name, count in total.most_common(limit)
+            ],
+        }
+
+
+class AllocationTracker:
+    """On-demand ``tracemalloc`` snapshots and diffs against a baseline.
+
+    Tracing only runs between :meth:`start` and :meth:`stop`; the baseline is
+    taken at start and can be moved forward with ``rebase``.
+    """
+
+    def __init__(self) -> None:
+        self._baseline: tracemalloc.Snapshot | None = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = self._take()
+        return self.status()
+
+    def stop(self) -> dict[str, Any]:
+        self._baseline = None
+        tracemalloc.stop()
+        return self.status()
+
+    def status(self) -> dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "active": self.active,
+            "frames": tracemalloc.get_traceback_limit() if self.active else 0,
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+        }
+
+    def snapshot(self, *, limit: int = 20, group_by: str = "lineno", diff: bool = True, rebase: bool = False) -> dict[str, Any]:
+        if not self.active:
+            raise RuntimeError("allocation tracking is not running")
+        snapshot = self._take()
+        if diff and self._baseline is not None:
+            stats = snapshot.compare_to(self._baseline, group_by)
+            top = [
+                {
+                    "site": _site(stat.traceback, group_by),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ]
+        else:
+            top = [
+                {"site": _site(stat.traceback, group_by), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics(group_by)[:limit]
+            ]
+        if rebase:
+            self._baseline = snapshot
+        return {**self.status(), "group_by": group_by, "diff": diff and self._baseline is not None, "top": top}
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+
+def _site(tb: tracemalloc.Traceback, group_by: str) -> str:
+    if group_by == "traceback":
+        return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in reversed(tb))
+    frame = tb[0]
+    return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
@@ -1,14 +1,13 @@
 from __future__ import annotations
 
-import re
-from datetime import datetime, timezone
 from typing import Any
 
 from .config import Settings
+from .linking import LinkedMessage, LinkedPayload
 from .mid_catalog import MidCatalog
 from .profiles import ProfileStore
-from .protocol import ascii_payload, build_message, format_mid_ack_payload, format_mid_error_payload
-from .state import SimulatorState
+from .protocol import build_message, format_mid_ack_payload, format_mid_error_payload
+from .state import SUBSCRIPTION_TARGETS, SimulatorState
 from .types import OpenProtocolMessage, SessionContext
 
 
@@ -30,11 +29,22 @@ REQUEST_TO_REPLY_MAP: dict[str, str] = {
 }
 
 
-def _extract_first_int(data: str, digits: int, default: str) -> str:
-    m = re.search(rf"(\d{{{digits}}})", data)
-    if not m:
-        return default
-    return m.group(1)
+def _padded(value: Any, width: int, default: str) -> str:
+    """A decoded numeric field in the zero-padded form kept in the state domains."""
+    return default if value is None else str(value).rjust(width, "0")
+
+
+def _target_mid(fields: dict[str, Any]) -> str:
+    """The MID named in a MID 0006/0008/0009 request, or an empty string."""
+    return "" if fields.get("mid") is None else f"{fields['mid']:04d}"
+
+
+def _data_reply(mid: str, data: bytes | LinkedPayload, revision: int) -> OpenProtocolMessage | LinkedMessage:
+    """A data message for a request; MID 0900 carries a binary tail and no NUL."""
+    binary = mid == "0900"
+    if isinstance(data, LinkedPayload):
+        return LinkedMessage(mid, revision, data, append_nul=not binary, binary=binary)
+    return build_message(mid=mid, data=data, revision=revision, append_nul=not binary, binary=binary)
 
 
 class OpenProtocolDispatcher:
@@ -52,81 +62,44 @@ class OpenProtocolDispatcher:
         if override:
             return override
         definition = self.catalog.get(mid)
-        return definition.supported_revisions if definition else [1]
-
-    def _build_0002(self, session: SessionContext) -> OpenProtocolMessage:
-        now = datetime.now(timezone.utc).strftime("%Y-%m-%d:%H:%M:%S")
-        controller_name = "OpenProtocolSim".ljust(25)[:25]
-        op_version = "2.16.0".ljust(19)
-        controller_sw = "sim-0.1.0".ljust(19)
-        tool_sw = "sim-tool-0.1".ljust(19)
-        rbu_type = "SIM-RBU".ljust(24)
-        serial = "SIM0000001".ljust(10)
-        system_type = "003"
-        system_subtype = "001"
-        seq_support = "1"
-        linking_support = "1"
-        station_id_10 = "0000000001"
-        station_name = "Simulator Station".ljust(25)[:25]
-        client_id = "1"
-        optional_keepalive = "0"
-
-        data = ascii_payload(
-            "01",
-            "0001",
-            "02",
-            "01",
-            "03",
-            controller_name,
-            "04",
-            "ACT",
-            "05",
-            op_version,
-            "06",
-            controller_sw,
-            "07",
-            tool_sw,
-            "08",
-            rbu_type,
-            "09",
-            serial,
-            "10",
-            system_type,
-            "11",
-            system_subtype,
-            "12",
-            seq_support,
-            "13",
-            linking_support,
-            "14",
-            station_id_10,
-            "15",
-            station_name,
-            "16",
-            client_id,
-            "17",
-            optional_keepalive,
-            "18",
-            now.ljust(19)[:19],
-        )
-        return build_message(mid="0002", data=data, revision=7)
+        if definition is None:
+            return [1]
+        if definition.category == "subscription_start" and mid in SUBSCRIPTION_TARGETS:
+            # A subscription is made at the revision wanted for its data messages (MID 0060 rev 7 for 0061 rev 7).
+            revisions = set(definition.supported_revisions)
+            for target in SUBSCRIPTION_TARGETS[mid]:
+                revisions.update(self._supported_revisions(target))
+            return sorted(revisions)
+        return definition.supported_revisions
+
+    def is_supported(self, mid: str, revision: int) -> bool:
+        """Whether ``mid`` at ``revision`` passes the profile and revision checks of :meth:`dispatch`."""
+        return self._is_mid_supported(mid) and (revision == 0 or revision in self._supported_revisions(mid))
+
+    def accepted_revisions(self, mid: str) -> frozenset[int]:
+        """The revisions of ``mid`` that :meth:`is_supported` accepts; empty when the profile lacks it."""
+        if not self._is_mid_supported(mid):
+            return frozenset()
+        return frozenset((0, *self._supported_revisions(mid)))
+
+    def _build_0002(self, msg: OpenProtocolMessage) -> OpenProtocolMessage:
+        revision = self.state.codecs.revision_for("0002", msg.revision)
+        return build_message(mid="0002", data=self.state.codecs.encode("0002", revision, {}), revision=revision)
 
     async def _apply_simple_command_side_effects(self, msg: OpenProtocolMessage) -> None:
-        data = msg.data_ascii()
+        fields = self.state.codecs.decode(msg.mid, msg.revision, msg.data)
         if msg.mid == "0018":
             domain = await self.state.get_state_domain("pset")
-            domain["selected"] = _extract_first_int(data, 3, domain.get("selected", "001"))
+            domain["selected"] = _padded(fields.get("pset_id"), 3, domain.get("selected", "001"))
             await self.state.update_state_domain("pset", domain)
         elif msg.mid == "0038":
             domain = await self.state.get_state_domain("job")
-            domain["selected"] = _extract_first_int(data, 4, domain.get("selected", "0001"))
+            domain["selected"] = _padded(fields.get("job_id"), 4, domain.get("selected", "0001"))
             await self.state.update_state_domain("job", domain)
         elif msg.mid == "0019":
             domain = await self.state.get_state_domain("pset")
-            try:
-                domain["batch_size"] = int(_extract_first_int(data, 4, "0001"))
-            except ValueError:
-                pass
+            if fields.get("batch_size") is not None:
+                domain["batch_size"] = fields["batch_size"]
             await self.state.update_state_domain("pset", domain)
         elif msg.mid == "0020":
             domain = await self.state.get_state_domain("pset")
@@ -142,7 +115,7 @@ class OpenProtocolDispatcher:
             await self.state.update_state_domain("tool", domain)
         elif msg.mid == "0046":
             domain = await self.state.get_state_domain("tool")
-            domain["primary_tool"] = _extract_first_int(data, 2, "01")
+            domain["primary_tool"] = _padded(fields.get("primary_tool"), 2, "01")
             await self.state.update_state_domain("tool", domain)
         elif msg.mid == "0156":
             domain = await self.state.get_state_domain("identifiers")
@@ -155,16 +128,16 @@ class OpenProtocolDispatcher:
             await self.state.update_state_domain("identifiers", domain)
         elif msg.mid == "0240":
             domain = await self.state.get_state_domain("user_data")
-            domain["records"]["last_download"] = data
+            domain["records"]["last_download"] = fields.get("user_data", "")
             await self.state.update_state_domain("user_data", domain)
         elif msg.mid == "0270":
             await self.state.reset()
         elif msg.mid == "2606":
             domain = await self.state.get_state_domain("mode")
-            domain["selected"] = _extract_first_int(data, 4, domain.get("selected", "0001"))
+            domain["selected"] = _padded(fields.get("mode_id"), 4, domain.get("selected", "0001"))
             await self.state.update_state_domain("mode", domain)
 
-    async def dispatch(self, session: SessionContext, msg: OpenProtocolMessage) -> list[OpenProtocolMessage]:
+    async def dispatch(self, session: SessionContext, msg: OpenProtocolMessage) -> list[OpenProtocolMessage | LinkedMessage]:
         session.touch()
         mid = msg.mid
         definition = self.catalog.get(mid)
@@ -191,16 +164,12 @@ class OpenProtocolDispatcher:
         if mid == "0001":
             if session.communication_started:
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, 97), revision=1)]
-            if session.role.value == "actor":
-                actor_exists = await self.state.actor_active(exclude_session=session.session_id)
-                if actor_exists:
-                    return [build_message(mid="0004", data=format_mid_error_payload(mid, 35), revision=1)]
-            session.communication_started = True
-            return [self._build_0002(session)]
+            if not self.state.start_communication(session):
+                return [build_message(mid="0004", data=format_mid_error_payload(mid, 35), revision=1)]
+            return [self._build_0002(msg)]
 
         if mid == "0003":
-            session.communication_started = False
-            session.subscriptions.clear()
+            self.state.stop_communication(session)
             return [build_message(mid="0005", data=format_mid_ack_payload(mid), revision=1)]
 
         if mid == "9999":
@@ -208,20 +177,21 @@ class OpenProtocolDispatcher:
             return [build_message(mid="9999", data=msg.data, revision=msg.header.revision)]
 
         if mid == "0008":
-            target = _extract_first_int(msg.data_ascii(), 4, "")
+            fields = self.state.codecs.decode(mid, msg.revision, msg.data)
+            target = _target_mid(fields)
             if not target or not self.catalog.contains(target):
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, 73), revision=1)]
-            await self.state.add_subscription(session, target)
+            await self.state.add_subscription(session, target, fields.get("revision") or 1)
             return [build_message(mid="0005", data=format_mid_ack_payload(mid), revision=1)]
 
         if mid == "0009":
-            target = _extract_first_int(msg.data_ascii(), 4, "")
+            target = _target_mid(self.state.codecs.decode(mid, msg.revision, msg.data))
             if target:
                 await self.state.remove_subscription(session, target)
             return [build_message(mid="0005", data=format_mid_ack_payload(mid), revision=1)]
 
         if definition.category == "subscription_start":
-            await self.state.add_subscription(session, mid)
+            await self.state.add_subscription(session, mid, msg.revision)
             return [build_message(mid="0005", data=format_mid_ack_payload(mid), revision=1)]
 
         if definition.category == "subscription_stop":
@@ -229,13 +199,14 @@ class OpenProtocolDispatcher:
             return [build_message(mid="0005", data=format_mid_ack_payload(mid), revision=1)]
 
         if mid == "0006":
-            target = _extract_first_int(msg.data_ascii(), 4, "")
+            fields = self.state.codecs.decode(mid, msg.revision, msg.data)
+            target = _target_mid(fields)
             if not target or not self.catalog.contains(target):
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, 75), revision=1)]
             if not self._is_mid_supported(target):
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, 75), revision=1)]
-            data = await self.state.build_data_for_mid(target)
-            return [build_message(mid=target, data=data, revision=1, append_nul=(target != "0900"), binary=(target == "0900"))]
+            revision = self.state.codecs.revision_for(target, fields.get("revision") or 1)
+            return [_data_reply(target, await self.state.render_data_for_mid(target, revision), revision)]
 
         if definition.category == "request":
             reply_mid = REQUEST_TO_REPLY_MAP.get(mid)
@@ -246,19 +217,11 @@ class OpenProtocolDispatcher:
                     reply_mid = plus_one
             if not reply_mid:
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, 75), revision=1)]
-            data = await self.state.build_data_for_mid(reply_mid)
-            return [
-                build_message(
-                    mid=reply_mid,
-                    data=data,
-                    revision=1,
-                    append_nul=(reply_mid != "0900"),
-                    binary=(reply_mid == "0900"),
-                )
-            ]
+            revision = self.state.codecs.revision_for(reply_mid, msg.revision)
+            return [_data_reply(reply_mid, await self.state.render_data_for_mid(reply_mid, revision), revision)]
 
         if definition.category == "command":
-            allowed, err = await self.state.ensure_command_allowed(session)
+            allowed, err = self.state.ensure_command_allowed(session)
             if not allowed:
                 return [build_message(mid="0004", data=format_mid_error_payload(mid, err), revision=1)]
             await self._apply_simple_command_side_effects(msg)
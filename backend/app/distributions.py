@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional accelerator
+    np = None  # type: ignore[assignment]
+
+
+DISTRIBUTIONS = ("constant", "normal", "uniform", "bernoulli")
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Parameter distribution declared in scenario or generator JSON.
+
+    Accepted specs:
+
+    - a bare number: constant value
+    - ``{"dist": "normal", "mean": 12.0, "std": 0.3, "drift_per_hour": 0.05, "min": 0, "max": 20}``
+    - ``{"dist": "uniform", "low": 90, "high": 130}``
+    - ``{"dist": "bernoulli", "p": 0.98}`` (sampled as booleans)
+    """
+
+    dist: str
+    a: float = 0.0
+    b: float = 0.0
+    drift_per_hour: float = 0.0
+    lo: float = -math.inf
+    hi: float = math.inf
+
+    @property
+    def boolean(self) -> bool:
+        return self.dist == "bernoulli"
+
+    @classmethod
+    def from_spec(cls, spec: Any) -> "Distribution":
+        if isinstance(spec, bool):
+            return cls("bernoulli", a=1.0 if spec else 0.0)
+        if isinstance(spec, (int, float)):
+            return cls("constant", a=float(spec))
+        if not isinstance(spec, dict):
+            raise ValueError(f"invalid distribution spec: {spec!r}")
+        dist = spec.get("dist", "constant")
+        bounds = {
+            "drift_per_hour": float(spec.get("drift_per_hour", 0.0)),
+            "lo": float(spec.get("min", -math.inf)),
+            "hi": float(spec.get("max", math.inf)),
+        }
+        if dist == "constant":
+            return cls(dist, a=float(spec["value"]), **bounds)
+        if dist == "normal":
+            return cls(dist, a=float(spec["mean"]), b=float(spec.get("std", 0.0)), **bounds)
+        if dist == "uniform":
+            return cls(dist, a=float(spec["low"]), b=float(spec["high"]), **bounds)
+        if dist == "bernoulli":
+            p = float(spec["p"])
+            if not 0.0 <= p <= 1.0:
+                raise ValueError(f"bernoulli p must be within [0, 1], got {p}")
+            return cls(dist, a=p)
+        raise ValueError(f"unknown distribution {dist!r}; expected one of {', '.join(DISTRIBUTIONS)}")
+
+    def sample(self, rng: random.Random, times: Sequence[float]) -> list[float]:
+        """Draw one value per entry of ``times`` (seconds since start, used for drift)."""
+        n = len(times)
+        if self.dist == "bernoulli":
+            p = self.a
+            return [1.0 if rng.random() < p else 0.0 for _ in range(n)]
+        if self.dist == "constant":
+            values = [self.a] * n
+        elif self.dist == "normal":
+            mean, std, gauss = self.a, self.b, rng.gauss
+            values = [gauss(mean, std) for _ in range(n)] if std > 0 else [mean] * n
+        else:
+            low, high, uniform = self.a, self.b, rng.uniform
+            values = [uniform(low, high) for _ in range(n)]
+        if self.drift_per_hour:
+            per_sec = self.drift_per_hour / 3600.0
+            values = [v + per_sec * t for v, t in zip(values, times)]
+        if self.lo > -math.inf or self.hi < math.inf:
+            lo, hi = self.lo, self.hi
+            values = [min(hi, max(lo, v)) for v in values]
+        return values
+
+    def sample_array(self, rng: "np.random.Generator", times: "np.ndarray") -> "np.ndarray":
+        """Vectorized :meth:`sample` using a NumPy generator (requires NumPy)."""
+        n = len(times)
+        if self.dist == "bernoulli":
+            return (rng.random(n) < self.a).astype(np.float64)
+        if self.dist == "constant":
+            values = np.full(n, self.a)
+        elif self.dist == "normal":
+            values = rng.normal(self.a, self.b, n) if self.b > 0 else np.full(n, self.a)
+        else:
+            values = rng.uniform(self.a, self.b, n)
+        if self.drift_per_hour:
+            values += times * (self.drift_per_hour / 3600.0)
+        if self.lo > -math.inf or self.hi < math.inf:
+            np.clip(values, self.lo, self.hi, out=values)
+        return values
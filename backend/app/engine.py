@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, TypeVar
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - optional accelerator
+    uvloop = None
+
+LOG = logging.getLogger(__name__)
+
+ENGINE_MODES = ("inline", "thread")
+
+T = TypeVar("T")
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """A fresh event loop, using uvloop when it is installed."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class ProtocolEngine:
+    """Hosts the protocol side (``TcpService`` and ``SimulatorState``) on an event loop.
+
+    In ``inline`` mode the engine shares the API loop, as before. In ``thread``
+    mode it runs a private loop in a dedicated thread: sockets, keepalives and
+    dispatch never wait behind REST handlers or response serialization, and the
+    API reaches state and the TCP service only through :meth:`call`, which
+    schedules the coroutine on the engine loop and awaits its result.
+    """
+
+    def __init__(self, mode: str = "inline"):
+        if mode not in ENGINE_MODES:
+            raise ValueError(f"unknown engine mode {mode!r}; expected one of {', '.join(ENGINE_MODES)}")
+        self.mode = mode
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        return self._loop
+
+    async def start(self, startup: Callable[[], Awaitable[Any]]) -> None:
+        if self.mode == "inline":
+            self._loop = asyncio.get_running_loop()
+            await startup()
+            return
+
+        ready = threading.Event()
+
+        def _run() -> None:
+            loop = new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        self._thread = threading.Thread(target=_run, name="protocol-engine", daemon=True)
+        self._thread.start()
+        await asyncio.to_thread(ready.wait)
+        await self.call(startup)
+        LOG.info("Protocol engine running on a dedicated thread")
+
+    async def stop(self, shutdown: Callable[[], Awaitable[Any]]) -> None:
+        await self.call(shutdown)
+        thread, self._thread = self._thread, None
+        if thread is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            await asyncio.to_thread(thread.join, 5)
+        self._loop = None
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(*args, **kwargs)`` on the engine loop and return its result."""
+        if self._thread is None:
+            return await fn(*args, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), self._loop)
+        return await asyncio.wrap_future(future)
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from . import clock
+from .distributions import Distribution, np
+from .state import EVENT_DEFAULT_MIDS
+
+LOG = logging.getLogger(__name__)
+
+PublishManyFn = Callable[[list[tuple[str, dict[str, Any]]]], Awaitable[dict[str, Any]]]
+
+MAX_CYCLES_PER_TICK = 20000
+# Trace samples are integer hundredths of a newton-metre: MID 0900 carries 16-bit samples
+# and a divisor (PID 02213) to turn them back into torque.
+TRACE_SCALE = 100
+
+
+@dataclass
+class GeneratorStream:
+    """One station/pset producing tightenings at a fixed cadence."""
+
+    station_id: str
+    pset: str
+    rate_per_sec: float
+    torque: Distribution
+    angle: Distribution
+    nok_ratio: float = 0.0
+    outlier_torque_scale: float = 1.25
+    trace_points: int = 0
+    mids: list[str] = field(default_factory=lambda: list(EVENT_DEFAULT_MIDS["tightening"]))
+    emitted: int = 0
+    nok: int = 0
+    # Independent generators for torque, angle, NOK and trace noise, so a value
+    # sequence does not depend on how cycles happen to be split into batches.
+    rngs: tuple[Any, ...] = field(default=(), repr=False)
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> "GeneratorStream":
+        if "rate_per_sec" in raw:
+            rate = float(raw["rate_per_sec"])
+        else:
+            rate = 1.0 / float(raw.get("interval_sec", 1.0))
+        if not rate > 0:
+            raise ValueError("stream rate must be positive")
+        nok_ratio = float(raw.get("nok_ratio", 0.0))
+        if not 0.0 <= nok_ratio <= 1.0:
+            raise ValueError("nok_ratio must be within [0, 1]")
+        return cls(
+            station_id=str(raw.get("station_id", "01")),
+            pset=str(raw.get("pset", "001")),
+            rate_per_sec=rate,
+            torque=Distribution.from_spec(raw.get("torque_nm", {"dist": "normal", "mean": 12.0, "std": 0.2})),
+            angle=Distribution.from_spec(raw.get("angle_deg", {"dist": "normal", "mean": 120.0, "std": 3.0})),
+            nok_ratio=nok_ratio,
+            outlier_torque_scale=float(raw.get("outlier_torque_scale", 1.25)),
+            trace_points=int(raw.get("trace_points", 0)),
+            mids=list(raw.get("mids", EVENT_DEFAULT_MIDS["tightening"])),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "station_id": self.station_id,
+            "pset": self.pset,
+            "rate_per_sec": self.rate_per_sec,
+            "nok_ratio": self.nok_ratio,
+            "trace_points": self.trace_points,
+            "emitted": self.emitted,
+            "nok": self.nok,
+        }
+
+
+class TighteningGenerator:
+    """Continuous synthetic tightening source.
+
+    Every tick, each stream works out how many cycles are due since start,
+    draws their torque/angle/OK/trace values in one vectorized batch (NumPy when
+    available, seeded for reproducibility) and publishes them through the
+    regular batch event path, so state, persistence and pushes behave exactly
+    as for injected events.
+    """
+
+    def __init__(self, publish_many: PublishManyFn):
+        self._publish_many = publish_many
+        self._task: asyncio.Task | None = None
+        self.streams: list[GeneratorStream] = []
+        self.seed: int | None = None
+        self.tick_sec = 0.05
+        self.started_at: datetime | None = None
+        self.batches = 0
+        self.pushed_messages = 0
+        self.last_batch_ms = 0.0
+        self.error: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, config: dict[str, Any]) -> None:
+        streams = [GeneratorStream.from_dict(raw) for raw in config.get("streams", [{}])]
+        if not streams:
+            raise ValueError("generator needs at least one stream")
+        await self.stop()
+        self.streams = streams
+        self.seed = config.get("seed")
+        self.tick_sec = max(0.001, float(config.get("tick_ms", 50)) / 1000.0)
+        self.batches = 0
+        self.pushed_messages = 0
+        self.error = None
+        if np is None:
+            LOG.warning("NumPy unavailable, tightening generator falls back to pure-Python sampling")
+        for index, stream in enumerate(streams):
+            stream.rngs = self._stream_rngs(index)
+        self.started_at = clock.now()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _stream_rngs(self, index: int) -> tuple[Any, ...]:
+        if np is not None:
+            root = np.random.SeedSequence(self.seed).spawn(index + 1)[index]
+            return tuple(np.random.default_rng(child) for child in root.spawn(4))
+        return tuple(random.Random(f"{self.seed}:{index}:{part}") for part in range(4))
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "seed": self.seed,
+            "tick_ms": round(self.tick_sec * 1000.0, 3),
+            "vectorized": np is not None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "cycles": sum(s.emitted for s in self.streams),
+            "batches": self.batches,
+            "pushed_messages": self.pushed_messages,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "error": self.error,
+            "streams": [s.to_dict() for s in self.streams],
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Cycles follow simulated time; ticks stay on the event loop's clock.
+        start = clock.monotonic()
+        next_tick = loop.time()
+        try:
+            while True:
+                elapsed = clock.monotonic() - start
+                batch: list[tuple[str, dict[str, Any]]] = []
+                for stream in self.streams:
+                    due = min(int(elapsed * stream.rate_per_sec) + 1 - stream.emitted, MAX_CYCLES_PER_TICK)
+                    if due > 0:
+                        batch.extend(self._draw(stream, due))
+                if batch:
+                    t0 = time.perf_counter()
+                    result = await self._publish_many(batch)
+                    self.last_batch_ms = (time.perf_counter() - t0) * 1000.0
+                    self.pushed_messages += result.get("pushed_messages", 0)
+                    self.batches += 1
+                # Absolute tick deadlines, same as the scenario runner, so cadence does not drift.
+                next_tick += self.tick_sec
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            LOG.exception("Tightening generator stopped")
+            self.error = str(exc)
+
+    def _draw(self, stream: GeneratorStream, n: int) -> list[tuple[str, dict[str, Any]]]:
+        first = stream.emitted
+        stream.emitted += n
+        if np is not None:
+            columns = self._draw_numpy(stream, first, n)
+        else:
+            columns = self._draw_python(stream, first, n)
+        torques, angles, oks, traces = columns
+        stream.nok += oks.count(False)
+
+        base = {"station_id": stream.station_id, "pset": stream.pset, "mids": stream.mids}
+        events: list[tuple[str, dict[str, Any]]] = []
+        for i in range(n):
+            payload = dict(base)
+            payload["torque_nm"] = torques[i]
+            payload["angle_deg"] = angles[i]
+            payload["ok"] = oks[i]
+            if traces is not None:
+                payload["trace_points"] = traces[i]
+                payload["trace_scale"] = TRACE_SCALE
+            events.append(("tightening", payload))
+        return events
+
+    def _draw_numpy(self, stream: GeneratorStream, first: int, n: int) -> tuple[list, list, list, list | None]:
+        torque_rng, angle_rng, nok_rng, trace_rng = stream.rngs
+        times = np.arange(first, first + n, dtype=np.float64) / stream.rate_per_sec
+        torque = stream.torque.sample_array(torque_rng, times)
+        angle = stream.angle.sample_array(angle_rng, times)
+        nok = nok_rng.random(n) < stream.nok_ratio
+        torque = np.where(nok, torque * stream.outlier_torque_scale, torque)
+        traces = None
+        if stream.trace_points > 0:
+            # Quadratic run-down to the final torque plus small per-point noise.
+            shape = np.linspace(0.0, 1.0, stream.trace_points) ** 2
+            curves = torque[:, None] * shape[None, :] + trace_rng.normal(0.0, 0.02, (n, stream.trace_points)) * torque[:, None]
+            traces = np.rint(np.clip(curves, 0.0, None) * TRACE_SCALE).astype(np.int64).tolist()
+        return np.round(torque, 3).tolist(), np.round(angle, 2).tolist(), (~nok).tolist(), traces
+
+    def _draw_python(self, stream: GeneratorStream, first: int, n: int) -> tuple[list, list, list, list | None]:
+        torque_rng, angle_rng, nok_rng, trace_rng = stream.rngs
+        times = [(first + i) / stream.rate_per_sec for i in range(n)]
+        torque = stream.torque.sample(torque_rng, times)
+        angle = stream.angle.sample(angle_rng, times)
+        oks = [nok_rng.random() >= stream.nok_ratio for _ in range(n)]
+        torque = [t if ok else t * stream.outlier_torque_scale for t, ok in zip(torque, oks)]
+        traces = None
+        if stream.trace_points > 0:
+            steps = max(1, stream.trace_points - 1)
+            shape = [(j / steps) ** 2 for j in range(stream.trace_points)]
+            traces = [
+                [round(max(0.0, t * s + trace_rng.gauss(0.0, 0.02) * t) * TRACE_SCALE) for s in shape]
+                for t in torque
+            ]
+        return [round(t, 3) for t in torque], [round(a, 2) for a in angle], oks, traces
@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from .protocol import split_frames
+from .types import OpenProtocolMessage, SessionContext
+
+if TYPE_CHECKING:
+    from .metrics import ProtocolMetrics
+
+DIRECTIONS = ("both", "rx", "tx")
+FAULTS = ("dropped", "duplicated", "corrupted", "disconnected")
+# Impaired writers stop draining callers while this many bytes wait to be delivered.
+QUEUE_HIGH_WATER = 256 * 1024
+
+
+@dataclass(slots=True, frozen=True)
+class Impairment:
+    """Network faults for a port's or a session's traffic; the defaults impair nothing.
+
+    Rates are per-frame probabilities. Latency, jitter and the frame faults
+    apply to the ``direction`` given; bandwidth and fragmentation only shape
+    what the simulator sends.
+    """
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    bandwidth_bytes_per_sec: int = 0
+    fragment_bytes: int = 0
+    corrupt_rate: float = 0.0
+    drop_rate: float = 0.0
+    duplicate_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    direction: str = "both"
+    seed: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.direction not in DIRECTIONS:
+            raise ValueError(f"unknown direction {self.direction!r}; expected one of {', '.join(DIRECTIONS)}")
+        for name in ("corrupt_rate", "drop_rate", "duplicate_rate", "disconnect_rate"):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                raise ValueError(f"{name} must be between 0 and 1")
+        for name in ("latency_ms", "jitter_ms", "bandwidth_bytes_per_sec", "fragment_bytes"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name} must not be negative")
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> Impairment:
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(raw) - known)
+        if unknown:
+            raise ValueError(f"unknown impairment settings: {', '.join(unknown)}")
+        return cls(**raw)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @property
+    def active(self) -> bool:
+        return self != Impairment(direction=self.direction, seed=self.seed)
+
+    def applies(self, direction: str) -> bool:
+        return self.direction == "both" or self.direction == direction
+
+
+class Impairer:
+    """Applies an :class:`Impairment` to one session and counts what it did."""
+
+    __slots__ = ("session", "config", "scope", "metrics", "rng", "counts", "writer", "_rx", "_rx_due", "_rx_task")
+
+    def __init__(self, session: SessionContext, config: Impairment, scope: str, metrics: ProtocolMetrics | None = None):
+        self.session = session
+        self.config = config
+        # "port" when inherited from the session's listener, "session" when set for it alone.
+        self.scope = scope
+        self.metrics = metrics
+        self.rng = random.Random(config.seed)
+        self.counts = {(direction, fault): 0 for direction in ("rx", "tx") for fault in FAULTS}
+        self.writer: ImpairedWriter | None = None
+        self._rx: deque[tuple[float, Callable[[], Awaitable[None]]]] = deque()
+        self._rx_due = 0.0
+        self._rx_task: asyncio.Task | None = None
+
+    def reconfigure(self, config: Impairment, scope: str) -> None:
+        if config.seed != self.config.seed:
+            self.rng = random.Random(config.seed)
+        self.config, self.scope = config, scope
+
+    def delay(self) -> float:
+        config = self.config
+        if not config.jitter_ms:
+            return config.latency_ms / 1000.0
+        return max(0.0, config.latency_ms + self.rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000.0
+
+    def faults(self, direction: str, raw: bytes) -> list[bytes] | None:
+        """The frames to deliver in place of ``raw``, or None when the connection should drop here."""
+        config, rng = self.config, self.rng
+        if not config.applies(direction):
+            return [raw]
+        if config.disconnect_rate and rng.random() < config.disconnect_rate:
+            self._count(direction, "disconnected")
+            return None
+        if config.drop_rate and rng.random() < config.drop_rate:
+            self._count(direction, "dropped")
+            return []
+        if config.corrupt_rate and rng.random() < config.corrupt_rate:
+            self._count(direction, "corrupted")
+            corrupted = bytearray(raw)
+            corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+            raw = bytes(corrupted)
+        if config.duplicate_rate and rng.random() < config.duplicate_rate:
+            self._count(direction, "duplicated")
+            return [raw, raw]
+        return [raw]
+
+    async def inbound(
+        self, messages: list[OpenProtocolMessage], deliver: Callable[[list[OpenProtocolMessage]], Awaitable[None]]
+    ) -> None:
+        """Impair frames read from the peer and hand what survives to ``deliver``.
+
+        Delayed frames are queued against their arrival time and delivered in
+        order by a task of their own, so reads keep going meanwhile. A batch
+        stays queued until its delivery returns, so later batches, even
+        undelayed ones, wait behind it and never run alongside it.
+        """
+        if not self.config.applies("rx"):
+            await self._deliver_after(0.0, messages, deliver)
+            return
+        impaired: list[OpenProtocolMessage] = []
+        for msg in messages:
+            frames = self.faults("rx", msg.raw)
+            if frames is None:
+                self.disconnect()
+                return
+            for raw in frames:
+                if raw is msg.raw:
+                    impaired.append(msg)
+                else:
+                    # A corrupted frame is framed again; a broken length field or an
+                    # undecodable header (a flipped high bit) loses it.
+                    try:
+                        impaired.extend(split_frames(raw, 0, len(raw))[0])
+                    except ValueError:
+                        continue
+        if impaired:
+            await self._deliver_after(self.delay(), impaired, deliver)
+
+    def stop(self) -> None:
+        if self._rx_task is not None:
+            self._rx_task.cancel()
+            self._rx_task = None
+        self._rx.clear()
+
+    async def _deliver_after(
+        self, delay: float, messages: list[OpenProtocolMessage], deliver: Callable[[list[OpenProtocolMessage]], Awaitable[None]]
+    ) -> None:
+        if not delay and not self._rx:
+            await deliver(messages)
+            return
+        due = max(asyncio.get_running_loop().time() + delay, self._rx_due)
+        self._rx_due = due
+        self._rx.append((due, lambda: deliver(messages)))
+        if self._rx_task is None or self._rx_task.done():
+            self._rx_task = asyncio.create_task(self._receive())
+
+    async def _receive(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._rx
+        while queue:
+            due, deliver = queue[0]
+            wait = due - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await deliver()
+            finally:
+                if queue:
+                    queue.popleft()
+
+    def disconnect(self) -> None:
+        if self.writer is not None:
+            self.writer.abort()
+        else:
+            _abort(self.session.writer)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "scope": self.scope,
+            **self.config.to_dict(),
+            "faults": {f"{direction}_{fault}": count for (direction, fault), count in self.counts.items() if count},
+            "queued_bytes": self.writer.queued_bytes if self.writer is not None else 0,
+            "queued_rx_batches": len(self._rx),
+        }
+
+    def _count(self, direction: str, fault: str) -> None:
+        self.counts[direction, fault] += 1
+        if self.metrics is not None:
+            self.metrics.impaired_frames.labels(direction, fault).inc()
+
+
+class ImpairedWriter:
+    """Session writer that delivers frames late, throttled, split, corrupted, lost or twice.
+
+    Frames are handed to the wrapped writer by a pump task in the order they
+    were written: jitter varies the delay but never reorders a TCP stream.
+    ``drain`` waits while more than ``QUEUE_HIGH_WATER`` bytes are held back.
+    """
+
+    def __init__(self, inner: Any, impairer: Impairer):
+        self.inner = inner
+        self.impairer = impairer
+        self.queued_bytes = 0
+        self._queue: deque[tuple[float, bytes | None]] = deque()
+        self._last_due = 0.0
+        self._pump: asyncio.Task | None = None
+        self._space: asyncio.Event | None = None
+        self._release = False
+
+    @property
+    def transport(self) -> Any:
+        return getattr(self.inner, "transport", None)
+
+    def write(self, data: bytes) -> None:
+        if self.inner.is_closing():
+            return
+        impairer = self.impairer
+        loop = asyncio.get_running_loop()
+        due = max(loop.time() + (impairer.delay() if impairer.config.applies("tx") else 0.0), self._last_due)
+        self._last_due = due
+        messages, consumed = split_frames(data, 0, len(data))
+        chunks = [m.raw for m in messages]
+        if consumed < len(data):
+            chunks.append(data[consumed:])
+        for chunk in chunks:
+            frames = impairer.faults("tx", chunk)
+            if frames is None:
+                # Drop the connection once everything written before this frame is out.
+                self._queue.append((due, None))
+                break
+            for frame in frames:
+                self._queue.append((due, frame))
+                self.queued_bytes += len(frame)
+        if self._pump is None or self._pump.done():
+            self._pump = loop.create_task(self._deliver())
+
+    async def drain(self) -> None:
+        await self.inner.drain()
+        while self.queued_bytes > QUEUE_HIGH_WATER and not self.inner.is_closing():
+            if self._space is None:
+                self._space = asyncio.Event()
+            self._space.clear()
+            await self._space.wait()
+
+    def is_closing(self) -> bool:
+        return self.inner.is_closing()
+
+    def close(self) -> None:
+        self._stop()
+        self.inner.close()
+
+    def abort(self) -> None:
+        self._stop()
+        _abort(self.inner)
+
+    async def wait_closed(self) -> None:
+        await self.inner.wait_closed()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.inner.get_extra_info(name, default)
+
+    def release(self) -> None:
+        """Give the session its plain writer back once the frames held here are delivered."""
+        self._release = True
+        if not self._queue:
+            self._restore()
+
+    def _restore(self) -> None:
+        session = self.impairer.session
+        if session.writer is self:
+            session.writer = self.inner
+        self.impairer.writer = None
+
+    def _stop(self) -> None:
+        if self._pump is not None and self._pump is not asyncio.current_task():
+            self._pump.cancel()
+        self._queue.clear()
+        self.queued_bytes = 0
+        if self._space is not None:
+            self._space.set()
+
+    async def _deliver(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        try:
+            while queue:
+                due, frame = queue[0]
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                queue.popleft()
+                if frame is None:
+                    self.abort()
+                    return
+                await self._send(frame)
+                self.queued_bytes -= len(frame)
+                if self._space is not None and self.queued_bytes <= QUEUE_HIGH_WATER:
+                    self._space.set()
+        except (ConnectionError, OSError):
+            self._stop()
+            return
+        if self._release:
+            self._restore()
+
+    async def _send(self, frame: bytes) -> None:
+        config = self.impairer.config
+        step = config.fragment_bytes or len(frame)
+        for start in range(0, len(frame), step):
+            piece = frame[start : start + step]
+            if self.inner.is_closing():
+                raise ConnectionResetError("Connection lost")
+            self.inner.write(piece)
+            await self.inner.drain()
+            if config.bandwidth_bytes_per_sec:
+                await asyncio.sleep(len(piece) / config.bandwidth_bytes_per_sec)
+            elif start + step < len(frame):
+                # Let the loop flush this fragment on its own before the next one.
+                await asyncio.sleep(0)
+
+
+def attach(session: SessionContext, config: Impairment, scope: str, metrics: ProtocolMetrics | None = None) -> Impairer | None:
+    """Impair ``session`` with ``config`` (replacing any earlier impairment); an inactive config removes it."""
+    if not config.active:
+        detach(session)
+        return None
+    impairer = session.impairment
+    if impairer is None:
+        impairer = session.impairment = Impairer(session, config, scope, metrics)
+    else:
+        impairer.reconfigure(config, scope)
+    writer = impairer.writer
+    if writer is None or session.writer is not writer:
+        if session.writer is not None:
+            impairer.writer = session.writer = ImpairedWriter(session.writer, impairer)
+    else:
+        writer._release = False
+    return impairer
+
+
+def detach(session: SessionContext) -> None:
+    impairer, session.impairment = session.impairment, None
+    if impairer is not None and impairer.writer is not None:
+        # Frames already held back keep their faults; anything written meanwhile passes straight through.
+        impairer.config = Impairment()
+        impairer.writer.release()
+
+
+def disconnect(session: SessionContext) -> None:
+    """Drop the connection at once, as if the network went away."""
+    if session.impairment is not None:
+        session.impairment.disconnect()
+    else:
+        _abort(session.writer)
+
+
+def _abort(writer: Any) -> None:
+    # Reset rather than close: the peer sees the connection vanish with nothing flushed.
+    transport = getattr(writer, "transport", None)
+    with contextlib.suppress(Exception):
+        if transport is not None and hasattr(transport, "abort"):
+            transport.abort()
+        elif writer is not None:
+            writer.close()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+# Per-MID samples kept for the latency breakdown.
+LATENCY_WINDOW = 2000
+
+STAGES = ("framing", "queued", "dispatch", "enqueue", "drain", "total")
+
+
+@dataclass(slots=True)
+class MessageTrace:
+    """``time.perf_counter()`` stamps for one received frame and the replies it caused.
+
+    ``read`` is when its bytes came off the socket and ``framed`` when it was
+    cut out of the receive buffer. Dispatch stamps stay ``None`` for frames
+    answered on the keepalive fast path, and the write stamps stay ``None`` for
+    frames that caused no reply.
+    """
+
+    read: float
+    framed: float
+    dispatch_start: float | None = None
+    dispatch_end: float | None = None
+    enqueued: float | None = None
+    drained: float | None = None
+
+    def offsets_ms(self) -> dict[str, float | None]:
+        """Each stamp in milliseconds after ``read``, for traffic records."""
+        return {
+            "framed": _ms(self.framed - self.read),
+            "dispatch_start": None if self.dispatch_start is None else _ms(self.dispatch_start - self.read),
+            "dispatch_end": None if self.dispatch_end is None else _ms(self.dispatch_end - self.read),
+            "enqueued": None if self.enqueued is None else _ms(self.enqueued - self.read),
+            "drained": None if self.drained is None else _ms(self.drained - self.read),
+        }
+
+    def stages(self) -> tuple[float, ...]:
+        """Seconds spent per entry of :data:`STAGES`; missing steps count as zero."""
+        start = self.dispatch_start if self.dispatch_start is not None else self.framed
+        end = self.dispatch_end if self.dispatch_end is not None else start
+        enqueued = self.enqueued if self.enqueued is not None else end
+        drained = self.drained if self.drained is not None else enqueued
+        return (
+            self.framed - self.read,
+            start - self.framed,
+            end - start,
+            enqueued - end,
+            drained - enqueued,
+            drained - self.read,
+        )
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 3)
+
+
+class LatencyTracker:
+    """Recent per-MID stage timings of received frames, summarized on request."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: dict[str, deque[tuple[float, ...]]] = {}
+
+    def observe(self, mid: str, trace: MessageTrace) -> None:
+        samples = self._samples.get(mid)
+        if samples is None:
+            samples = self._samples[mid] = deque(maxlen=self.window)
+        samples.append(trace.stages())
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+    def summary(self, mid: str | None = None) -> list[dict[str, Any]]:
+        items = []
+        for key in sorted(self._samples):
+            if mid and key != mid:
+                continue
+            samples = list(self._samples[key])
+            items.append(
+                {
+                    "mid": key,
+                    "count": len(samples),
+                    "stages": {name: _stage_summary([s[i] for s in samples]) for i, name in enumerate(STAGES)},
+                }
+            )
+        return items
+
+
+def _stage_summary(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return _ms(ordered[min(len(ordered) - 1, int(p * len(ordered)))])
+
+    return {
+        "mean_ms": _ms(sum(ordered) / len(ordered)),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": _ms(ordered[-1]),
+    }
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable
+
+from . import clock
+from .config import Settings
+from .link_window import LinkLost, LinkWindow
+from .linking import LinkedMessage
+from .metrics import ProtocolMetrics
+from .protocol import build_message, format_mid_error_payload, next_sequence
+from .types import AckMode, OpenProtocolMessage, SessionContext
+
+LOG = logging.getLogger(__name__)
+
+LINK_ACK_MIDS = frozenset({"9997", "9998"})
+FAST_PATH_MIDS = LINK_ACK_MIDS | {"9999"}
+# Distinct keepalive frames whose mirrored reply is kept preformatted.
+KEEPALIVE_CACHE_SIZE = 32
+
+ResendFn = Callable[[SessionContext, list[OpenProtocolMessage]], None]
+KeepaliveCheck = Callable[[SessionContext, OpenProtocolMessage], bool]
+
+
+class LinkLayer:
+    """Session-local protocol handling that needs no simulator state.
+
+    Checks the sequence numbers of received frames and answers them with MID
+    9997/9998, runs each session's :class:`LinkWindow` for what it sends, and
+    answers keepalives. ``TcpService`` uses one for its in-process sessions and
+    every protocol worker one for the connections it accepted.
+    ``keepalive_ok`` says whether a MID 9999 may be mirrored without dispatch;
+    ``resend`` writes the frames a window re-sends after an ACK timeout.
+    """
+
+    def __init__(self, settings: Settings, metrics: ProtocolMetrics, keepalive_ok: KeepaliveCheck, resend: ResendFn):
+        self.settings = settings
+        self.metrics = metrics
+        self.keepalive_ok = keepalive_ok
+        self.resend = resend
+        self._keepalive_replies: dict[bytes, OpenProtocolMessage] = {}
+
+    def window(self, session: SessionContext) -> LinkWindow:
+        window = session.link_window
+        if window is None:
+            settings = self.settings
+            window = session.link_window = LinkWindow(
+                session,
+                size=settings.sim_link_window,
+                ack_timeout=settings.sim_link_ack_timeout_ms / 1000.0,
+                max_retransmits=settings.sim_link_max_retransmits,
+                queue_limit=settings.sim_link_queue_limit,
+            )
+        return window
+
+    def admit(
+        self, session: SessionContext, messages: list[OpenProtocolMessage | LinkedMessage]
+    ) -> list[OpenProtocolMessage | LinkedMessage]:
+        """The frames of ``messages`` that may be written now.
+
+        Outside link-level mode that is all of them. In link-level mode data
+        frames (and the parts of linked messages) pass through the session's
+        :class:`LinkWindow`, which sequences them as they enter it and holds
+        the rest until the peer acknowledges; link ACKs never wait.
+        """
+        if session.ack_mode != AckMode.LINK_LEVEL or not messages:
+            return messages
+        window = self.window(session)
+        admitted: list[OpenProtocolMessage | LinkedMessage] = []
+        try:
+            for msg in messages:
+                if isinstance(msg, LinkedMessage):
+                    admitted.extend(window.submit_parts(msg.parts()))
+                    self.metrics.linked_segmented.inc()
+                elif msg.mid in LINK_ACK_MIDS:
+                    admitted.append(msg)
+                else:
+                    frame = window.submit(msg)
+                    if frame is not None:
+                        admitted.append(frame)
+        except LinkLost as exc:
+            self.lost(session, exc, "backlog")
+            return []
+        self._arm(session, window)
+        return admitted
+
+    def receive(self, session: SessionContext, msg: OpenProtocolMessage) -> tuple[bool, OpenProtocolMessage | None]:
+        """Check the sequence number of a received frame; returns (continue_processing, outbound_ack)."""
+        if not msg.header.has_sequence:
+            session.ack_mode = AckMode.APPLICATION
+            return True, None
+
+        session.ack_mode = AckMode.LINK_LEVEL
+        seq = msg.header.sequence_int
+        expected = session.next_rx_seq
+
+        if seq == expected:
+            next_expected = next_sequence(expected)
+            session.next_rx_seq = next_expected
+            session.last_rx_seq = seq
+            ack = build_message(
+                mid="9997",
+                data=f"{msg.mid}".encode("ascii"),
+                revision=1,
+                sequence_number=next_expected,
+            )
+            session.last_link_ack = ack
+            return True, ack
+
+        if seq == session.last_rx_seq and session.last_link_ack is not None:
+            self.metrics.retransmit_replies.inc()
+            return False, session.last_link_ack
+
+        nack = build_message(
+            mid="9998",
+            data=format_mid_error_payload(msg.mid, 3),
+            revision=1,
+            sequence_number=expected,
+        )
+        session.last_link_ack = nack
+        self.metrics.nack_tx.inc()
+        return False, nack
+
+    def peer_ack(self, session: SessionContext, msg: OpenProtocolMessage) -> list[OpenProtocolMessage]:
+        """Apply a MID 9997/9998 from the peer to the send window; returns the frames to write next."""
+        window = session.link_window
+        if msg.mid == "9997":
+            before = window.acked
+            frames, rtt = window.ack(msg.header.sequence_int)
+            self.metrics.link_acked.inc(window.acked - before)
+            if rtt is not None:
+                self.metrics.link_ack_rtt.observe(rtt)
+        else:
+            try:
+                frames = window.nack()
+            except LinkLost as exc:
+                self.lost(session, exc, "retransmits")
+                return []
+            self.metrics.link_resent_nack.inc(len(frames))
+        self._arm(session, window)
+        return frames
+
+    def leave(self, session: SessionContext) -> list[OpenProtocolMessage]:
+        """Drop the send window of a session that stopped sequencing; returns the frames still queued in it."""
+        window, session.link_window = session.link_window, None
+        return window.close()
+
+    def lost(self, session: SessionContext, exc: LinkLost, reason: str) -> None:
+        LOG.warning("Dropping session %s: %s", session.session_id, exc)
+        self.metrics.link_lost.labels(reason).inc()
+        if session.link_window is not None:
+            session.link_window.close()
+            session.link_window = None
+        if session.writer is not None and not session.writer.is_closing():
+            session.writer.close()
+
+    def fast_path(self, session: SessionContext, msg: OpenProtocolMessage, replies: list[OpenProtocolMessage]) -> bool:
+        """Answer a keepalive or consume a link ACK without dispatch or shared state.
+
+        Appends any reply frames to ``replies`` and returns True when ``msg``
+        was handled; anything else (including keepalives before MID 0001,
+        which must be rejected with error 97) takes the full path.
+        """
+        mid = msg.mid
+        if mid in LINK_ACK_MIDS:
+            # The peer acknowledging our frames: nothing to answer and no receive
+            # sequence to advance, but it may release or re-send frames of ours.
+            if mid == "9998":
+                self.metrics.nack_rx.inc()
+            if session.link_window is not None:
+                replies.extend(self.peer_ack(session, msg))
+            return True
+        if mid != "9999" or not self.keepalive_ok(session, msg):
+            return False
+        if not msg.header.has_sequence:
+            session.ack_mode = AckMode.APPLICATION
+            if session.link_window is not None:
+                replies.extend(self.leave(session))
+            reply = self._keepalive_replies.get(msg.raw)
+            if reply is None:
+                reply = build_message(mid="9999", data=msg.data, revision=msg.header.revision)
+                if len(self._keepalive_replies) < KEEPALIVE_CACHE_SIZE:
+                    self._keepalive_replies[msg.raw] = reply
+            replies.append(reply)
+            return True
+        process, link_ack = self.receive(session, msg)
+        if link_ack:
+            replies.append(link_ack)
+        if process:
+            replies.extend(self.admit(session, [build_message(mid="9999", data=msg.data, revision=msg.header.revision)]))
+        return True
+
+    def _arm(self, session: SessionContext, window: LinkWindow) -> None:
+        # One lazily re-armed timer per session: when it fires early (its frame
+        # was acknowledged meanwhile) it just re-arms for the current deadline.
+        deadline = window.deadline()
+        if window.timer is None and deadline is not None:
+            window.timer = clock.call_later(max(0.0, deadline - clock.monotonic()), self._on_timer, session, window)
+
+    def _on_timer(self, session: SessionContext, window: LinkWindow) -> None:
+        window.timer = None
+        if session.link_window is not window:
+            return
+        try:
+            frames = window.expired()
+        except LinkLost as exc:
+            self.lost(session, exc, "timeout")
+            return
+        if frames:
+            self.metrics.link_resent_timeout.inc(len(frames))
+            self.resend(session, frames)
+        self._arm(session, window)
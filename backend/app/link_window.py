@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Iterator
+
+from . import clock
+from .protocol import next_sequence
+from .types import OpenProtocolMessage, SessionContext
+
+LOG = logging.getLogger(__name__)
+
+# Header bytes 17-18: length (4), MID (4), revision (3), no-ack flag (1), station (2) and spindle (2) come first.
+SEQUENCE_OFFSET = 16
+
+
+class LinkLost(ConnectionError):
+    """The peer stopped acknowledging, or fell too far behind; the session must be dropped."""
+
+
+def previous_sequence(seq: int) -> int:
+    return 99 if seq <= 1 else seq - 1
+
+
+def with_sequence(msg: OpenProtocolMessage, seq: int) -> OpenProtocolMessage:
+    """``msg`` with header sequence number ``seq``, patched into its frame bytes rather than re-encoded."""
+    number = f"{seq:02d}"
+    raw = msg.raw
+    return OpenProtocolMessage(
+        header=replace(msg.header, sequence_number=number),
+        data=msg.data,
+        raw=raw[:SEQUENCE_OFFSET] + number.encode("ascii") + raw[SEQUENCE_OFFSET + 2 :],
+        binary=msg.binary,
+    )
+
+
+@dataclass(slots=True)
+class _InFlight:
+    frame: OpenProtocolMessage
+    sent_at: float
+    attempts: int = 0
+
+
+class LinkWindow:
+    """Outbound side of the link-level (MID 9997/9998) acknowledging of one session.
+
+    At most ``size`` sequenced frames are unacknowledged at a time (the spec
+    allows one); later frames wait in a FIFO queue and are only given their
+    sequence number when they enter the window. The parts of a linked message
+    wait as one queue entry and are pulled from their generator, and so
+    encoded, only as the window admits them. A MID 9997 from the peer
+    carries the next sequence number it expects and acknowledges everything
+    before it. A MID 9998, or no acknowledgement within ``ack_timeout``
+    seconds, re-sends every unacknowledged frame from its stored bytes; after
+    ``max_retransmits`` re-sends, or with more than ``queue_limit`` frames
+    waiting, :class:`LinkLost` is raised. Times are ``clock.monotonic()``
+    seconds, and round trips are only sampled from frames sent once.
+    """
+
+    __slots__ = (
+        "session",
+        "size",
+        "ack_timeout",
+        "max_retransmits",
+        "queue_limit",
+        "timer",
+        "sent",
+        "acked",
+        "retransmits",
+        "srtt",
+        "rttvar",
+        "_in_flight",
+        "_queue",
+    )
+
+    def __init__(
+        self,
+        session: SessionContext,
+        *,
+        size: int = 1,
+        ack_timeout: float = 10.0,
+        max_retransmits: int = 3,
+        queue_limit: int = 1000,
+    ):
+        self.session = session
+        self.size = max(1, min(size, 98))
+        self.ack_timeout = ack_timeout
+        self.max_retransmits = max_retransmits
+        self.queue_limit = queue_limit
+        # Retransmission timer, armed by the owner of the session's writer.
+        self.timer: Any = None
+        self.sent = 0
+        self.acked = 0
+        self.retransmits = 0
+        self.srtt: float | None = None
+        self.rttvar = 0.0
+        self._in_flight: dict[int, _InFlight] = {}
+        self._queue: deque[OpenProtocolMessage | Iterator[OpenProtocolMessage]] = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def has_room(self) -> bool:
+        return not self._queue and len(self._in_flight) < self.size
+
+    def submit(self, msg: OpenProtocolMessage, now: float | None = None) -> OpenProtocolMessage | None:
+        """Sequence ``msg`` and return it if the window has room, else queue it and return None."""
+        if not self.has_room:
+            self._enqueue(msg)
+            return None
+        return self._admit(msg, clock.monotonic() if now is None else now)
+
+    def submit_parts(self, parts: Iterator[OpenProtocolMessage], now: float | None = None) -> list[OpenProtocolMessage]:
+        """Queue the parts of a linked message; returns those admitted straight away."""
+        self._enqueue(parts)
+        return self._release(clock.monotonic() if now is None else now)
+
+    def ack(self, next_expected: int, now: float | None = None) -> tuple[list[OpenProtocolMessage], float | None]:
+        """Handle a MID 9997; returns the queued frames now admitted and a round-trip sample, if any."""
+        acked = previous_sequence(next_expected)
+        if acked not in self._in_flight:
+            # Duplicate or stale acknowledgement.
+            return [], None
+        now = clock.monotonic() if now is None else now
+        rtt = None
+        while self._in_flight:
+            seq, entry = next(iter(self._in_flight.items()))
+            del self._in_flight[seq]
+            self.acked += 1
+            if seq == acked:
+                if entry.attempts == 0:
+                    rtt = now - entry.sent_at
+                    self._observe(rtt)
+                break
+        return self._release(now), rtt
+
+    def nack(self, now: float | None = None) -> list[OpenProtocolMessage]:
+        """Handle a MID 9998: every unacknowledged frame goes out again."""
+        return self._resend(clock.monotonic() if now is None else now)
+
+    def expired(self, now: float | None = None) -> list[OpenProtocolMessage]:
+        """Frames to re-send because the oldest one has waited past the ack timeout."""
+        now = clock.monotonic() if now is None else now
+        deadline = self.deadline()
+        if deadline is None or now < deadline:
+            return []
+        return self._resend(now)
+
+    def deadline(self) -> float | None:
+        if not self._in_flight:
+            return None
+        return min(entry.sent_at for entry in self._in_flight.values()) + self.ack_timeout
+
+    def close(self) -> list[OpenProtocolMessage]:
+        """Stop the timer and forget unacknowledged frames; returns the frames still queued."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self._in_flight.clear()
+        queued = [frame for item in self._queue for frame in ((item,) if isinstance(item, OpenProtocolMessage) else item)]
+        self._queue.clear()
+        return queued
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "window": self.size,
+            "in_flight": len(self._in_flight),
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "acked": self.acked,
+            "retransmits": self.retransmits,
+            "srtt_ms": None if self.srtt is None else round(self.srtt * 1000.0, 3),
+            "rttvar_ms": None if self.srtt is None else round(self.rttvar * 1000.0, 3),
+        }
+
+    def _enqueue(self, item: OpenProtocolMessage | Iterator[OpenProtocolMessage]) -> None:
+        if len(self._queue) >= self.queue_limit:
+            raise LinkLost(f"{self.queue_limit} messages waiting for link-level acknowledgement")
+        self._queue.append(item)
+
+    def _release(self, now: float) -> list[OpenProtocolMessage]:
+        released = []
+        queue = self._queue
+        while queue and len(self._in_flight) < self.size:
+            head = queue[0]
+            if isinstance(head, OpenProtocolMessage):
+                queue.popleft()
+                released.append(self._admit(head, now))
+                continue
+            try:
+                frame = next(head, None)
+            except ValueError:
+                LOG.exception("Dropping the rest of a linked message for session %s", self.session.session_id)
+                frame = None
+            if frame is None:
+                queue.popleft()
+            else:
+                released.append(self._admit(frame, now))
+        return released
+
+    def _admit(self, msg: OpenProtocolMessage, now: float) -> OpenProtocolMessage:
+        session = self.session
+        seq = session.next_tx_seq
+        session.next_tx_seq = next_sequence(seq)
+        frame = with_sequence(msg, seq)
+        self._in_flight[seq] = _InFlight(frame, now)
+        self.sent += 1
+        return frame
+
+    def _resend(self, now: float) -> list[OpenProtocolMessage]:
+        frames = []
+        for entry in self._in_flight.values():
+            entry.attempts += 1
+            if entry.attempts > self.max_retransmits:
+                raise LinkLost(f"MID {entry.frame.mid} unacknowledged after {self.max_retransmits} retransmissions")
+            entry.sent_at = now
+            frames.append(entry.frame)
+        self.retransmits += len(frames)
+        return frames
+
+    def _observe(self, rtt: float) -> None:
+        # Smoothed round trip and its variation as in RFC 6298.
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator
+
+from . import clock
+from .protocol import build_message
+from .types import OpenProtocolMessage
+
+# Header fields 19-20 are single digits, so a linked message has at most nine parts.
+MAX_PARTS = 9
+# Data bytes in one frame: the 9999-byte length field minus the 20-byte header.
+MAX_PART_DATA = 9999 - 20
+MAX_LINKED_DATA = MAX_PARTS * MAX_PART_DATA
+# Linked messages a session may have in flight at once (one per MID).
+MAX_PENDING_LINKED = 8
+
+
+class LinkError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class LinkedPayload:
+    """A data field too large for one frame, as pieces that stay whole within a part.
+
+    ``sizes`` is known up front so the number of parts can go into the first
+    header; ``pieces`` may be a generator that encodes each piece only when
+    the part holding it is built.
+    """
+
+    sizes: list[int]
+    pieces: Iterable[bytes]
+
+    @property
+    def size(self) -> int:
+        return sum(self.sizes)
+
+
+@dataclass(slots=True)
+class LinkedMessage:
+    """An outbound message sent as linked parts (header fields ``message_parts``/``message_part_number``)."""
+
+    mid: str
+    revision: int
+    payload: LinkedPayload
+    append_nul: bool = True
+    binary: bool = False
+
+    def parts(self) -> Iterator[OpenProtocolMessage]:
+        return segment(self.mid, self.payload, revision=self.revision, append_nul=self.append_nul, binary=self.binary)
+
+
+def part_sizes(sizes: Iterable[int], capacity: int = MAX_PART_DATA) -> list[int]:
+    """Data bytes per part when packing pieces of ``sizes`` greedily.
+
+    Parts break between pieces, which keeps parameter fields whole as the
+    spec requires; only a piece larger than a whole part is cut, where the
+    part is full.
+    """
+    parts: list[int] = []
+    fill = 0
+    for size in sizes:
+        if size > capacity:
+            fill += size
+            while fill > capacity:
+                parts.append(capacity)
+                fill -= capacity
+        elif fill + size > capacity:
+            parts.append(fill)
+            fill = size
+        else:
+            fill += size
+    if fill or not parts:
+        parts.append(fill)
+    return parts
+
+
+def segment(
+    mid: str,
+    payload: LinkedPayload,
+    *,
+    revision: int | str = 1,
+    append_nul: bool = True,
+    binary: bool = False,
+    capacity: int = MAX_PART_DATA,
+) -> Iterator[OpenProtocolMessage]:
+    """Yield the parts of a linked message, each built once its pieces are encoded."""
+    bounds = part_sizes(payload.sizes, capacity)
+    total = len(bounds)
+    if total > MAX_PARTS:
+        raise LinkError(f"MID {mid} payload of {payload.size} bytes needs {total} parts, at most {MAX_PARTS} allowed")
+    linked = str(total) if total > 1 else " "
+    buffer = bytearray()
+    number = 0
+
+    def part(data: bytes) -> OpenProtocolMessage:
+        return build_message(
+            mid=mid,
+            data=data,
+            revision=revision,
+            message_parts=linked,
+            message_part_number=str(number) if total > 1 else " ",
+            append_nul=append_nul,
+            binary=binary,
+        )
+
+    for piece in payload.pieces:
+        buffer += piece
+        while number < total - 1 and len(buffer) >= bounds[number]:
+            data = bytes(buffer[: bounds[number]])
+            del buffer[: bounds[number]]
+            number += 1
+            yield part(data)
+    if number != total - 1 or len(buffer) != bounds[-1]:
+        raise LinkError(f"MID {mid} payload pieces do not add up to their declared sizes")
+    number += 1
+    yield part(bytes(buffer))
+
+
+@dataclass(slots=True)
+class _Partial:
+    parts: int
+    started: float
+    first: OpenProtocolMessage
+    data: list[bytes]
+    raw: list[bytes]
+    size: int
+
+
+class Reassembler:
+    """Joins the parts of linked messages received on one session.
+
+    Parts of one MID must arrive in order; a new part 1 restarts that MID.
+    All partial messages together may hold at most ``limit`` data bytes, and
+    one not completed within ``timeout`` seconds (``clock.monotonic()``) is
+    dropped. Sessions only get a reassembler once a linked part arrives.
+    """
+
+    __slots__ = ("limit", "timeout", "_partial", "_buffered")
+
+    def __init__(self, limit: int = MAX_LINKED_DATA, timeout: float = 10.0):
+        self.limit = limit
+        self.timeout = timeout
+        self._partial: dict[str, _Partial] = {}
+        self._buffered = 0
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def __len__(self) -> int:
+        return len(self._partial)
+
+    def feed(self, msg: OpenProtocolMessage, now: float | None = None) -> OpenProtocolMessage | None:
+        """Add one part; returns the whole message once its last part is in.
+
+        Raises :class:`LinkError` for a part that does not continue its MID's
+        message or would overflow the buffer; that MID's partial is dropped.
+        """
+        header = msg.header
+        parts, number = header.message_parts_int, header.message_part_number_int
+        if not 1 <= number <= parts:
+            self._drop(msg.mid)
+            raise LinkError(f"MID {msg.mid} part {header.message_part_number!r} of {header.message_parts!r}")
+        if parts == 1:
+            return self._joined(msg, [msg.data], [msg.raw])
+
+        if number == 1:
+            self._drop(msg.mid)
+            if len(self._partial) >= MAX_PENDING_LINKED:
+                raise LinkError(f"more than {MAX_PENDING_LINKED} linked messages in flight")
+            partial = self._partial[msg.mid] = _Partial(
+                parts, clock.monotonic() if now is None else now, msg, [], [], 0
+            )
+        else:
+            partial = self._partial.get(msg.mid)
+            if partial is None or partial.parts != parts or len(partial.data) + 1 != number:
+                self._drop(msg.mid)
+                raise LinkError(f"MID {msg.mid} part {number} of {parts} out of order")
+
+        if self._buffered + len(msg.data) > self.limit:
+            self._drop(msg.mid)
+            raise LinkError(f"linked message buffer limit of {self.limit} bytes exceeded")
+        partial.data.append(msg.data)
+        partial.raw.append(msg.raw)
+        partial.size += len(msg.data)
+        self._buffered += len(msg.data)
+        if number < parts:
+            return None
+        self._drop(msg.mid)
+        return self._joined(partial.first, partial.data, partial.raw)
+
+    def expire(self, now: float | None = None) -> list[str]:
+        """Drop partial messages older than the timeout; returns their MIDs."""
+        now = clock.monotonic() if now is None else now
+        expired = [mid for mid, partial in self._partial.items() if now - partial.started > self.timeout]
+        for mid in expired:
+            self._drop(mid)
+        return expired
+
+    def _drop(self, mid: str) -> None:
+        partial = self._partial.pop(mid, None)
+        if partial is not None:
+            self._buffered -= partial.size
+
+    @staticmethod
+    def _joined(first: OpenProtocolMessage, data: list[bytes], raw: list[bytes]) -> OpenProtocolMessage:
+        joined = b"".join(data)
+        header = replace(first.header, length=20 + len(joined), message_parts=" ", message_part_number=" ")
+        return OpenProtocolMessage(header=header, data=joined, raw=b"".join(raw), binary=first.binary)
@@ -0,0 +1,401 @@
+"""Async Open Protocol load generator and latency benchmark.
+
+Opens N concurrent Classic/Actor/Viewer sessions against a running simulator,
+performs the MID 0001 handshake, subscribes, then sends a weighted MID mix at a
+target rate and reports throughput and request-reply latency percentiles. With
+``--rest-url`` it also injects tightening events over REST and measures how long
+the resulting MID 0061 pushes take to reach every subscribed session.
+
+Example::
+
+    python -m app.loadgen --classic 50 --duration 30 --rate 20 --mix 0010:4,0030:2,9999:1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+import urllib.request
+from array import array
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from .protocol import build_message, next_sequence, parse_stream_buffer
+from .state import SUBSCRIPTION_TARGETS
+from .types import OpenProtocolMessage, SessionRole
+
+LINK_ACK_MIDS = {"9997", "9998"}
+PUSH_MID = "0061"
+
+
+class LatencyRecorder:
+    """Raw latency samples (seconds) with percentile and log2-bucket histogram views."""
+
+    def __init__(self) -> None:
+        self.samples = array("d")
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def extend(self, other: "LatencyRecorder") -> None:
+        self.samples.extend(other.samples)
+
+    def summary(self) -> dict[str, Any]:
+        if not self.samples:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000.0, 3)
+
+        return {
+            "count": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000.0, 3),
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "p999_ms": pct(0.999),
+            "max_ms": round(ordered[-1] * 1000.0, 3),
+            "histogram_us": self.histogram(),
+        }
+
+    def histogram(self) -> dict[str, int]:
+        """Counts per power-of-two microsecond bucket, keyed by the bucket's upper bound."""
+        buckets: Counter[int] = Counter()
+        for s in self.samples:
+            buckets[max(1, int(s * 1e6)).bit_length()] += 1
+        return {f"<{1 << bits}": buckets[bits] for bits in sorted(buckets)}
+
+
+@dataclass
+class LoadConfig:
+    host: str = "127.0.0.1"
+    classic: int = 10
+    actor: int = 0
+    viewer: int = 0
+    classic_port: int = 4545
+    actor_port: int = 4546
+    viewer_port: int = 4547
+    duration_sec: float = 10.0
+    rate_per_session: float = 10.0
+    mix: list[tuple[str, int]] = field(default_factory=lambda: [("0010", 4), ("0030", 2), ("9999", 1)])
+    subscribe: list[str] = field(default_factory=lambda: ["0060"])
+    link_level: bool = False
+    handshake_revision: int = 7
+    rest_url: str | None = None
+    event_rate: float = 0.0
+    seed: int = 1
+
+
+class LoadClient:
+    """One protocol session driven open-loop at a fixed request rate."""
+
+    def __init__(self, index: int, role: SessionRole, port: int, config: LoadConfig):
+        self.index = index
+        self.role = role
+        self.port = port
+        self.config = config
+        self.rng = random.Random(config.seed * 100003 + index)
+        self.latency = LatencyRecorder()
+        self.push_latency = LatencyRecorder()
+        self.sent = 0
+        self.replies = 0
+        self.pushes = 0
+        # MID 0061 pushes only, matched in order against ``event_times``.
+        self.event_pushes = 0
+        self.link_acks = 0
+        self.errors: Counter[str] = Counter()
+        self.connected = False
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._buffer = bytearray()
+        self._tx_seq = 1
+        self._pending: deque[float] = deque()
+        self._reply_waiter: asyncio.Future | None = None
+        self.event_times: list[float] | None = None
+        self.push_mids = {PUSH_MID}
+        for mid in config.subscribe:
+            mid = f"{mid:0>4}"[-4:]
+            self.push_mids.add(mid)
+            self.push_mids.update(SUBSCRIPTION_TARGETS.get(mid, []))
+
+    def _frame(self, mid: str, data: bytes = b"", revision: int = 1) -> bytes:
+        seq = 0
+        if self.config.link_level:
+            seq = self._tx_seq
+            self._tx_seq = next_sequence(self._tx_seq)
+        return build_message(mid=mid, data=data, revision=revision, sequence_number=seq).raw
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.config.host, self.port)
+        reply = await self._request("0001", revision=self.config.handshake_revision)
+        if reply.mid != "0002":
+            raise RuntimeError(f"handshake rejected: {reply.mid} {reply.data_ascii()}")
+        for mid in self.config.subscribe:
+            await self._request(mid)
+        self.connected = True
+
+    async def _request(self, mid: str, revision: int = 1) -> OpenProtocolMessage:
+        """Send one frame and wait for its application reply (setup phase only)."""
+        assert self._writer is not None
+        self._writer.write(self._frame(mid, revision=revision))
+        await self._writer.drain()
+        while True:
+            for msg in await self._read_frames():
+                if msg.mid in LINK_ACK_MIDS:
+                    continue
+                if self.config.link_level and msg.header.has_sequence:
+                    self._ack(msg)
+                if msg.mid == "0004":
+                    self.errors[msg.data_ascii()[4:6]] += 1
+                return msg
+
+    async def _read_frames(self) -> list[OpenProtocolMessage]:
+        assert self._reader is not None
+        chunk = await self._reader.read(65536)
+        if not chunk:
+            raise ConnectionError("server closed the session")
+        self._buffer.extend(chunk)
+        return parse_stream_buffer(self._buffer)
+
+    def _ack(self, msg: OpenProtocolMessage) -> None:
+        # Link-level ACKs carry the next sequence number expected from the simulator.
+        assert self._writer is not None
+        self._writer.write(
+            build_message(mid="9997", data=msg.mid.encode("ascii"), sequence_number=next_sequence(msg.header.sequence_int)).raw
+        )
+
+    async def run(self, deadline: float) -> None:
+        receiver = asyncio.create_task(self._receive_loop())
+        try:
+            await self._send_loop(deadline)
+            # Give in-flight replies a moment to arrive before closing.
+            grace = time.monotonic() + 1.0
+            while self._pending and time.monotonic() < grace:
+                await asyncio.sleep(0.01)
+        finally:
+            receiver.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await receiver
+
+    async def _send_loop(self, deadline: float) -> None:
+        assert self._writer is not None
+        mids = [mid for mid, _ in self.config.mix]
+        weights = [weight for _, weight in self.config.mix]
+        rate = self.config.rate_per_session
+        next_send = time.monotonic() + self.rng.random() / rate if rate > 0 else time.monotonic()
+        while time.monotonic() < deadline:
+            if rate > 0:
+                wait = next_send - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                next_send += 1.0 / rate
+            else:
+                # Closed loop: one request in flight at a time.
+                self._reply_waiter = asyncio.get_running_loop().create_future()
+            mid = self.rng.choices(mids, weights)[0]
+            self._pending.append(time.perf_counter())
+            self._writer.write(self._frame(mid))
+            self.sent += 1
+            await self._writer.drain()
+            if self._reply_waiter is not None:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._reply_waiter, timeout=max(0.0, deadline - time.monotonic()))
+                self._reply_waiter = None
+
+    async def _receive_loop(self) -> None:
+        while True:
+            frames = await self._read_frames()
+            now = time.perf_counter()
+            for msg in frames:
+                if msg.mid in LINK_ACK_MIDS:
+                    self.link_acks += 1
+                    continue
+                if self.config.link_level and msg.header.has_sequence:
+                    self._ack(msg)
+                if msg.mid in self.push_mids:
+                    if msg.mid == PUSH_MID:
+                        if self.event_times is not None and self.event_pushes < len(self.event_times):
+                            self.push_latency.add(now - self.event_times[self.event_pushes])
+                        self.event_pushes += 1
+                    self.pushes += 1
+                    continue
+                if msg.mid == "0004":
+                    self.errors[msg.data_ascii()[4:6]] += 1
+                if self._pending:
+                    self.latency.add(now - self._pending.popleft())
+                    self.replies += 1
+                if self._reply_waiter is not None and not self._reply_waiter.done():
+                    self._reply_waiter.set_result(None)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            with contextlib.suppress(Exception):
+                await self._writer.wait_closed()
+
+
+def _post_event(url: str) -> None:
+    body = json.dumps({"payload": {"mids": [PUSH_MID]}}).encode("utf-8")
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/api/v1/events/tightening",
+        data=body,
+        headers={"content-type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+async def _drive_events(config: LoadConfig, event_times: list[float], deadline: float) -> None:
+    assert config.rest_url is not None
+    interval = 1.0 / config.event_rate
+    next_event = time.monotonic()
+    while time.monotonic() < deadline:
+        wait = next_event - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        next_event += interval
+        event_times.append(time.perf_counter())
+        await asyncio.to_thread(_post_event, config.rest_url)
+
+
+async def run_load(config: LoadConfig) -> dict[str, Any]:
+    clients: list[LoadClient] = []
+    for role, count, port in (
+        (SessionRole.CLASSIC, config.classic, config.classic_port),
+        (SessionRole.ACTOR, config.actor, config.actor_port),
+        (SessionRole.VIEWER, config.viewer, config.viewer_port),
+    ):
+        clients.extend(LoadClient(len(clients) + i, role, port, config) for i in range(count))
+
+    setup_started = time.perf_counter()
+    results = await asyncio.gather(*(c.connect() for c in clients), return_exceptions=True)
+    setup_sec = time.perf_counter() - setup_started
+    active = [c for c, r in zip(clients, results) if not isinstance(r, BaseException)]
+    failures = Counter(type(r).__name__ + ": " + str(r) for r in results if isinstance(r, BaseException))
+
+    event_times: list[float] = []
+    if config.rest_url and config.event_rate > 0:
+        for client in active:
+            client.event_times = event_times
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + config.duration_sec
+    tasks = [asyncio.create_task(c.run(deadline)) for c in active]
+    if config.rest_url and config.event_rate > 0:
+        tasks.append(asyncio.create_task(_drive_events(config, event_times, deadline)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    latency = LatencyRecorder()
+    push_latency = LatencyRecorder()
+    errors: Counter[str] = Counter()
+    for client in active:
+        latency.extend(client.latency)
+        push_latency.extend(client.push_latency)
+        errors.update(client.errors)
+    sent = sum(c.sent for c in active)
+    replies = sum(c.replies for c in active)
+    return {
+        "sessions": {"requested": len(clients), "connected": len(active), "failures": dict(failures)},
+        "setup_sec": round(setup_sec, 3),
+        "duration_sec": round(elapsed, 3),
+        "link_level": config.link_level,
+        "requests_sent": sent,
+        "replies_received": replies,
+        "link_acks_received": sum(c.link_acks for c in active),
+        "throughput_rps": round(replies / elapsed, 1) if elapsed > 0 else 0.0,
+        "error_codes": dict(errors),
+        "reply_latency": latency.summary(),
+        "events_posted": len(event_times),
+        "pushes_received": sum(c.pushes for c in active),
+        "push_latency": push_latency.summary(),
+    }
+
+
+def _parse_mix(raw: str) -> list[tuple[str, int]]:
+    mix: list[tuple[str, int]] = []
+    for part in raw.split(","):
+        mid, _, weight = part.strip().partition(":")
+        mix.append((f"{mid:0>4}"[-4:], int(weight or 1)))
+    return mix
+
+
+def _format_report(report: dict[str, Any]) -> str:
+    lines = [
+        f"sessions   {report['sessions']['connected']}/{report['sessions']['requested']} connected"
+        f" (setup {report['setup_sec']} s, link-level {'on' if report['link_level'] else 'off'})",
+        f"requests   {report['requests_sent']} sent, {report['replies_received']} replies"
+        f" in {report['duration_sec']} s -> {report['throughput_rps']} replies/s",
+    ]
+    for title, key in (("reply", "reply_latency"), ("push", "push_latency")):
+        s = report[key]
+        if s.get("count"):
+            lines.append(
+                f"{title:<10} n={s['count']} p50={s['p50_ms']}ms p99={s['p99_ms']}ms"
+                f" p999={s['p999_ms']}ms max={s['max_ms']}ms"
+            )
+    if report["error_codes"]:
+        lines.append(f"errors     {report['error_codes']}")
+    for failure, count in report["sessions"]["failures"].items():
+        lines.append(f"failed     {count}x {failure}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.loadgen", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--classic", type=int, default=10, help="Classic sessions to open")
+    parser.add_argument("--actor", type=int, default=0, help="Actor sessions to open")
+    parser.add_argument("--viewer", type=int, default=0, help="Viewer sessions to open")
+    parser.add_argument("--classic-port", type=int, default=4545)
+    parser.add_argument("--actor-port", type=int, default=4546)
+    parser.add_argument("--viewer-port", type=int, default=4547)
+    parser.add_argument("--duration", type=float, default=10.0, help="Measurement window in seconds")
+    parser.add_argument("--rate", type=float, default=10.0, help="Requests/s per session (0 = closed loop)")
+    parser.add_argument("--mix", default="0010:4,0030:2,9999:1", help="Weighted MID mix, e.g. 0010:4,9999:1")
+    parser.add_argument("--subscribe", default="0060", help="Comma-separated subscription MIDs sent after 0001")
+    parser.add_argument("--link-level", action="store_true", help="Use link-level sequence numbers and 9997 ACKs")
+    parser.add_argument("--revision", type=int, default=7, help="MID 0001 revision")
+    parser.add_argument("--rest-url", default=None, help="Simulator REST base URL for push latency, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--event-rate", type=float, default=0.0, help="Tightening events/s injected via REST")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    config = LoadConfig(
+        host=args.host,
+        classic=args.classic,
+        actor=args.actor,
+        viewer=args.viewer,
+        classic_port=args.classic_port,
+        actor_port=args.actor_port,
+        viewer_port=args.viewer_port,
+        duration_sec=args.duration,
+        rate_per_session=args.rate,
+        mix=_parse_mix(args.mix),
+        subscribe=[m.strip() for m in args.subscribe.split(",") if m.strip()],
+        link_level=args.link_level,
+        handshake_revision=args.revision,
+        rest_url=args.rest_url,
+        event_rate=args.event_rate,
+        seed=args.seed,
+    )
+    report = asyncio.run(run_load(config))
+    print(_format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0 if report["sessions"]["connected"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,85 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import contextlib
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel, Field
+from starlette.requests import HTTPConnection
 
+from . import clock
 from .config import Settings
-from .dispatcher import OpenProtocolDispatcher
+from .controllers import Controller, ControllerRegistry, load_controller_specs, single_controller_spec
+from .diagnostics import AllocationTracker, LoopMonitor, ProfileBusy, StackSampler, loop_metric_families
+from .engine import ProtocolEngine
+from .impairment import DIRECTIONS as IMPAIRMENT_DIRECTIONS
+from .impairment import Impairment
+from .latency import STAGES as LATENCY_STAGES
+from .metrics import METRICS_CONTENT_TYPE, render_exposition
 from .mid_catalog import MidCatalog
-from .persistence import PersistenceStore
 from .profiles import ProfileStore
-from .state import SimulatorState
-from .tcp_server import TcpService
+from .scenarios import load_scenarios
+from .types import SessionRole
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 LOG = logging.getLogger(__name__)
 
 settings = Settings.from_env()
+clock.install(clock.from_settings(settings))
 catalog = MidCatalog.from_file(settings.data_dir / "mid_catalog.json")
 profiles = ProfileStore.from_directory(settings.data_dir / "profiles", active=settings.sim_profile)
-persistence = PersistenceStore(enabled=settings.sim_persist, db_path=settings.sim_db_path)
-state = SimulatorState(
+engine = ProtocolEngine(mode=settings.sim_engine)
+if settings.sim_controllers_file:
+    controller_specs = load_controller_specs(Path(settings.sim_controllers_file), settings)
+else:
+    controller_specs = [single_controller_spec(settings)]
+controllers = ControllerRegistry(
+    controller_specs,
+    settings=settings,
     catalog=catalog,
     profiles=profiles,
-    persistence=persistence,
-    keepalive_timeout_sec=settings.sim_keepalive_timeout_sec,
-    inactivity_hint_sec=settings.sim_inactivity_keepalive_hint_sec,
-    max_sessions=settings.sim_max_sessions,
+    engine=engine,
+    scenarios=load_scenarios(settings.data_dir / "scenarios.json"),
 )
-dispatcher = OpenProtocolDispatcher(settings=settings, catalog=catalog, profiles=profiles, state=state)
-tcp_service = TcpService(settings=settings, state=state, dispatcher=dispatcher)
+# The API loop, plus the engine loop when it runs on its own thread.
+loop_monitors: list[LoopMonitor] = []
+profiler = StackSampler()
+allocations = AllocationTracker()
 
 
 class ProfileSwitchRequest(BaseModel):
     profile: str = Field(..., description="Profile name, e.g. atlas_pf or cleco")
 
 
+class ImpairmentRequest(BaseModel):
+    latency_ms: float = Field(default=0, ge=0, le=60000)
+    jitter_ms: float = Field(default=0, ge=0, le=60000)
+    bandwidth_bytes_per_sec: int = Field(default=0, ge=0, description="0 = unlimited")
+    fragment_bytes: int = Field(default=0, ge=0, description="Split every sent frame into writes of at most this many bytes")
+    corrupt_rate: float = Field(default=0, ge=0, le=1)
+    drop_rate: float = Field(default=0, ge=0, le=1)
+    duplicate_rate: float = Field(default=0, ge=0, le=1)
+    disconnect_rate: float = Field(default=0, ge=0, le=1)
+    direction: str = Field(default="both", description=f"One of {', '.join(IMPAIRMENT_DIRECTIONS)}")
+    seed: int | None = None
+
+
+class ClockRequest(BaseModel):
+    advance_sec: float = Field(default=0, ge=0, description="Jump this much simulated time ahead")
+    speed: float | None = Field(default=None, gt=0, description="Simulated seconds per wall-clock second")
+
+
+class TrafficPage(BaseModel):
+    cursor: int = Field(..., description="Pass as `since` to fetch the next page")
+    dropped: int = Field(..., description="Records evicted from the buffer before they were polled")
+    items: list[dict[str, Any]]
+
+
 class DomainUpdateRequest(BaseModel):
     payload: dict[str, Any]
 
@@ -49,18 +88,45 @@ class EventPayloadRequest(BaseModel):
     payload: dict[str, Any] = Field(default_factory=dict)
 
 
+class EventBatchItem(BaseModel):
+    event: str
+    payload: dict[str, Any] = Field(default_factory=dict)
+
+
+class EventBatchRequest(BaseModel):
+    events: list[EventBatchItem] = Field(..., min_length=1, max_length=10000)
+
+
+class GeneratorStartRequest(BaseModel):
+    seed: int | None = None
+    tick_ms: float = Field(default=50, gt=0, le=1000)
+    streams: list[dict[str, Any]] = Field(default_factory=lambda: [{}], min_length=1)
+
+
 class ScenarioRunRequest(BaseModel):
     name: str
     payload: dict[str, Any] = Field(default_factory=dict)
+    wait: bool = Field(default=False, description="Block until the job finishes and return its results")
+
 
+def _csv(raw: str | None) -> list[str]:
+    if not raw:
+        return []
+    return [part.strip() for part in raw.split(",") if part.strip()]
 
-def _load_scenarios(path: Path) -> dict[str, list[dict[str, Any]]]:
-    raw = json.loads(path.read_text(encoding="utf-8"))
-    scenarios = raw.get("scenarios", [])
-    return {s["name"]: s.get("steps", []) for s in scenarios}
 
+def current_controller(conn: HTTPConnection) -> Controller:
+    """Controller addressed by the ``/controllers/{controller_id}`` prefix, else the default one."""
+    controller_id = conn.path_params.get("controller_id")
+    if controller_id is None:
+        return controllers.default
+    controller = controllers.get(controller_id)
+    if controller is None:
+        raise HTTPException(status_code=404, detail=f"Unknown controller {controller_id}")
+    return controller
 
-SCENARIOS = _load_scenarios(settings.data_dir / "scenarios.json")
+
+Ctl = Annotated[Controller, Depends(current_controller)]
 
 app = FastAPI(title=settings.app_name, version=settings.app_version)
 app.add_middleware(
@@ -69,124 +135,375 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+router = APIRouter()
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
-    await tcp_service.start()
+    await engine.start(controllers.start)
+    if settings.sim_loop_monitor:
+        threshold = settings.sim_loop_lag_threshold_ms / 1000.0
+        api_monitor = LoopMonitor("api", threshold=threshold)
+        await api_monitor.start()
+        loop_monitors.append(api_monitor)
+        if engine.mode == "thread":
+            engine_monitor = LoopMonitor("engine", threshold=threshold)
+            await engine.call(engine_monitor.start)
+            loop_monitors.append(engine_monitor)
     LOG.info("API started on %s:%d", settings.host, settings.api_port)
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
-    await tcp_service.stop()
-
-
-@app.get("/api/v1/health")
-async def health() -> dict[str, Any]:
-    sessions = await state.sessions()
+    for monitor in loop_monitors:
+        if monitor.name == "engine":
+            await engine.call(monitor.stop)
+        else:
+            await monitor.stop()
+    loop_monitors.clear()
+    for controller in controllers.all():
+        await controller.stop_sources()
+    await engine.stop(controllers.stop)
+
+
+@router.get("/health")
+async def health(ctl: Ctl) -> dict[str, Any]:
+    by_role = ctl.state.role_counts()
     return {
         "status": "ok",
         "version": settings.app_version,
-        "profile": profiles.active_name,
+        "profile": ctl.profiles.active_name,
         "mid_count": catalog.len(),
-        "sessions": len(sessions),
-        "ports": {
-            "classic": settings.classic_port,
-            "actor": settings.actor_port,
-            "viewer": settings.viewer_port,
-        },
+        "sessions": sum(by_role.values()),
+        "sessions_by_role": by_role,
+        "engine": engine.mode,
+        "workers": ctl.tcp_service.workers_status(),
+        "controller": ctl.id,
+        "controllers": len(controllers),
+        "ports": ctl.ports(),
     }
 
 
-@app.get("/api/v1/profiles")
-async def get_profiles() -> dict[str, Any]:
-    return state.profile_payload()
+@router.get("/profiles")
+async def get_profiles(ctl: Ctl) -> dict[str, Any]:
+    return ctl.state.profile_payload()
 
 
-@app.put("/api/v1/profiles/active")
-async def set_active_profile(req: ProfileSwitchRequest) -> dict[str, Any]:
+@router.put("/profiles/active")
+async def set_active_profile(req: ProfileSwitchRequest, ctl: Ctl) -> dict[str, Any]:
     try:
-        await state.set_profile(req.profile)
+        await engine.call(ctl.state.set_profile, req.profile)
     except KeyError:
         raise HTTPException(status_code=404, detail=f"Unknown profile {req.profile}") from None
-    return state.profile_payload()
+    return ctl.state.profile_payload()
+
+
+@router.get("/sessions")
+async def get_sessions(ctl: Ctl) -> list[dict[str, Any]]:
+    return await engine.call(ctl.state.sessions)
 
 
-@app.get("/api/v1/sessions")
-async def get_sessions() -> list[dict[str, Any]]:
-    return await state.sessions()
+def _impairment(req: ImpairmentRequest) -> Impairment:
+    try:
+        return Impairment.from_dict(req.model_dump())
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from None
+
+
+def _role(role: str) -> SessionRole:
+    try:
+        return SessionRole(role)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Unknown port {role}") from None
+
+
+@router.get("/impairments")
+async def get_impairments(ctl: Ctl) -> dict[str, Any]:
+    return await engine.call(ctl.tcp_service.impairments_status)
+
+
+@router.put("/impairments/ports/{role}")
+async def set_port_impairment(role: str, req: ImpairmentRequest, ctl: Ctl) -> dict[str, Any]:
+    return await engine.call(ctl.tcp_service.set_port_impairment, _role(role), _impairment(req))
+
+
+@router.delete("/impairments/ports/{role}")
+async def clear_port_impairment(role: str, ctl: Ctl) -> dict[str, Any]:
+    return await engine.call(ctl.tcp_service.set_port_impairment, _role(role), None)
+
+
+@router.put("/impairments/sessions/{session_id}")
+async def set_session_impairment(session_id: str, req: ImpairmentRequest, ctl: Ctl) -> dict[str, Any]:
+    impairment = _impairment(req)
+    try:
+        applied = await engine.call(ctl.tcp_service.set_session_impairment, session_id, impairment)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}") from None
+    return {"session_id": session_id, "impairment": applied}
+
+
+@router.delete("/impairments/sessions/{session_id}")
+async def clear_session_impairment(session_id: str, ctl: Ctl) -> dict[str, Any]:
+    try:
+        applied = await engine.call(ctl.tcp_service.set_session_impairment, session_id, None)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}") from None
+    return {"session_id": session_id, "impairment": applied}
+
+
+@router.post("/impairments/sessions/{session_id}/disconnect")
+async def disconnect_session(session_id: str, ctl: Ctl) -> dict[str, Any]:
+    try:
+        await engine.call(ctl.tcp_service.disconnect_session, session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}") from None
+    return {"session_id": session_id, "status": "disconnected"}
 
 
-@app.get("/api/v1/traffic")
+@router.get("/traffic")
 async def get_traffic(
+    ctl: Ctl,
     limit: int = Query(default=100, ge=1, le=500),
     mid: str | None = Query(default=None),
     session_id: str | None = Query(default=None),
-) -> list[dict[str, Any]]:
-    return await state.list_traffic(limit=limit, mid=mid, session_id=session_id)
+    since: int | None = Query(default=None, ge=0, description="Return only records with seq greater than this cursor"),
+) -> list[dict[str, Any]] | TrafficPage:
+    if since is not None:
+        return TrafficPage(**await engine.call(ctl.state.traffic_since, since, limit=limit, mid=mid, session_id=session_id))
+    return await engine.call(ctl.state.list_traffic, limit=limit, mid=mid, session_id=session_id)
+
+
+@router.get("/latency")
+async def get_latency(ctl: Ctl, mid: str | None = Query(default=None)) -> dict[str, Any]:
+    items = await engine.call(ctl.state.latency_summary, mid)
+    return {"enabled": ctl.settings.sim_trace_latency, "stages": list(LATENCY_STAGES), "items": items}
+
+
+@router.websocket("/stream")
+async def stream(
+    websocket: WebSocket,
+    ctl: Ctl,
+    topics: str | None = Query(default=None, description="Comma-separated: traffic,session,state"),
+    mid: str | None = Query(default=None, description="Comma-separated MID filter for traffic"),
+    session_id: str | None = Query(default=None, description="Comma-separated session filter"),
+    domain: str | None = Query(default=None, description="Comma-separated state domain filter"),
+) -> None:
+    await websocket.accept()
+    sub = ctl.stream.subscribe(
+        topics=_csv(topics) or None,
+        mids=_csv(mid),
+        session_ids=_csv(session_id),
+        domains=_csv(domain),
+    )
+
+    async def _send_batches() -> None:
+        while True:
+            items, dropped = await sub.next_batch()
+            await websocket.send_json({"items": items, "dropped": dropped})
+
+    async def _wait_disconnect() -> None:
+        with contextlib.suppress(WebSocketDisconnect):
+            while True:
+                await websocket.receive_text()
+
+    tasks = [asyncio.create_task(_send_batches()), asyncio.create_task(_wait_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        ctl.stream.unsubscribe(sub)
+        for task in tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
 
 
-@app.get("/api/v1/state")
-async def get_full_state() -> dict[str, Any]:
-    return await state.list_domains()
+@router.get("/state")
+async def get_full_state(ctl: Ctl) -> dict[str, Any]:
+    return await engine.call(ctl.state.list_domains)
 
 
-@app.get("/api/v1/state/{domain}")
-async def get_state_domain(domain: str) -> dict[str, Any]:
+@router.get("/state/{domain}")
+async def get_state_domain(domain: str, ctl: Ctl) -> dict[str, Any]:
     try:
-        return await state.get_state_domain(domain)
+        return await engine.call(ctl.state.get_state_domain, domain)
     except KeyError:
         raise HTTPException(status_code=404, detail=f"Unknown domain {domain}") from None
 
 
-@app.put("/api/v1/state/{domain}")
-async def put_state_domain(domain: str, req: DomainUpdateRequest) -> dict[str, Any]:
+@router.put("/state/{domain}")
+async def put_state_domain(domain: str, req: DomainUpdateRequest, ctl: Ctl) -> dict[str, Any]:
     try:
-        updated = await state.update_state_domain(domain, req.payload)
+        updated = await engine.call(ctl.state.update_state_domain, domain, req.payload)
     except KeyError:
         raise HTTPException(status_code=404, detail=f"Unknown domain {domain}") from None
     return {"domain": domain, "state": updated}
 
 
-@app.post("/api/v1/events/{event_name}")
-async def post_event(event_name: str, req: EventPayloadRequest) -> dict[str, Any]:
-    result = await tcp_service.publish_event(event_name, req.payload)
+@router.post("/events")
+async def post_events(req: EventBatchRequest, ctl: Ctl) -> dict[str, Any]:
+    return await ctl.publish_events([(item.event, item.payload) for item in req.events])
+
+
+@router.post("/events/{event_name}")
+async def post_event(event_name: str, req: EventPayloadRequest, ctl: Ctl) -> dict[str, Any]:
+    result = await ctl.publish_event(event_name, req.payload)
     return result
 
 
-@app.get("/api/v1/scenarios")
-async def list_scenarios() -> dict[str, Any]:
-    return {"scenarios": sorted(SCENARIOS.keys())}
+@router.get("/generator")
+async def get_generator(ctl: Ctl) -> dict[str, Any]:
+    return ctl.generator.status()
+
+
+@router.post("/generator/start")
+async def start_generator(req: GeneratorStartRequest, ctl: Ctl) -> dict[str, Any]:
+    try:
+        await ctl.generator.start(req.model_dump())
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid generator config: {exc}") from None
+    return ctl.generator.status()
 
 
-@app.post("/api/v1/scenarios/run")
-async def run_scenario(req: ScenarioRunRequest) -> dict[str, Any]:
-    steps = SCENARIOS.get(req.name)
-    if steps is None:
-        raise HTTPException(status_code=404, detail=f"Unknown scenario {req.name}")
+@router.post("/generator/stop")
+async def stop_generator(ctl: Ctl) -> dict[str, Any]:
+    await ctl.generator.stop()
+    return ctl.generator.status()
 
-    results: list[dict[str, Any]] = []
-    for step in steps:
-        delay = float(step.get("delay_sec", 0))
-        if delay > 0:
-            await asyncio.sleep(delay)
-        event_name = step["event"]
-        payload = dict(step.get("payload", {}))
-        payload.update(req.payload)
-        result = await tcp_service.publish_event(event_name, payload)
-        results.append(result)
-    return {"scenario": req.name, "steps_executed": len(steps), "results": results}
+
+@router.get("/scenarios")
+async def list_scenarios(ctl: Ctl) -> dict[str, Any]:
+    return {"scenarios": ctl.scenario_runner.names(), "details": ctl.scenario_runner.describe()}
+
+
+@router.post("/scenarios/run")
+async def run_scenario(req: ScenarioRunRequest, ctl: Ctl) -> dict[str, Any]:
+    try:
+        job = ctl.scenario_runner.start(req.name, req.payload)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown scenario {req.name}") from None
+    if not req.wait:
+        return {"job": job.to_dict()}
+    await ctl.scenario_runner.wait(job)
+    return {
+        "scenario": req.name,
+        "job": job.to_dict(),
+        "steps_executed": job.steps_done,
+        "results": list(job.results),
+    }
+
+
+@router.get("/scenarios/jobs")
+async def list_scenario_jobs(ctl: Ctl) -> dict[str, Any]:
+    return {"jobs": [job.to_dict() for job in ctl.scenario_runner.jobs()]}
+
+
+@router.get("/scenarios/jobs/{job_id}")
+async def get_scenario_job(job_id: str, ctl: Ctl) -> dict[str, Any]:
+    job = ctl.scenario_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict(include_results=True)
+
+
+@router.post("/scenarios/jobs/{job_id}/cancel")
+async def cancel_scenario_job(job_id: str, ctl: Ctl) -> dict[str, Any]:
+    try:
+        job = ctl.scenario_runner.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}") from None
+    await ctl.scenario_runner.wait(job)
+    return job.to_dict()
 
 
-@app.post("/api/v1/reset")
-async def reset_simulator() -> dict[str, Any]:
-    await state.reset()
+@router.post("/reset")
+async def reset_simulator(ctl: Ctl) -> dict[str, Any]:
+    await engine.call(ctl.state.reset)
     return {"status": "reset"}
 
 
-@app.get("/api/v1/capabilities")
-async def capabilities() -> dict[str, Any]:
-    matrix = await state.list_capability_matrix()
+@router.get("/capabilities")
+async def capabilities(ctl: Ctl) -> dict[str, Any]:
+    matrix = await engine.call(ctl.state.list_capability_matrix)
     return {"count": len(matrix), "items": matrix}
 
+
+@app.get("/api/v1/controllers")
+async def list_controllers() -> dict[str, Any]:
+    items = []
+    for controller in controllers.all():
+        items.append(controller.summary(sum(controller.state.role_counts().values())))
+    return {"default": controllers.default.id, "items": items}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    sources = []
+    for controller in controllers.all():
+        await engine.call(controller.collect_metrics)
+        sources.append(({"controller": controller.id}, controller.metrics.families()))
+    sources.append(({}, loop_metric_families(loop_monitors)))
+    return Response(render_exposition(sources), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/v1/clock")
+async def get_clock() -> dict[str, Any]:
+    return clock.current().snapshot()
+
+
+@app.post("/api/v1/clock")
+async def set_clock(req: ClockRequest) -> dict[str, Any]:
+    current = clock.current()
+    if not isinstance(current, clock.VirtualClock):
+        raise HTTPException(status_code=409, detail="The simulator runs on the wall clock; start it with SIM_CLOCK=virtual")
+    if req.speed is not None:
+        current.set_speed(req.speed)
+    if req.advance_sec:
+        current.advance(req.advance_sec)
+    return current.snapshot()
+
+
+@app.get("/api/v1/diagnostics/loop")
+async def loop_diagnostics() -> dict[str, Any]:
+    return {"enabled": settings.sim_loop_monitor, "loops": [monitor.snapshot() for monitor in loop_monitors]}
+
+
+@app.post("/api/v1/diagnostics/profile", response_model=None)
+async def run_profile(
+    seconds: float = Query(default=5.0, gt=0, le=30),
+    hz: int = Query(default=100, ge=1, le=1000),
+    format: str = Query(default="collapsed", pattern="^(collapsed|top)$"),
+    include_idle: bool = Query(default=False, description="Keep samples of threads parked in select/wait"),
+) -> Response | dict[str, Any]:
+    try:
+        result = await asyncio.to_thread(profiler.run, seconds, hz, include_idle)
+    except ProfileBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from None
+    if format == "top":
+        return StackSampler.top(result)
+    return Response(StackSampler.collapsed(result), media_type="text/plain")
+
+
+@app.get("/api/v1/diagnostics/memory")
+async def memory_snapshot(
+    limit: int = Query(default=20, ge=1, le=200),
+    group_by: str = Query(default="lineno", pattern="^(lineno|filename|traceback)$"),
+    diff: bool = Query(default=True, description="Compare with the baseline taken at start"),
+    rebase: bool = Query(default=False, description="Make this snapshot the new baseline"),
+) -> dict[str, Any]:
+    if not allocations.active:
+        raise HTTPException(status_code=409, detail="Allocation tracking is not running")
+    return await asyncio.to_thread(allocations.snapshot, limit=limit, group_by=group_by, diff=diff, rebase=rebase)
+
+
+@app.post("/api/v1/diagnostics/memory/start")
+async def memory_start(frames: int = Query(default=1, ge=1, le=25)) -> dict[str, Any]:
+    return await asyncio.to_thread(allocations.start, frames)
+
+
+@app.post("/api/v1/diagnostics/memory/stop")
+async def memory_stop() -> dict[str, Any]:
+    return allocations.stop()
+
+
+app.include_router(router, prefix="/api/v1")
+app.include_router(router, prefix="/api/v1/controllers/{controller_id}")
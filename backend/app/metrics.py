@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import bisect
+from typing import TYPE_CHECKING, Iterable
+
+from .types import SessionRole
+
+if TYPE_CHECKING:
+    from .state import SimulatorState
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DISPATCH_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+FANOUT_SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+FANOUT_TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LINK_RTT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PERSISTENCE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; cumulated only when rendered.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+class MetricFamily:
+    """A named metric with a fixed label set.
+
+    :meth:`labels` returns the child for one combination of label values; hot
+    paths bind the child once and keep it, so an increment is a single
+    attribute update with no label lookups.
+    """
+
+    def __init__(self, name: str, kind: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = ()):
+        if kind not in _KINDS:
+            raise ValueError(f"unknown metric kind {kind!r}")
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.children: dict[tuple[str, ...], Counter | Gauge | Histogram] = {}
+
+    def labels(self, *values: str) -> Counter | Gauge | Histogram:
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = Histogram(self.buckets) if self.kind == "histogram" else _KINDS[self.kind]()
+            self.children[values] = child
+        return child
+
+    def samples(self, const_labels: dict[str, str]) -> list[str]:
+        lines: list[str] = []
+        for values, child in sorted(self.children.items()):
+            labels = {**const_labels, **dict(zip(self.labelnames, values))}
+            if isinstance(child, Histogram):
+                running = 0
+                for bound, count in zip((*child.bounds, float("inf")), child.counts):
+                    running += count
+                    lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {running}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {_number(child.sum)}")
+                lines.append(f"{self.name}_count{_labels(labels)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_labels(labels)} {_number(child.value)}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_exposition(sources: Iterable[tuple[dict[str, str], Iterable[MetricFamily]]]) -> str:
+    """Text exposition of several metric sets, merged by family name.
+
+    Each source carries constant labels (e.g. the controller id) that are
+    added to every sample it contributes.
+    """
+    merged: dict[str, tuple[MetricFamily, list[str]]] = {}
+    for const_labels, families in sources:
+        for family in families:
+            entry = merged.setdefault(family.name, (family, []))
+            entry[1].extend(family.samples(const_labels))
+    out: list[str] = []
+    for name, (family, lines) in merged.items():
+        out.append(f"# HELP {name} {family.help}")
+        out.append(f"# TYPE {name} {family.kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+class ProtocolMetrics:
+    """Protocol engine metrics for one controller.
+
+    Per-MID frame counters and per-category dispatch histograms are bound on
+    first use and then reached through plain dict lookups, so counting stays on
+    in production. Gauges are sampled from the simulator state at scrape time.
+    """
+
+    def __init__(self) -> None:
+        self.frames = MetricFamily(
+            "opsim_frames_total", "counter", "Open Protocol frames by direction, session role and MID.", ("direction", "role", "mid")
+        )
+        self.dispatch_seconds = MetricFamily(
+            "opsim_dispatch_seconds", "histogram", "Dispatcher time per received frame by MID category.", ("category",), DISPATCH_BUCKETS
+        )
+        self.mid_errors = MetricFamily("opsim_mid_errors_total", "counter", "MID 0004 error replies by error code.", ("code",))
+        self.link_nacks = MetricFamily(
+            "opsim_link_nacks_total", "counter", "Link-level MID 9998 NACKs, rx from peers and tx to peers.", ("direction",)
+        )
+        self.link_retransmits = MetricFamily(
+            "opsim_link_retransmit_replies_total", "counter", "Link ACKs re-sent because a peer retransmitted its last frame."
+        )
+        self.link_frames = MetricFamily(
+            "opsim_link_frames_total",
+            "counter",
+            "Sequenced frames sent in link-level mode: acked by the peer, or re-sent after a NACK or ack timeout.",
+            ("result",),
+        )
+        self.link_rtt = MetricFamily(
+            "opsim_link_ack_rtt_seconds", "histogram", "Time from sending a sequenced frame to its MID 9997.", (), LINK_RTT_BUCKETS
+        )
+        self.link_lost = MetricFamily(
+            "opsim_link_lost_sessions_total", "counter", "Sessions dropped by link-level flow control.", ("reason",)
+        )
+        self.impaired_frames = MetricFamily(
+            "opsim_impaired_frames_total",
+            "counter",
+            "Frames dropped, duplicated or corrupted, and connections dropped, by network impairment.",
+            ("direction", "fault"),
+        )
+        self.linked_messages = MetricFamily(
+            "opsim_linked_messages_total",
+            "counter",
+            "Linked (multi-part) messages: rx reassembled, rejected or expired, tx segmented.",
+            ("direction", "result"),
+        )
+        self.fanout_messages = MetricFamily(
+            "opsim_fanout_messages", "histogram", "Push messages written per published event.", (), FANOUT_SIZE_BUCKETS
+        )
+        self.fanout_seconds = MetricFamily(
+            "opsim_fanout_seconds", "histogram", "Time to render and write the pushes of one publish call.", (), FANOUT_TIME_BUCKETS
+        )
+        self.persistence_lag = MetricFamily(
+            "opsim_persistence_lag_seconds", "histogram", "Time from recording traffic to its persistence commit.", (), PERSISTENCE_BUCKETS
+        )
+        self.sessions = MetricFamily("opsim_sessions", "gauge", "Connected sessions by role.", ("role",))
+        self.outbound_queue = MetricFamily(
+            "opsim_outbound_queue_bytes", "gauge", "Bytes queued in session transports awaiting the socket (total and largest).", ("stat",)
+        )
+        self.backlogged_sessions = MetricFamily(
+            "opsim_outbound_backlogged_sessions", "gauge", "Sessions with bytes still queued for the socket."
+        )
+        self.traffic_buffer = MetricFamily(
+            "opsim_traffic_buffer_records", "gauge", "Traffic ring buffer occupancy and capacity.", ("stat",)
+        )
+        self.link_window = MetricFamily(
+            "opsim_link_window_frames", "gauge", "Link-level frames awaiting acknowledgement and messages queued behind them.", ("stat",)
+        )
+
+        self.nack_rx = self.link_nacks.labels("rx")
+        self.nack_tx = self.link_nacks.labels("tx")
+        self.retransmit_replies = self.link_retransmits.labels()
+        self.link_acked = self.link_frames.labels("acked")
+        self.link_resent_nack = self.link_frames.labels("nack")
+        self.link_resent_timeout = self.link_frames.labels("timeout")
+        self.link_ack_rtt = self.link_rtt.labels()
+        self.linked_reassembled = self.linked_messages.labels("rx", "reassembled")
+        self.linked_rejected = self.linked_messages.labels("rx", "rejected")
+        self.linked_expired = self.linked_messages.labels("rx", "expired")
+        self.linked_segmented = self.linked_messages.labels("tx", "segmented")
+        self.fanout_size = self.fanout_messages.labels()
+        self.fanout_time = self.fanout_seconds.labels()
+        self.persistence = self.persistence_lag.labels()
+        self._frames: dict[str, dict[SessionRole, dict[str, Counter]]] = {"rx": {}, "tx": {}}
+        self._dispatch: dict[str, Histogram] = {}
+        self._errors: dict[bytes, Counter] = {}
+
+    def families(self) -> list[MetricFamily]:
+        return [
+            self.frames,
+            self.dispatch_seconds,
+            self.mid_errors,
+            self.link_nacks,
+            self.link_retransmits,
+            self.link_frames,
+            self.link_rtt,
+            self.link_lost,
+            self.impaired_frames,
+            self.linked_messages,
+            self.fanout_messages,
+            self.fanout_seconds,
+            self.persistence_lag,
+            self.sessions,
+            self.outbound_queue,
+            self.backlogged_sessions,
+            self.traffic_buffer,
+            self.link_window,
+        ]
+
+    def count_frame(self, direction: str, role: SessionRole, mid: str) -> None:
+        by_mid = self._frames[direction].get(role)
+        if by_mid is None:
+            by_mid = self._frames[direction][role] = {}
+        counter = by_mid.get(mid)
+        if counter is None:
+            counter = by_mid[mid] = self.frames.labels(direction, role.value, mid)
+        counter.value += 1
+
+    def dispatch_histogram(self, category: str) -> Histogram:
+        histogram = self._dispatch.get(category)
+        if histogram is None:
+            histogram = self._dispatch[category] = self.dispatch_seconds.labels(category)
+        return histogram
+
+    def count_error(self, data: bytes) -> None:
+        """Count a MID 0004 reply from its payload (failed MID, then the two-digit error code)."""
+        code = data[4:6]
+        counter = self._errors.get(code)
+        if counter is None:
+            counter = self._errors[code] = self.mid_errors.labels(code.decode("ascii", errors="replace"))
+        counter.value += 1
+
+    def take_deltas(self) -> list[list]:
+        """Counter and histogram increments since the last call, as JSON-ready rows.
+
+        Children are reset in place, so the ones bound on hot paths stay
+        valid. Protocol workers ship these to the owner, which adds them to
+        its own metrics with :meth:`add_deltas`; gauges are not carried.
+        """
+        rows: list[list] = []
+        for family in self.families():
+            if family.kind == "gauge":
+                continue
+            for values, child in family.children.items():
+                if isinstance(child, Histogram):
+                    if child.count:
+                        rows.append([family.name, list(values), child.counts, child.sum, child.count])
+                        child.counts = [0] * len(child.counts)
+                        child.sum, child.count = 0.0, 0
+                elif child.value:
+                    rows.append([family.name, list(values), child.value])
+                    child.value = 0
+        return rows
+
+    def add_deltas(self, rows: Iterable[list]) -> None:
+        families = {family.name: family for family in self.families()}
+        for name, values, *delta in rows:
+            family = families.get(name)
+            if family is None:
+                continue
+            child = family.labels(*values)
+            if isinstance(child, Histogram):
+                counts, total, count = delta
+                child.counts = [a + b for a, b in zip(child.counts, counts)]
+                child.sum += total
+                child.count += count
+            else:
+                child.value += delta[0]
+
+    def collect(self, state: SimulatorState) -> None:
+        """Refresh the scrape-time gauges; runs on the protocol engine loop."""
+        for role, count in state.role_counts().items():
+            self.sessions.labels(role).set(count)
+        records, capacity = state.traffic_occupancy()
+        self.traffic_buffer.labels("records").set(records)
+        self.traffic_buffer.labels("capacity").set(capacity)
+        sizes = state.outbound_queue_sizes()
+        self.outbound_queue.labels("total").set(sum(sizes))
+        self.outbound_queue.labels("max").set(max(sizes, default=0))
+        self.backlogged_sessions.labels().set(sum(1 for size in sizes if size))
+        in_flight, queued = state.link_window_sizes()
+        self.link_window.labels("in_flight").set(in_flight)
+        self.link_window.labels("queued").set(queued)
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+from .payloads import Field, Layout
+
+# Data field layouts per MID and revision, transcribed from the Open Protocol
+# specification (R 2.16.0). Every revision the simulator renders is listed
+# explicitly; revisions that extend an earlier one are built by concatenation.
+# Defaults describe the simulated controller.
+
+F = Field
+
+_TIMESTAMP = 19
+
+# MID 0002 Application Communication start acknowledge.
+_0002_R1: Layout = (
+    F("01", "cell_id", 4, "num", 1),
+    F("02", "channel_id", 2, "num", 1),
+    F("03", "controller_name", 25, default="OpenProtocolSim"),
+)
+_0002_R2 = _0002_R1 + (F("04", "supplier_code", 3, default="ACT"),)
+_0002_R3 = _0002_R2 + (
+    F("05", "open_protocol_version", 19, default="2.16.0"),
+    F("06", "controller_software_version", 19, default="sim-0.1.0"),
+    F("07", "tool_software_version", 19, default="sim-tool-0.1"),
+)
+_0002_R4 = _0002_R3 + (
+    F("08", "rbu_type", 24, default="SIM-RBU"),
+    F("09", "controller_serial_number", 10, default="SIM0000001"),
+)
+_0002_R5 = _0002_R4 + (
+    F("10", "system_type", 3, "num", 3),
+    F("11", "system_subtype", 3, "num", 1),
+)
+_0002_R6 = _0002_R5 + (
+    F("12", "sequence_number_support", 1, "num", 1),
+    F("13", "linking_handling_support", 1, "num", 1),
+    F("14", "station_id", 10, "num", 1),
+    F("15", "station_name", 25, default="Simulator Station"),
+    F("16", "client_id", 1, "num", 1),
+)
+_0002_R7 = _0002_R6 + (F("17", "optional_keep_alive", 1, "num", 0),)
+
+# MID 0006 / 0008 / 0009: generic data request, subscribe and unsubscribe.
+_GENERIC_REQUEST: Layout = (
+    F(None, "mid", 4, "num"),
+    F(None, "revision", 3, "num", 1),
+    F(None, "extra_data", 2, "lstr"),
+)
+
+# MID 0013 Parameter set data upload reply.
+_0013_R1: Layout = (
+    F("01", "pset_id", 3, "num"),
+    F("02", "pset_name", 25),
+    F("03", "rotation_direction", 1, "num", 1),
+    F("04", "batch_size", 2, "num"),
+    F("05", "torque_min", 6, "num", scale=100),
+    F("06", "torque_max", 6, "num", scale=100),
+    F("07", "torque_final_target", 6, "num", scale=100),
+    F("08", "angle_min", 5, "num"),
+    F("09", "angle_max", 5, "num"),
+    F("10", "final_angle_target", 5, "num"),
+)
+_0013_R2 = _0013_R1 + (
+    F("11", "first_target", 6, "num", scale=100),
+    F("12", "start_final_angle", 6, "num", scale=100),
+)
+
+
+def _renumbered(fields: Layout, offset: int) -> Layout:
+    return tuple(replace(f, pid=f"{int(f.pid) + offset:02d}") for f in fields)
+
+
+# MID 0015 Parameter set selected.
+_0015_R2 = _0013_R1[:2] + (F("03", "pset_last_change", _TIMESTAMP),) + _renumbered(_0013_R2[2:], 1)
+
+# MID 0035 Job info.
+_0035_R1: Layout = (
+    F("01", "job_id", 2, "num"),
+    F("02", "job_status", 1, "num"),
+    F("03", "job_batch_mode", 1, "num"),
+    F("04", "job_batch_size", 4, "num"),
+    F("05", "job_batch_counter", 4, "num"),
+    F("06", "timestamp", _TIMESTAMP),
+)
+_0035_R2 = (F("01", "job_id", 4, "num"),) + _0035_R1[1:]
+_0035_R3 = _0035_R2 + (
+    F("07", "job_current_step", 3, "num"),
+    F("08", "job_total_steps", 3, "num"),
+    F("09", "job_step_type", 2, "num"),
+)
+
+# MID 0041 Tool data upload reply.
+_0041_R1: Layout = (
+    F("01", "tool_serial_number", 14, default="SIMTOOL0000001"),
+    F("02", "tightening_count", 10, "num"),
+    F("03", "last_calibration_date", _TIMESTAMP),
+    F("04", "controller_serial_number", 10, default="SIM0000001"),
+)
+_0041_R2 = _0041_R1 + (
+    F("05", "calibration_value", 6, "num", scale=100),
+    F("06", "last_service_date", _TIMESTAMP),
+    F("07", "tightenings_since_service", 10, "num"),
+    F("08", "tool_type", 2, "num", 1),
+    F("09", "motor_size", 2, "num"),
+    F("10", "open_end_data", 3, "num"),
+    F("11", "controller_software_version", 19, default="sim-0.1.0"),
+)
+
+# MID 0052 Vehicle ID Number.
+_IDENTIFIERS: Layout = (
+    F("01", "vin", 25),
+    F("02", "identifier_part_2", 25),
+    F("03", "identifier_part_3", 25),
+    F("04", "identifier_part_4", 25),
+)
+
+# MID 0061 Last tightening result data, revision 1.
+_0061_R1: Layout = (
+    F("01", "cell_id", 4, "num", 1),
+    F("02", "channel_id", 2, "num", 1),
+    F("03", "controller_name", 25, default="OpenProtocolSim"),
+    F("04", "vin", 25),
+    F("05", "job_id", 2, "num"),
+    F("06", "pset_id", 3, "num"),
+    F("07", "batch_size", 4, "num"),
+    F("08", "batch_counter", 4, "num"),
+    F("09", "tightening_status", 1, "num"),
+    F("10", "torque_status", 1, "num", 1),
+    F("11", "angle_status", 1, "num", 1),
+    F("12", "torque_min", 6, "num", scale=100),
+    F("13", "torque_max", 6, "num", scale=100),
+    F("14", "torque_final_target", 6, "num", scale=100),
+    F("15", "torque", 6, "num", scale=100),
+    F("16", "angle_min", 5, "num"),
+    F("17", "angle_max", 5, "num"),
+    F("18", "final_angle_target", 5, "num"),
+    F("19", "angle", 5, "num"),
+    F("20", "timestamp", _TIMESTAMP),
+    F("21", "pset_last_change", _TIMESTAMP),
+    F("22", "batch_status", 1, "num", 2),
+    F("23", "tightening_id", 10, "num"),
+)
+
+# MID 0065 Old tightening result upload reply, revision 1.
+_0065_R1: Layout = (
+    F("01", "tightening_id", 10, "num"),
+    F("02", "vin", 25),
+    F("03", "pset_id", 3, "num"),
+    F("04", "batch_counter", 4, "num"),
+    F("05", "tightening_status", 1, "num"),
+    F("06", "torque_status", 1, "num", 1),
+    F("07", "angle_status", 1, "num", 1),
+    F("08", "torque", 6, "num", scale=100),
+    F("09", "angle", 5, "num"),
+    F("10", "timestamp", _TIMESTAMP),
+    F("11", "batch_status", 1, "num", 2),
+)
+
+# MID 0071 Alarm / MID 0076 Alarm status.
+_0071_R1: Layout = (
+    F("01", "error_code", 4),
+    F("02", "controller_ready", 1, "num", 1),
+    F("03", "tool_ready", 1, "num", 1),
+    F("04", "timestamp", _TIMESTAMP),
+)
+_0071_R2 = (F("01", "error_code", 5),) + _0071_R1[1:]
+_0071_R3 = _0071_R2 + (
+    F("05", "tool_health", 1, "num", 1),
+    F("06", "alarm_text", 50),
+)
+_0076_R1: Layout = (
+    F("01", "alarm_status", 1, "num"),
+    F("02", "error_code", 4),
+    F("03", "controller_ready", 1, "num", 1),
+    F("04", "tool_ready", 1, "num", 1),
+    F("05", "timestamp", _TIMESTAMP),
+)
+_0076_R2 = _0076_R1[:1] + (F("02", "error_code", 5),) + _0076_R1[2:]
+_0076_R3 = _0076_R2 + (F("06", "tool_health", 1, "num", 1),)
+
+# MID 1201 Operation result overall data / MID 1202 object data, revision 1.
+_1201_R1: Layout = (
+    F(None, "total_messages", 3, "num", 1),
+    F(None, "message_number", 3, "num", 1),
+    F(None, "result_id", 10, "num"),
+    F(None, "timestamp", _TIMESTAMP),
+    F(None, "result_status", 1, "num"),
+    F(None, "operation_type", 2, "num"),
+    F(None, "objects", 3, "list", items=(F(None, "object_id", 4, "num"), F(None, "object_status", 1, "num"))),
+    F(None, "data_fields", 3, "vfields"),
+)
+_1202_R1: Layout = (
+    F(None, "total_messages", 3, "num", 2),
+    F(None, "message_number", 3, "num", 2),
+    F(None, "result_id", 10, "num"),
+    F(None, "object_id", 4, "num"),
+    F(None, "data_fields", 3, "vfields"),
+)
+
+# MID 0900 Trace curve data.
+_0900_R1: Layout = (
+    F(None, "result_id", 10, "num"),
+    F(None, "timestamp", _TIMESTAMP),
+    F(None, "data_fields", 3, "vfields"),
+    F(None, "trace_type", 2, "num", 1),
+    F(None, "transducer_type", 2, "num", 1),
+    F(None, "unit", 3, "num", 1),
+    F(None, "parameter_fields", 3, "vfields"),
+    F(None, "resolution_fields", 3, "num", 0),
+    F(None, "sample_count", 5, "num"),
+    F(None, "separator", 1, default="\x00"),
+    F(None, "samples", 0, "bin"),
+)
+
+PAYLOAD_LAYOUTS: dict[str, dict[int, Layout]] = {
+    "0002": {1: _0002_R1, 2: _0002_R2, 3: _0002_R3, 4: _0002_R4, 5: _0002_R5, 6: _0002_R6, 7: _0002_R7},
+    "0004": {1: (F(None, "mid", 4, "num"), F(None, "error_code", 2, "num"))},
+    "0005": {1: (F(None, "mid", 4, "num"),)},
+    "0006": {1: _GENERIC_REQUEST},
+    "0008": {1: _GENERIC_REQUEST},
+    "0009": {1: _GENERIC_REQUEST},
+    "0011": {1: (F(None, "pset_ids", 3, "list", items=(F(None, "pset_id", 3, "num"),)),)},
+    "0012": {1: (F(None, "pset_id", 3, "num"),)},
+    "0013": {1: _0013_R1, 2: _0013_R2},
+    "0015": {1: (F(None, "pset_id", 3, "num"), F(None, "pset_last_change", _TIMESTAMP)), 2: _0015_R2},
+    "0018": {1: (F(None, "pset_id", 3, "num"),)},
+    "0019": {
+        1: (F(None, "pset_id", 3, "num"), F(None, "batch_size", 2, "num")),
+        2: (F(None, "pset_id", 3, "num"), F(None, "batch_size", 4, "num")),
+    },
+    "0022": {1: (F(None, "relay_status", 1, "num", 1),)},
+    "0031": {
+        1: (F(None, "job_ids", 2, "list", items=(F(None, "job_id", 2, "num"),)),),
+        2: (F(None, "job_ids", 4, "list", items=(F(None, "job_id", 4, "num"),)),),
+    },
+    "0032": {1: (F(None, "job_id", 2, "num"),), 2: (F(None, "job_id", 4, "num"),)},
+    "0035": {1: _0035_R1, 2: _0035_R2, 3: _0035_R3},
+    "0038": {1: (F(None, "job_id", 2, "num"),), 2: (F(None, "job_id", 4, "num"),)},
+    "0041": {1: _0041_R1, 2: _0041_R2},
+    "0046": {1: (F("01", "primary_tool", 2, "num"),)},
+    "0052": {1: (F(None, "vin", 25),), 2: _IDENTIFIERS},
+    "0061": {1: _0061_R1},
+    "0064": {1: (F(None, "tightening_id", 10, "num"),)},
+    "0065": {1: _0065_R1},
+    "0071": {1: _0071_R1, 2: _0071_R2, 3: _0071_R3},
+    "0076": {1: _0076_R1, 2: _0076_R2, 3: _0076_R3},
+    "0081": {1: (F(None, "time", _TIMESTAMP),)},
+    "0082": {1: (F(None, "time", _TIMESTAMP),)},
+    "0211": {1: tuple(F(None, f"digital_input_{n}", 1, "num") for n in range(1, 9))},
+    "0215": {
+        1: (
+            F("01", "device_id", 2, "num"),
+            F("02", "relay_list", 32, default="0000" * 8),
+            F("03", "digital_input_list", 32, default="0000" * 8),
+        )
+    },
+    "0217": {1: (F("01", "relay_function", 3, "num", 1), F("02", "relay_status", 1, "num", 1))},
+    "0219": {1: (F(None, "relay_function", 3, "num"),)},
+    "0221": {1: (F("01", "digital_input_function", 3, "num", 1), F("02", "digital_input_status", 1, "num", 1))},
+    "0223": {1: (F(None, "digital_input_function", 3, "num"),)},
+    "0240": {1: (F(None, "user_data", 0),)},
+    "0242": {1: (F(None, "user_data", 0),)},
+    "0251": {
+        1: (
+            F("01", "device_id", 2, "num", 1),
+            F("02", "sockets", 2, "list", items=(F(None, "lifted", 1, "num", 0),)),
+        )
+    },
+    "0262": {1: (F("01", "tool_tag_id", 8, default="3200078D"),)},
+    "0401": {1: (F(None, "manual_mode", 1, "num", 0),)},
+    "0411": {1: (F(None, "auto_disable", 2, "num", 0), F(None, "current_batch", 2, "num"))},
+    "0421": {1: (F(None, "commands_disabled", 1, "num", 0),)},
+    "0501": {1: (F("01", "motor_tune_result", 1, "num", 1),)},
+    "0900": {1: _0900_R1},
+    "1000": {1: (F(None, "error_code", 5), F(None, "timestamp", _TIMESTAMP), F(None, "data_fields", 3, "vfields"))},
+    "1201": {1: _1201_R1},
+    "1202": {1: _1202_R1},
+    "2601": {1: (F(None, "modes", 3, "list", items=(F(None, "mode_id", 4, "num"), F(None, "mode_name", 2, "lstr"))),)},
+    "2602": {1: (F(None, "mode_id", 4, "num"),)},
+    "2603": {
+        1: (
+            F(None, "mode_id", 4, "num"),
+            F(None, "mode_name", 2, "lstr"),
+            F(
+                None,
+                "bolts",
+                3,
+                "list",
+                items=(
+                    F(None, "pset_id", 3, "num"),
+                    F(None, "tool_number", 3, "num"),
+                    F(None, "bolt_number", 4, "num"),
+                    F(None, "bolt_name", 2, "lstr"),
+                ),
+            ),
+        )
+    },
+    "2606": {1: (F(None, "mode_id", 4, "num"),)},
+}
+
+# Field names extracted from the specification tables (catalog ``payload_schema``)
+# mapped onto the names used by the in-tree layouts and the state's value sources.
+SCHEMA_FIELD_NAMES: dict[str, str] = {
+    "mid_number_accepted": "mid",
+    "vin_number": "vin",
+    "parameter_set_id": "pset_id",
+    "parameter_set_number": "pset_id",
+    "parameter_set_name": "pset_name",
+    "date_time_of_last_change_in_parameter_set_settin": "pset_last_change",
+    "date_of_last_change_in_parameter_set_setting": "pset_last_change",
+    "time_stamp": "timestamp",
+    "torque_controller_name": "controller_name",
+    "torque_min_limit": "torque_min",
+    "torque_max_limit": "torque_max",
+    "tool_number_of_tightening": "tightening_count",
+    "controller_serial_number_ford_rbu_serial_normal": "controller_serial_number",
+    "identifier_result_part_2": "identifier_part_2",
+    "identifier_result_part_3": "identifier_part_3",
+    "identifier_result_part_4": "identifier_part_4",
+}
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Iterator, Mapping, Sequence
+
+from .mid_catalog import MidCatalog
+from .protocol import encode_variable_fields
+
+FIELD_TYPES = ("num", "str", "lstr", "list", "vfields", "bin")
+
+# Width of the count prefix in front of variable data fields.
+VFIELD_COUNT_WIDTH = 3
+# PID, length, data type, unit and step number in front of each variable data value.
+VFIELD_HEADER_WIDTH = 17
+# Binary tails are handed to the segmenter in pieces of this many bytes (a whole number of samples).
+BINARY_PIECE = 512
+
+_MISSING = object()
+
+
+@dataclass(frozen=True, slots=True)
+class Field:
+    """One data field of a MID payload layout.
+
+    ``num`` fields are right-aligned and zero-padded; ``scale`` converts the
+    engineering value to the transmitted integer (e.g. torque x 100). ``str``
+    fields are left-aligned and space-padded, or take the rest of the payload
+    when ``length`` is 0. ``lstr`` is text preceded by its own ``length``-digit
+    size. ``list`` repeats ``items`` after a ``length``-digit count,
+    ``vfields`` is a block of variable data fields, and ``bin`` is the raw
+    binary tail of the payload.
+    """
+
+    pid: str | None
+    name: str
+    length: int
+    type: str = "str"
+    default: Any = None
+    scale: int = 1
+    items: tuple[Field, ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping[str, Any], names: Mapping[str, str] | None = None) -> Field:
+        """Build a field from a catalog ``payload_schema`` entry, renamed through ``names``."""
+        kind = raw.get("type", "str")
+        if kind not in FIELD_TYPES:
+            raise ValueError(f"unknown payload field type {kind!r}")
+        name = raw["name"]
+        return cls(
+            pid=raw.get("pid"),
+            name=names.get(name, name) if names else name,
+            length=int(raw["length"]),
+            type=kind,
+            default=raw.get("default"),
+            scale=int(raw.get("scale", 1)),
+            items=tuple(cls.from_dict(item, names) for item in raw.get("items", ())),
+        )
+
+
+Layout = tuple[Field, ...]
+
+
+def layouts_from_schema(schema: Mapping[str, Any], names: Mapping[str, str] | None = None) -> dict[int, Layout]:
+    """Per-revision layouts from a catalog ``payload_schema`` (``{"<rev>": [field, ...]}``).
+
+    ``names`` maps the field names taken from the specification tables onto the
+    names the simulator's value sources use.
+    """
+    return {int(rev): tuple(Field.from_dict(raw, names) for raw in fields) for rev, fields in schema.items()}
+
+
+def _merge_layouts(in_tree: Mapping[int, Layout], extracted: Mapping[int, Layout]) -> dict[int, Layout]:
+    """Catalog revisions of one MID overlaid with the in-tree ones.
+
+    Catalog fields without a default take the default of the in-tree field of
+    the same name, so e.g. the controller name reads the same at every revision.
+    """
+    defaults = {f.name: f.default for layout in in_tree.values() for f in layout if f.default is not None}
+    merged: dict[int, Layout] = {}
+    for revision, fields in extracted.items():
+        merged[revision] = tuple(
+            replace(f, default=defaults[f.name]) if f.default is None and f.name in defaults else f for f in fields
+        )
+    merged.update(in_tree)
+    return merged
+
+
+def _encode_num(width: int, scale: int) -> Callable[[Any], str]:
+    limit = 10**width - 1
+    pad = f"{{:0{width}d}}".format
+
+    def encode(value: Any) -> str:
+        if scale == 1:
+            # State domains mostly hold ids as zero-padded strings already.
+            if value.__class__ is str and len(value) == width and value.isdigit():
+                return value
+            if value.__class__ is int and 0 <= value <= limit:
+                return pad(value)
+        try:
+            number = int(float(value) * scale) if scale != 1 else int(value)
+        except (TypeError, ValueError):
+            # State domains are writable over REST; malformed values render as zeros
+            # instead of failing the whole push.
+            number = 0
+        return pad(min(max(number, 0), limit))
+
+    return encode
+
+
+def _encode_str(width: int) -> Callable[[Any], str]:
+    if width == 0:
+        return lambda value: "" if value is None else str(value)
+    return lambda value: ("" if value is None else str(value)).ljust(width)[:width]
+
+
+def _encode_lstr(width: int) -> Callable[[Any], str]:
+    limit = 10**width - 1
+
+    def encode(value: Any) -> str:
+        text = ("" if value is None else str(value))[:limit]
+        return str(len(text)).rjust(width, "0") + text
+
+    return encode
+
+
+def _encode_list(width: int, items: Layout) -> Callable[[Any], str]:
+    limit = 10**width - 1
+    parts = tuple((item.pid or "", item.name, item.default, _encoder(item)) for item in items)
+    if len(parts) == 1:
+        pid, _, default, encode_item = parts[0]
+
+        def encode(values: Any) -> str:
+            values = list(values or ())[:limit]
+            body = "".join(pid + encode_item(default if v is None else v) for v in values)
+            return str(len(values)).rjust(width, "0") + body
+
+        return encode
+
+    def encode(values: Any) -> str:
+        values = list(values or ())[:limit]
+        body = "".join(
+            pid + encode_item(entry.get(name, default)) for entry in values for pid, name, default, encode_item in parts
+        )
+        return str(len(values)).rjust(width, "0") + body
+
+    return encode
+
+
+def _encode_vfields(value: Any) -> str:
+    return encode_variable_fields(value or ()).decode("ascii")
+
+
+def _encoder(field: Field) -> Callable[[Any], str]:
+    if field.type == "num":
+        return _encode_num(field.length, field.scale)
+    if field.type == "str":
+        return _encode_str(field.length)
+    if field.type == "lstr":
+        return _encode_lstr(field.length)
+    if field.type == "list":
+        return _encode_list(field.length, field.items)
+    if field.type == "vfields":
+        return _encode_vfields
+    raise ValueError(f"{field.type!r} fields have no text encoding")
+
+
+def _decode_num(text: str, scale: int) -> int | float | None:
+    text = text.strip()
+    if not text.isdigit():
+        return None
+    return int(text) / scale if scale != 1 else int(text)
+
+
+def _decode_field(field: Field, text: str, pos: int) -> tuple[Any, int]:
+    """Decode ``field`` at ``pos`` of ``text``; returns the value and the next position."""
+    if field.type == "num":
+        end = pos + field.length
+        return _decode_num(text[pos:end], field.scale), end
+    if field.type == "str":
+        end = len(text) if field.length == 0 else pos + field.length
+        return text[pos:end].rstrip(), end
+    if field.type == "lstr":
+        size = _decode_num(text[pos : pos + field.length], 1) or 0
+        start = pos + field.length
+        return text[start : start + size], start + size
+    if field.type == "list":
+        count = _decode_num(text[pos : pos + field.length], 1) or 0
+        pos += field.length
+        values: list[Any] = []
+        for _ in range(count):
+            entry: dict[str, Any] = {}
+            for item in field.items:
+                pos += len(item.pid or "")
+                entry[item.name], pos = _decode_field(item, text, pos)
+            values.append(entry[field.items[0].name] if len(field.items) == 1 else entry)
+        return values, pos
+    if field.type == "vfields":
+        count = _decode_num(text[pos : pos + VFIELD_COUNT_WIDTH], 1) or 0
+        pos += VFIELD_COUNT_WIDTH
+        fields = []
+        for _ in range(count):
+            head = text[pos : pos + VFIELD_HEADER_WIDTH]
+            size = _decode_num(head[5:8], 1) or 0
+            start = pos + VFIELD_HEADER_WIDTH
+            fields.append(
+                {
+                    "pid": _decode_num(head[0:5], 1),
+                    "data_type": head[8:10].strip(),
+                    "unit": head[10:13].strip(),
+                    "step": _decode_num(head[13:17], 1),
+                    "value": text[start : start + size],
+                }
+            )
+            pos = start + size
+        return fields, pos
+    raise ValueError(f"{field.type!r} fields have no text decoding")
+
+
+def _pack_samples(points: Sequence[Any]) -> bytes:
+    try:
+        return struct.pack(f">{len(points)}h", *points)
+    except struct.error:
+        # Out-of-range or non-integer points (traces come in over REST) are clamped one by one.
+        return struct.pack(f">{len(points)}h", *(max(-32768, min(32767, int(p))) for p in points))
+
+
+class Samples:
+    """Big-endian 16-bit curve samples for a binary tail, packed only when read.
+
+    ``bytes()`` packs them all; :meth:`chunks` packs them a slice at a time, so
+    a long trace sent as linked parts is never held encoded in full.
+    """
+
+    __slots__ = ("points",)
+
+    def __init__(self, points: Sequence[Any]):
+        self.points = points
+
+    def __len__(self) -> int:
+        return 2 * len(self.points)
+
+    def __bytes__(self) -> bytes:
+        return _pack_samples(self.points)
+
+    def chunks(self, size: int) -> Iterator[bytes]:
+        step = max(size // 2, 1)
+        for start in range(0, len(self.points), step):
+            yield _pack_samples(self.points[start : start + step])
+
+
+def _binary_pieces(value: Any, size: int) -> Iterator[bytes]:
+    if isinstance(value, Samples):
+        yield from value.chunks(size)
+        return
+    view = memoryview(bytes(value))
+    for start in range(0, len(view), size):
+        yield bytes(view[start : start + size])
+
+
+class PayloadCodec:
+    """Encoder and decoder for one MID revision, compiled from its field layout.
+
+    The text part of a payload is rendered with a single ``str.format`` call
+    over a template holding the parameter ids, so encoding cost depends only on
+    the number of fields. Decoding walks the same table; fields missing from a
+    short payload are left out of the result.
+    """
+
+    __slots__ = ("mid", "revision", "fields", "_template", "_pids", "_encoders", "_binary")
+
+    def __init__(self, mid: str, revision: int, fields: Layout):
+        for field in fields[:-1]:
+            if field.type == "bin" or (field.type == "str" and field.length == 0):
+                raise ValueError(f"MID {mid} rev {revision}: {field.name!r} must be the last field")
+        self.mid = mid
+        self.revision = revision
+        self.fields = fields
+        binary = fields[-1] if fields and fields[-1].type == "bin" else None
+        text_fields = fields[:-1] if binary else fields
+        self._template = "".join((f.pid or "") + "{}" for f in text_fields)
+        self._pids = tuple(f.pid or "" for f in text_fields)
+        # Fields absent from the values render their default, encoded once here.
+        self._encoders = tuple((f.name, _encoder(f)(f.default), _encoder(f)) for f in text_fields)
+        self._binary = binary.name if binary else None
+
+    def encode(self, values: Mapping[str, Any]) -> bytes:
+        text = self._template.format(
+            *[
+                default if (value := values.get(name, _MISSING)) is _MISSING else encode(value)
+                for name, default, encode in self._encoders
+            ]
+        )
+        data = text.encode("ascii", errors="replace")
+        if self._binary is not None:
+            data += bytes(values.get(self._binary) or b"")
+        return data
+
+    @property
+    def binary(self) -> bool:
+        return self._binary is not None
+
+    def encode_pieces(self, values: Mapping[str, Any], piece_size: int = BINARY_PIECE) -> tuple[list[int], Iterator[bytes]]:
+        """Encode ``values`` one field at a time, for payloads sent as linked parts.
+
+        Returns every piece's size up front and an iterator over the pieces:
+        one per text field, then the binary tail in ``piece_size`` slices,
+        which are only encoded as the iterator reaches them.
+        """
+        pieces = [
+            (pid + (default if (value := values.get(name, _MISSING)) is _MISSING else encode(value))).encode(
+                "ascii", errors="replace"
+            )
+            for pid, (name, default, encode) in zip(self._pids, self._encoders)
+        ]
+        sizes = [len(piece) for piece in pieces]
+        tail = values.get(self._binary) if self._binary is not None else None
+        if not tail:
+            return sizes, iter(pieces)
+        whole, rest = divmod(len(tail), piece_size)
+        sizes += [piece_size] * whole + ([rest] if rest else [])
+
+        def stream() -> Iterator[bytes]:
+            yield from pieces
+            yield from _binary_pieces(tail, piece_size)
+
+        return sizes, stream()
+
+    def decode(self, data: bytes) -> dict[str, Any]:
+        text = data.decode("latin-1")
+        values: dict[str, Any] = {}
+        pos = 0
+        for field in self.fields:
+            pos += len(field.pid or "")
+            if pos >= len(text):
+                break
+            if field.type == "bin":
+                values[field.name] = data[pos:]
+                break
+            values[field.name], pos = _decode_field(field, text, pos)
+        return values
+
+
+class CodecRegistry:
+    """Payload codecs for every catalog MID and revision, compiled once.
+
+    Layouts come from the catalog's ``payload_schema``, with field names mapped
+    through ``names``; revisions in ``layouts`` (maintained in-tree) replace
+    the catalog's. Only revisions with a layout are rendered; a request for
+    another revision gets the highest one below it. MIDs without any layout
+    carry an empty payload at every catalog revision.
+    """
+
+    def __init__(
+        self,
+        catalog: MidCatalog,
+        layouts: Mapping[str, Mapping[int, Layout]],
+        names: Mapping[str, str] | None = None,
+    ):
+        self._codecs: dict[tuple[str, int], PayloadCodec] = {}
+        self._revisions: dict[str, tuple[int, ...]] = {}
+        self._resolved: dict[tuple[str, int], int] = {}
+        for mid in catalog.mids():
+            definition = catalog.get(mid)
+            by_revision = _merge_layouts(layouts.get(mid, {}), layouts_from_schema(definition.payload_schema, names))
+            if by_revision:
+                revisions = tuple(sorted(by_revision))
+            else:
+                revisions = tuple(sorted(r for r in definition.supported_revisions if r > 0)) or (1,)
+            self._revisions[mid] = revisions
+            compiled: dict[int, PayloadCodec] = {}
+            for revision in revisions:
+                fields = by_revision.get(revision, ())
+                # Revisions sharing one layout tuple share the compiled codec.
+                codec = compiled.get(id(fields))
+                if codec is None:
+                    codec = compiled[id(fields)] = PayloadCodec(mid, revision, fields)
+                self._codecs[(mid, revision)] = codec
+
+    def revision_for(self, mid: str, requested: int) -> int:
+        """The highest renderable revision of ``mid`` not above ``requested`` (0 counts as 1)."""
+        resolved = self._resolved.get((mid, requested))
+        if resolved is None:
+            revisions = self._revisions.get(mid, (1,))
+            eligible = [r for r in revisions if r <= max(requested, 1)]
+            resolved = self._resolved[(mid, requested)] = eligible[-1] if eligible else revisions[0]
+        return resolved
+
+    def get(self, mid: str, revision: int) -> PayloadCodec:
+        codec = self._codecs.get((mid, revision))
+        if codec is None:
+            codec = self._codecs.get((mid, self.revision_for(mid, revision)))
+            if codec is None:
+                codec = self._codecs[(mid, revision)] = PayloadCodec(mid, revision, ())
+        return codec
+
+    def encode(self, mid: str, revision: int, values: Mapping[str, Any]) -> bytes:
+        return self.get(mid, revision).encode(values)
+
+    def decode(self, mid: str, revision: int, data: bytes) -> dict[str, Any]:
+        return self.get(mid, revision).decode(data)
@@ -2,10 +2,9 @@ from __future__ import annotations
 
 import json
 import logging
-from dataclasses import asdict
-from datetime import datetime, timezone
 from typing import Any
 
+from . import clock
 from .types import TrafficRecord
 
 LOG = logging.getLogger(__name__)
@@ -26,7 +25,7 @@ class PersistenceStore:
 
     def _init_sqlalchemy(self) -> None:
         try:
-            from sqlalchemy import Column, DateTime, Integer, String, Text, create_engine
+            from sqlalchemy import Column, DateTime, Integer, String, Text, create_engine, inspect
             from sqlalchemy.orm import declarative_base, sessionmaker
         except Exception as exc:  # pragma: no cover - import guard
             LOG.warning("SQLAlchemy unavailable, disabling persistence: %s", exc)
@@ -53,9 +52,17 @@ class PersistenceStore:
             length = Column(Integer, nullable=False)
             raw_ascii = Column(Text, nullable=False)
             decoded_data = Column(Text, nullable=False)
+            reply_to = Column(Integer, nullable=True)
+            timings_ms = Column(Text, nullable=True)
 
         engine = create_engine(f"sqlite:///{self.db_path}", future=True)
         Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            # Databases written before traffic records carried lifecycle stamps.
+            existing = {column["name"] for column in inspect(conn).get_columns("traffic")}
+            for name, kind in (("reply_to", "INTEGER"), ("timings_ms", "TEXT")):
+                if name not in existing:
+                    conn.exec_driver_sql(f"ALTER TABLE traffic ADD COLUMN {name} {kind}")
         self._Session = sessionmaker(bind=engine, expire_on_commit=False)
         self.StateSnapshot = StateSnapshot
         self.Traffic = Traffic
@@ -76,7 +83,7 @@ class PersistenceStore:
             return
         assert self._Session is not None and self.StateSnapshot is not None
         payload = json.dumps(state)
-        now = datetime.now(timezone.utc)
+        now = clock.now()
         with self._Session() as session:
             row = session.get(self.StateSnapshot, 1)
             if row is None:
@@ -88,22 +95,28 @@ class PersistenceStore:
             session.commit()
 
     def append_traffic(self, record: TrafficRecord) -> None:
-        if not (self.enabled and self._initialized):
+        self.append_traffic_many([record])
+
+    def append_traffic_many(self, records: list[TrafficRecord]) -> None:
+        if not (self.enabled and self._initialized) or not records:
             return
         assert self._Session is not None and self.Traffic is not None
-        payload = asdict(record)
+        rows = [
+            {
+                "timestamp": r.timestamp,
+                "session_id": r.session_id,
+                "role": r.role.value,
+                "direction": r.direction,
+                "mid": r.mid,
+                "revision": r.revision,
+                "length": r.length,
+                "raw_ascii": r.raw_ascii,
+                "decoded_data": r.decoded_data,
+                "reply_to": r.reply_to,
+                "timings_ms": None if r.trace is None else json.dumps(r.trace.offsets_ms()),
+            }
+            for r in records
+        ]
         with self._Session() as session:
-            row = self.Traffic(
-                timestamp=payload["timestamp"],
-                session_id=payload["session_id"],
-                role=payload["role"].value,
-                direction=payload["direction"],
-                mid=payload["mid"],
-                revision=payload["revision"],
-                length=payload["length"],
-                raw_ascii=payload["raw_ascii"],
-                decoded_data=payload["decoded_data"],
-            )
-            session.add(row)
+            session.execute(self.Traffic.__table__.insert(), rows)
             session.commit()
-
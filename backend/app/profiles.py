@@ -54,6 +54,10 @@ class ProfileStore:
             raise KeyError(name)
         self._active = name
 
+    def view(self, active: str) -> "ProfileStore":
+        """Another store over the same loaded profiles with its own active selection."""
+        return ProfileStore(self._profiles, active)
+
     def names(self) -> list[str]:
         return list(self._profiles.keys())
 
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from dataclasses import replace
 from typing import Iterable
 
 from .types import OpenProtocolHeader, OpenProtocolMessage
@@ -90,43 +89,52 @@ def build_message(
 
 
 def parse_stream_buffer(buffer: bytearray) -> list[OpenProtocolMessage]:
+    messages, consumed = split_frames(buffer, 0, len(buffer))
+    if consumed:
+        del buffer[:consumed]
+    return messages
+
+
+def split_frames(buffer: bytes | bytearray, start: int, end: int) -> tuple[list[OpenProtocolMessage], int]:
+    """Frame ``buffer[start:end]`` without mutating it.
+
+    Returns the complete messages and how many bytes (from ``start``) they and
+    any skipped noise consumed; an incomplete trailing frame is left in place.
+    """
     messages: list[OpenProtocolMessage] = []
+    pos = start
     while True:
-        if len(buffer) < 4:
-            return messages
-        length_field = bytes(buffer[0:4])
-        if not all(48 <= b <= 57 for b in length_field):
+        if end - pos < 4:
+            return messages, pos - start
+        length_field = bytes(buffer[pos : pos + 4])
+        if not length_field.isdigit():
             # Drop one byte and resync.
-            del buffer[0]
+            pos += 1
             continue
-        length = int(length_field.decode("ascii"))
+        length = int(length_field)
         if length < 20:
-            del buffer[0:4]
+            pos += 4
             continue
-        if len(buffer) < length:
-            return messages
+        if end - pos < length:
+            return messages, pos - start
 
-        raw_payload = bytes(buffer[:length])
-        del buffer[:length]
+        raw_payload = bytes(buffer[pos : pos + length])
+        pos += length
 
         # ASCII messages are usually NUL-terminated but length excludes NUL.
-        if buffer[:1] == NUL:
-            del buffer[:1]
+        if pos < end and buffer[pos] == 0:
+            pos += 1
             raw_payload_with_nul = raw_payload + NUL
         else:
             raw_payload_with_nul = raw_payload
 
-        header = parse_header(raw_payload[:20])
-        data = raw_payload[20:]
-        binary = header.mid == "0900"
-        messages.append(
-            OpenProtocolMessage(
-                header=replace(header, length=length),
-                data=data,
-                raw=raw_payload_with_nul,
-                binary=binary,
-            )
-        )
+        messages.append(decode_frame(raw_payload_with_nul))
+
+
+def decode_frame(raw: bytes) -> OpenProtocolMessage:
+    """One whole frame as cut by :func:`split_frames` (trailing NUL included), decoded without scanning."""
+    header = parse_header(raw[:20])
+    return OpenProtocolMessage(header=header, data=raw[20 : header.length], raw=raw, binary=header.mid == "0900")
 
 
 def ascii_payload(*parts: str) -> bytes:
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import random
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from . import clock
+from .distributions import Distribution
+from .types import ScenarioDefinition
+
+LOG = logging.getLogger(__name__)
+
+PublishFn = Callable[[str, dict[str, Any]], Awaitable[dict[str, Any]]]
+
+MAX_TIMELINE_EVENTS = 5_000_000
+# Publish results a job keeps (the latest ones); steps_done and pushed_messages count them all.
+RESULTS_TAIL = 100
+
+
+def load_scenarios(path: Path) -> dict[str, ScenarioDefinition]:
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        s["name"]: ScenarioDefinition(name=s["name"], steps=s.get("steps", []), seed=s.get("seed"))
+        for s in raw.get("scenarios", [])
+    }
+
+
+@dataclass
+class ScenarioTimeline:
+    """A scenario flattened into columns ordered by start offset.
+
+    Each entry is ``(offset, template)`` plus optional sampled parameters; a NaN
+    in a parameter column means the entry does not set that payload key.
+    """
+
+    offsets: array
+    template_ids: array
+    templates: list[tuple[str, dict[str, Any]]]
+    columns: dict[str, array]
+    bool_columns: frozenset[str]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def duration_sec(self) -> float:
+        return self.offsets[-1] if self.offsets else 0.0
+
+    def event_at(self, index: int) -> tuple[str, dict[str, Any]]:
+        event, base = self.templates[self.template_ids[index]]
+        payload = dict(base)
+        for name, column in self.columns.items():
+            value = column[index]
+            if value == value:
+                payload[name] = value >= 0.5 if name in self.bool_columns else value
+        return event, payload
+
+
+def _rate_offsets(node: dict[str, Any]) -> tuple[list[float], float]:
+    """Event offsets for a rate block with optional linear ramp-up/ramp-down.
+
+    The k-th event fires where the integral of the rate curve reaches ``k``, which
+    is inverted in closed form for each of the three segments.
+    """
+    if "rate_per_sec" in node:
+        rate = float(node["rate_per_sec"])
+    else:
+        rate = 1.0 / float(node["interval_sec"])
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    up = float(node.get("ramp_up_sec", 0.0))
+    down = float(node.get("ramp_down_sec", 0.0))
+    if "duration_sec" in node:
+        duration = float(node["duration_sec"])
+    elif "count" in node:
+        duration = int(node["count"]) / rate + (up + down) / 2
+    else:
+        raise ValueError("rate block needs duration_sec or count")
+    if up < 0 or down < 0 or up + down > duration:
+        raise ValueError("ramp_up_sec + ramp_down_sec must fit within the block duration")
+
+    plateau = duration - up - down
+    n_up = rate * up / 2
+    n_plateau = n_up + rate * plateau
+    total = n_plateau + rate * down / 2
+    if total > MAX_TIMELINE_EVENTS:
+        raise ValueError(f"rate block expands to {int(total)} events (max {MAX_TIMELINE_EVENTS})")
+
+    if "count" in node and "duration_sec" not in node:
+        events = int(node["count"])
+    else:
+        # The epsilon keeps a whole total that came out a hair below itself in floating point.
+        events = math.floor(total + 1e-9)
+    offsets: list[float] = []
+    for k in range(events):
+        if k <= n_up and up > 0:
+            t = math.sqrt(2 * up * k / rate)
+        elif k <= n_plateau:
+            t = up + (k - n_up) / rate
+        else:
+            x = k - n_plateau
+            t = up + plateau + down - math.sqrt(max(0.0, down * down - 2 * down * x / rate))
+        offsets.append(t)
+    return offsets, duration
+
+
+class _TimelineBuilder:
+    def __init__(self, seed: int | None):
+        self.rng = random.Random(seed)
+        self.offsets = array("d")
+        self.template_ids = array("I")
+        self.templates: list[tuple[str, dict[str, Any]]] = []
+        self.columns: dict[str, array] = {}
+        self.bool_columns: set[str] = set()
+        self.needs_sort = False
+        # Templates and distributions are parsed once per JSON node, not per repetition.
+        self._node_cache: dict[int, tuple[int, dict[str, Distribution]]] = {}
+
+    def _prepare(self, node: dict[str, Any]) -> tuple[int, dict[str, Distribution]]:
+        cached = self._node_cache.get(id(node))
+        if cached is None:
+            self.templates.append((node["event"], dict(node.get("payload", {}))))
+            params = {name: Distribution.from_spec(spec) for name, spec in node.get("params", {}).items()}
+            cached = (len(self.templates) - 1, params)
+            self._node_cache[id(node)] = cached
+        return cached
+
+    def emit(self, node: dict[str, Any], times: list[float]) -> None:
+        template_id, params = self._prepare(node)
+        start, n = len(self.offsets), len(times)
+        if start + n > MAX_TIMELINE_EVENTS:
+            raise ValueError(f"scenario expands past {MAX_TIMELINE_EVENTS} events")
+        self.offsets.extend(times)
+        self.template_ids.extend([template_id] * n)
+        for name, dist in params.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = array("d", [math.nan]) * start
+            column.extend(dist.sample(self.rng, times))
+            if dist.boolean:
+                self.bool_columns.add(name)
+        for name, column in self.columns.items():
+            if name not in params:
+                column.extend(array("d", [math.nan]) * n)
+
+    def compile_nodes(self, nodes: list[dict[str, Any]], cursor: float) -> float:
+        for node in nodes:
+            cursor = self.compile_node(node, cursor)
+        return cursor
+
+    def compile_node(self, node: dict[str, Any], cursor: float) -> float:
+        cursor += float(node.get("delay_sec", 0))
+        if "repeat" in node:
+            for _ in range(int(node["repeat"])):
+                cursor = self.compile_nodes(node.get("steps", []), cursor)
+            return cursor
+        if "parallel" in node:
+            self.needs_sort = True
+            return max([cursor] + [self.compile_nodes(branch, cursor) for branch in node["parallel"]])
+        if "rate_per_sec" in node or "interval_sec" in node:
+            offsets, duration = _rate_offsets(node)
+            self.emit(node, [cursor + t for t in offsets])
+            return cursor + duration
+        if "event" in node:
+            self.emit(node, [cursor])
+            return cursor
+        raise ValueError(f"unrecognized scenario step: {sorted(node.keys())}")
+
+    def build(self) -> ScenarioTimeline:
+        offsets, template_ids, columns = self.offsets, self.template_ids, self.columns
+        if self.needs_sort:
+            order = sorted(range(len(offsets)), key=offsets.__getitem__)
+            offsets = array("d", (offsets[i] for i in order))
+            template_ids = array("I", (template_ids[i] for i in order))
+            columns = {name: array("d", (col[i] for i in order)) for name, col in columns.items()}
+        return ScenarioTimeline(
+            offsets=offsets,
+            template_ids=template_ids,
+            templates=self.templates,
+            columns=columns,
+            bool_columns=frozenset(self.bool_columns),
+        )
+
+
+def compile_scenario(definition: ScenarioDefinition) -> ScenarioTimeline:
+    """Expand repeat/rate/parallel blocks and sample parameters into a timeline.
+
+    Step forms (all accept an optional leading ``delay_sec``):
+
+    - ``{"event", "payload", "params"}``: one event
+    - ``{"repeat": n, "steps": [...]}``: run the nested steps n times in sequence
+    - ``{"event", "rate_per_sec" | "interval_sec", "duration_sec" | "count",
+      "ramp_up_sec", "ramp_down_sec", "payload", "params"}``: a rate block
+    - ``{"parallel": [[...], [...]]}``: branches that start together
+
+    ``params`` maps payload keys to :class:`Distribution` specs sampled from the
+    scenario ``seed``, so the same definition always yields the same timeline.
+    """
+    builder = _TimelineBuilder(definition.seed)
+    builder.compile_nodes(definition.steps, 0.0)
+    return builder.build()
+
+
+@dataclass
+class ScenarioJob:
+    job_id: str
+    scenario: str
+    steps_total: int
+    payload: dict[str, Any]
+    status: str = "pending"
+    steps_done: int = 0
+    pushed_messages: int = 0
+    max_lag_ms: float = 0.0
+    error: str | None = None
+    created_at: datetime = field(default_factory=clock.now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    results: deque[dict[str, Any]] = field(default_factory=lambda: deque(maxlen=RESULTS_TAIL))
+    task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"completed", "cancelled", "failed"}
+
+    def to_dict(self, *, include_results: bool = False) -> dict[str, Any]:
+        out = {
+            "job_id": self.job_id,
+            "scenario": self.scenario,
+            "status": self.status,
+            "steps_total": self.steps_total,
+            "steps_done": self.steps_done,
+            "progress": round(self.steps_done / self.steps_total, 4) if self.steps_total else 1.0,
+            "pushed_messages": self.pushed_messages,
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if include_results:
+            out["results"] = list(self.results)
+        return out
+
+
+class ScenarioRunner:
+    """Runs scenarios as background jobs.
+
+    Steps are scheduled against absolute deadlines on the loop's monotonic clock
+    (``start + sum(delay_sec)``), so time spent publishing an event is absorbed
+    by the next sleep instead of accumulating as drift.
+    """
+
+    def __init__(
+        self,
+        scenarios: dict[str, ScenarioDefinition],
+        publish: PublishFn,
+        *,
+        history: int = 100,
+        timelines: dict[str, ScenarioTimeline] | None = None,
+    ):
+        self.scenarios = scenarios
+        self._publish = publish
+        self._history = history
+        self._jobs: OrderedDict[str, ScenarioJob] = OrderedDict()
+        # Compiled up front so malformed definitions fail at startup and runs never block on expansion.
+        # Timelines are immutable, so runners for several controllers can share one compiled set.
+        if timelines is None:
+            timelines = {name: compile_scenario(definition) for name, definition in scenarios.items()}
+        self._timelines = timelines
+
+    @property
+    def timelines(self) -> dict[str, ScenarioTimeline]:
+        return self._timelines
+
+    def names(self) -> list[str]:
+        return sorted(self.scenarios.keys())
+
+    def timeline(self, name: str) -> ScenarioTimeline:
+        return self._timelines[name]
+
+    def describe(self) -> list[dict[str, Any]]:
+        return [
+            {"name": name, "events": len(self._timelines[name]), "duration_sec": round(self._timelines[name].duration_sec, 3)}
+            for name in self.names()
+        ]
+
+    def start(self, name: str, payload: dict[str, Any] | None = None) -> ScenarioJob:
+        timeline = self.timeline(name)
+        job = ScenarioJob(
+            job_id=uuid.uuid4().hex[:12],
+            scenario=name,
+            steps_total=len(timeline),
+            payload=dict(payload or {}),
+        )
+        self._jobs[job.job_id] = job
+        self._prune()
+        job.task = asyncio.create_task(self._run(job, timeline))
+        return job
+
+    def get(self, job_id: str) -> ScenarioJob | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[ScenarioJob]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> ScenarioJob:
+        job = self._jobs[job_id]
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            if job.status == "pending":
+                # A task cancelled before its first run never enters _run to record it.
+                job.status = "cancelled"
+                job.finished_at = clock.now()
+        return job
+
+    async def wait(self, job: ScenarioJob) -> ScenarioJob:
+        if job.task is not None:
+            await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    async def stop(self) -> None:
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for job in list(self._jobs.values()):
+            self.cancel(job.job_id)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _prune(self) -> None:
+        # Keep every running job; evict the oldest finished ones beyond the history size.
+        excess = len(self._jobs) - self._history
+        for job_id in [jid for jid, j in self._jobs.items() if j.finished][: max(0, excess)]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: ScenarioJob, timeline: ScenarioTimeline) -> None:
+        job.status = "running"
+        job.started_at = clock.now()
+        start = clock.monotonic()
+        offsets = timeline.offsets
+        try:
+            for index in range(len(timeline)):
+                deadline = start + offsets[index]
+                wait = deadline - clock.monotonic()
+                if wait > 0:
+                    await clock.sleep(wait)
+                job.max_lag_ms = max(job.max_lag_ms, (clock.monotonic() - deadline) * 1000.0)
+
+                event, payload = timeline.event_at(index)
+                payload.update(job.payload)
+                result = await self._publish(event, payload)
+                job.results.append(result)
+                job.pushed_messages += result.get("pushed_messages", 0)
+                job.steps_done += 1
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as exc:
+            LOG.exception("Scenario job %s (%s) failed", job.job_id, job.scenario)
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            job.finished_at = clock.now()
@@ -2,14 +2,23 @@ from __future__ import annotations
 
 import asyncio
 import json
+import time
 import uuid
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable
 
+from . import clock
+from .latency import LatencyTracker, MessageTrace
+from .linking import MAX_PART_DATA, MAX_PARTS, LinkedPayload
+from .metrics import ProtocolMetrics
 from .mid_catalog import MidCatalog
+from .payload_layouts import PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES
+from .payloads import BINARY_PIECE, CodecRegistry, Samples
 from .persistence import PersistenceStore
 from .profiles import ProfileStore
-from .protocol import ascii_payload, build_message
+from .stream import StreamHub
 from .types import OpenProtocolMessage, SessionContext, SessionRole, SimulationEvent, TrafficRecord
 
 
@@ -38,6 +47,11 @@ SUBSCRIPTION_TARGETS: dict[str, list[str]] = {
     "8000": ["8001"],
 }
 
+TRAFFIC_BUFFER_SIZE = 5000
+TRAFFIC_PAGE_MAX = 500
+# Curve samples a MID 0900 can carry: nine full parts of sample pieces, less one for the ASCII fields.
+MAX_TRACE_SAMPLES = (MAX_PARTS * (MAX_PART_DATA // BINARY_PIECE) - 1) * BINARY_PIECE // 2
+
 EVENT_DEFAULT_MIDS: dict[str, list[str]] = {
     "tightening": ["0061", "1201", "1202"],
     "alarm": ["0071", "1000"],
@@ -46,6 +60,28 @@ EVENT_DEFAULT_MIDS: dict[str, list[str]] = {
 }
 
 
+def _iso_from_epoch(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+@lru_cache(maxsize=1)
+def _op_time_at(second: int) -> str:
+    return time.strftime("%Y-%m-%d:%H:%M:%S", time.gmtime(second))
+
+
+@lru_cache(maxsize=256)
+def _op_time_of(iso: str) -> str | None:
+    try:
+        return datetime.fromisoformat(iso).strftime("%Y-%m-%d:%H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _op_time(iso: str | None = None) -> str:
+    """Open Protocol timestamp (YYYY-MM-DD:HH:MM:SS) of an ISO string, or of now."""
+    return (iso and _op_time_of(iso)) or _op_time_at(int(clock.epoch()))
+
+
 class SimulatorState:
     def __init__(
         self,
@@ -56,6 +92,9 @@ class SimulatorState:
         keepalive_timeout_sec: int,
         inactivity_hint_sec: int,
         max_sessions: int,
+        stream: StreamHub | None = None,
+        metrics: ProtocolMetrics | None = None,
+        codecs: CodecRegistry | None = None,
     ):
         self.catalog = catalog
         self.profiles = profiles
@@ -63,10 +102,47 @@ class SimulatorState:
         self.keepalive_timeout_sec = keepalive_timeout_sec
         self.inactivity_hint_sec = inactivity_hint_sec
         self.max_sessions = max_sessions
+        self.stream = stream or StreamHub()
+        self.metrics = metrics or ProtocolMetrics()
+        self.latency = LatencyTracker()
+        # Immutable once compiled, so controllers built from one catalog can share it.
+        self.codecs = codecs or CodecRegistry(catalog, PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES)
+        # Field values per MID, read from the simulated state whenever its payload is rendered.
+        self._payload_sources: dict[str, Callable[[], dict[str, Any]]] = {
+            "0011": self._pset_values,
+            "0013": self._pset_values,
+            "0015": self._pset_values,
+            "0031": self._job_values,
+            "0033": self._job_values,
+            "0035": self._job_values,
+            "0041": self._tool_values,
+            "0052": self._result_values,
+            "0061": self._result_values,
+            "0065": self._result_values,
+            "0071": self._alarm_values,
+            "0076": self._alarm_values,
+            "0101": self._result_values,
+            "0081": lambda: {"time": _op_time()},
+            "0211": self._input_values,
+            "0242": lambda: {"user_data": self._state["user_data"]["records"].get("last_download", "")},
+            "0251": self._selector_values,
+            "0411": lambda: {"current_batch": self._state["pset"].get("batch_counter", 0)},
+            "0900": self._trace_values,
+            "1000": self._alarm_values,
+            "1201": self._operation_values,
+            "1202": self._object_values,
+            "2601": self._mode_values,
+            "2603": self._mode_values,
+        }
 
         self._lock = asyncio.Lock()
         self._sessions: dict[str, SessionContext] = {}
-        self._traffic: list[TrafficRecord] = []
+        # Role buckets and the started Actor session are maintained on every
+        # registry change so role checks never scan the session table.
+        self._by_role: dict[SessionRole, dict[str, SessionContext]] = {role: {} for role in SessionRole}
+        self._active_actor: SessionContext | None = None
+        self._traffic: deque[TrafficRecord] = deque(maxlen=TRAFFIC_BUFFER_SIZE)
+        self._traffic_seq = 0
         self._events: list[SimulationEvent] = []
         self._state = self._initial_state()
 
@@ -75,7 +151,7 @@ class SimulatorState:
             self._state = loaded
 
     def _initial_state(self) -> dict[str, Any]:
-        now = datetime.now(timezone.utc).isoformat()
+        now = clock.now().isoformat()
         return {
             "metadata": {"created_at": now, "profile": self.profiles.active_name},
             "tool": {
@@ -103,11 +179,24 @@ class SimulatorState:
             if len(self._sessions) >= self.max_sessions:
                 return False, "max sessions reached"
             self._sessions[session.session_id] = session
-            return True, ""
+            self._by_role[session.role][session.session_id] = session
+        if self.stream.active:
+            self.stream.publish_session("connected", self._session_to_dict(session))
+        return True, ""
 
     async def unregister_session(self, session_id: str) -> None:
         async with self._lock:
-            self._sessions.pop(session_id, None)
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._by_role[session.role].pop(session_id, None)
+                if self._active_actor is session:
+                    self._active_actor = None
+        if session is not None and self.stream.active:
+            self.stream.publish_session("disconnected", self._session_to_dict(session))
+
+    def _notify_state(self, *domains: str) -> None:
+        if self.stream.active:
+            self.stream.publish_state(domains, clock.now().isoformat())
 
     async def sessions(self) -> list[dict[str, Any]]:
         async with self._lock:
@@ -117,21 +206,34 @@ class SimulatorState:
         async with self._lock:
             return self._sessions.get(session_id)
 
-    async def actor_active(self, exclude_session: str | None = None) -> bool:
-        async with self._lock:
-            for sid, session in self._sessions.items():
-                if exclude_session and sid == exclude_session:
-                    continue
-                if session.role == SessionRole.ACTOR and session.communication_started:
-                    return True
-            return False
+    def role_counts(self) -> dict[str, int]:
+        return {role.value: len(bucket) for role, bucket in self._by_role.items()}
+
+    def actor_active(self, exclude_session: str | None = None) -> bool:
+        actor = self._active_actor
+        return actor is not None and actor.session_id != exclude_session
 
-    async def ensure_command_allowed(self, session: SessionContext) -> tuple[bool, int]:
+    def start_communication(self, session: SessionContext) -> bool:
+        """Mark ``session`` started (MID 0001); False if it is an Actor and another Actor already holds the slot."""
+        if session.role == SessionRole.ACTOR:
+            if self._active_actor is not None and self._active_actor is not session:
+                return False
+            self._active_actor = session
+        session.communication_started = True
+        return True
+
+    def stop_communication(self, session: SessionContext) -> None:
+        """MID 0003: end communication, drop subscriptions and release the Actor slot."""
+        session.communication_started = False
+        session.clear_subscriptions()
+        if self._active_actor is session:
+            self._active_actor = None
+
+    def ensure_command_allowed(self, session: SessionContext) -> tuple[bool, int]:
         # Error 92 if commands disabled by actor.
         if session.role == SessionRole.ACTOR:
             return True, 0
-        active = await self.actor_active(exclude_session=session.session_id)
-        if active:
+        if self.actor_active(exclude_session=session.session_id):
             return False, 92
         return True, 0
 
@@ -140,58 +242,150 @@ class SimulatorState:
             "session_id": s.session_id,
             "role": s.role.value,
             "remote": s.remote,
-            "created_at": s.created_at.isoformat(),
-            "last_activity": s.last_activity.isoformat(),
+            "created_at": _iso_from_epoch(s.created_at),
+            "last_activity": _iso_from_epoch(clock.epoch() - s.idle_seconds()),
             "ack_mode": s.ack_mode.value,
             "next_tx_seq": s.next_tx_seq,
             "next_rx_seq": s.next_rx_seq,
             "communication_started": s.communication_started,
             "subscriptions": sorted(s.subscriptions),
+            "link": s.link_window.snapshot() if s.link_window is not None else None,
+            "impairment": s.impairment.snapshot() if s.impairment is not None else None,
+        }
+
+    @staticmethod
+    def _traffic_to_dict(t: TrafficRecord) -> dict[str, Any]:
+        return {
+            "seq": t.seq,
+            "timestamp": t.timestamp.isoformat(),
+            "session_id": t.session_id,
+            "role": t.role.value,
+            "direction": t.direction,
+            "mid": t.mid,
+            "revision": t.revision,
+            "length": t.length,
+            "raw_ascii": t.raw_ascii,
+            "decoded_data": t.decoded_data,
+            "reply_to": t.reply_to,
+            # Stamps are filled in while the frame is processed; streamed rx records show them partially.
+            "timings_ms": t.trace.offsets_ms() if t.trace is not None else None,
         }
 
     async def list_traffic(self, *, limit: int = 100, mid: str | None = None, session_id: str | None = None) -> list[dict[str, Any]]:
+        limit = max(1, min(limit, TRAFFIC_PAGE_MAX))
+        if mid:
+            mid = f"{mid:0>4}"[-4:]
         async with self._lock:
-            items = self._traffic
-            if mid:
-                mid = f"{mid:0>4}"[-4:]
-                items = [t for t in items if t.mid == mid]
-            if session_id:
-                items = [t for t in items if t.session_id == session_id]
-            out = items[-max(1, min(limit, 500)) :]
-            return [
-                {
-                    "timestamp": t.timestamp.isoformat(),
-                    "session_id": t.session_id,
-                    "role": t.role.value,
-                    "direction": t.direction,
-                    "mid": t.mid,
-                    "revision": t.revision,
-                    "length": t.length,
-                    "raw_ascii": t.raw_ascii,
-                    "decoded_data": t.decoded_data,
-                }
-                for t in out
-            ]
-
-    async def record_traffic(self, session: SessionContext, direction: str, msg: OpenProtocolMessage) -> None:
-        decoded = msg.data.decode("ascii", errors="replace")
-        raw_ascii = msg.raw.decode("ascii", errors="replace")
-        record = TrafficRecord(
-            timestamp=datetime.now(timezone.utc),
-            session_id=session.session_id,
-            role=session.role,
-            direction=direction,
-            mid=msg.mid,
-            revision=msg.revision,
-            length=msg.header.length,
-            raw_ascii=raw_ascii,
-            decoded_data=decoded,
-        )
+            out: list[TrafficRecord] = []
+            # Walk newest-first so only the requested tail is visited.
+            for t in reversed(self._traffic):
+                if mid and t.mid != mid:
+                    continue
+                if session_id and t.session_id != session_id:
+                    continue
+                out.append(t)
+                if len(out) >= limit:
+                    break
+            out.reverse()
+            return [self._traffic_to_dict(t) for t in out]
+
+    async def traffic_since(
+        self,
+        cursor: int,
+        *,
+        limit: int = 100,
+        mid: str | None = None,
+        session_id: str | None = None,
+    ) -> dict[str, Any]:
+        """Return records with ``seq > cursor`` (oldest first) and the cursor to poll with next.
+
+        Sequence ids are contiguous, so only records newer than ``cursor`` are visited.
+        """
+        limit = max(1, min(limit, TRAFFIC_PAGE_MAX))
+        if mid:
+            mid = f"{mid:0>4}"[-4:]
+        async with self._lock:
+            latest = self._traffic_seq
+            newer: list[TrafficRecord] = []
+            for t in reversed(self._traffic):
+                if t.seq <= cursor:
+                    break
+                newer.append(t)
+            newer.reverse()
+            oldest_retained = self._traffic[0].seq if self._traffic else latest + 1
+
+        out: list[TrafficRecord] = []
+        next_cursor = latest
+        for t in newer:
+            if mid and t.mid != mid:
+                continue
+            if session_id and t.session_id != session_id:
+                continue
+            if len(out) >= limit:
+                # Page is full: resume right after the last record returned.
+                next_cursor = out[-1].seq
+                break
+            out.append(t)
+        return {
+            "cursor": next_cursor,
+            # Records evicted from the ring buffer before the client caught up.
+            "dropped": max(0, oldest_retained - cursor - 1),
+            "items": [self._traffic_to_dict(t) for t in out],
+        }
+
+    async def latency_summary(self, mid: str | None = None) -> list[dict[str, Any]]:
+        return self.latency.summary(f"{mid:0>4}"[-4:] if mid else None)
+
+    async def record_traffic(
+        self,
+        session: SessionContext,
+        direction: str,
+        msg: OpenProtocolMessage,
+        *,
+        reply_to: int | None = None,
+        trace: MessageTrace | None = None,
+    ) -> TrafficRecord:
+        records = await self.record_traffic_batch(session, direction, [msg], reply_to=reply_to, traces=None if trace is None else [trace])
+        return records[0]
+
+    async def record_traffic_batch(
+        self,
+        session: SessionContext,
+        direction: str,
+        messages: list[OpenProtocolMessage],
+        *,
+        reply_to: int | None = None,
+        traces: list[MessageTrace] | None = None,
+    ) -> list[TrafficRecord]:
+        records: list[TrafficRecord] = []
         async with self._lock:
-            self._traffic.append(record)
-            if len(self._traffic) > 5000:
-                self._traffic = self._traffic[-5000:]
-        self.persistence.append_traffic(record)
+            now = clock.now()
+            recorded_at = time.monotonic()
+            for index, msg in enumerate(messages):
+                self._traffic_seq += 1
+                record = TrafficRecord(
+                    seq=self._traffic_seq,
+                    timestamp=now,
+                    session_id=session.session_id,
+                    role=session.role,
+                    direction=direction,
+                    mid=msg.mid,
+                    revision=msg.revision,
+                    length=msg.header.length,
+                    raw_ascii=msg.raw.decode("ascii", errors="replace"),
+                    decoded_data=msg.data.decode("ascii", errors="replace"),
+                    reply_to=reply_to,
+                    trace=None if traces is None else traces[index],
+                )
+                self._traffic.append(record)
+                records.append(record)
+        if self.stream.active:
+            for record in records:
+                self.stream.publish_traffic(self._traffic_to_dict(record))
+        if self.persistence.enabled:
+            self.persistence.append_traffic_many(records)
+            self.metrics.persistence.observe(time.monotonic() - recorded_at)
+        return records
 
     async def get_state_domain(self, domain: str) -> dict[str, Any]:
         async with self._lock:
@@ -208,28 +402,37 @@ class SimulatorState:
             if domain not in self._state:
                 raise KeyError(domain)
             self._state[domain] = payload
-            self._state["metadata"]["updated_at"] = datetime.now(timezone.utc).isoformat()
+            self._state["metadata"]["updated_at"] = clock.now().isoformat()
             self.persistence.save_state(self._state)
+            self._notify_state(domain)
             return json.loads(json.dumps(self._state[domain]))
 
     async def reset(self) -> None:
         async with self._lock:
             self._state = self._initial_state()
             for session in self._sessions.values():
-                session.subscriptions.clear()
-                session.pending_replies.clear()
+                session.clear_subscriptions()
+                session.pending_replies = None
+                session.reassembly = None
+                if session.link_window is not None:
+                    session.link_window.close()
+                    session.link_window = None
                 session.communication_started = False
                 session.next_rx_seq = 1
                 session.next_tx_seq = 1
+            self._active_actor = None
             self._events.clear()
+            self.latency.clear()
             self.persistence.save_state(self._state)
+            self._notify_state(*self._state.keys())
 
     async def set_profile(self, name: str) -> None:
         self.profiles.set_active(name)
         async with self._lock:
             self._state["metadata"]["profile"] = name
-            self._state["metadata"]["updated_at"] = datetime.now(timezone.utc).isoformat()
+            self._state["metadata"]["updated_at"] = clock.now().isoformat()
             self.persistence.save_state(self._state)
+            self._notify_state("metadata")
 
     def profile_payload(self) -> dict[str, Any]:
         active = self.profiles.active
@@ -253,11 +456,11 @@ class SimulatorState:
             },
         }
 
-    async def add_subscription(self, session: SessionContext, mid: str) -> None:
-        session.subscriptions.add(f"{mid:0>4}"[-4:])
+    async def add_subscription(self, session: SessionContext, mid: str, revision: int = 1) -> None:
+        session.subscribe(f"{mid:0>4}"[-4:], revision)
 
     async def remove_subscription(self, session: SessionContext, mid: str) -> None:
-        session.subscriptions.discard(f"{mid:0>4}"[-4:])
+        session.unsubscribe(f"{mid:0>4}"[-4:])
 
     async def list_capability_matrix(self) -> list[dict[str, Any]]:
         active = self.profiles.active
@@ -279,7 +482,7 @@ class SimulatorState:
     def _event_record(self, event_type: str, payload: dict[str, Any], mids: list[str]) -> SimulationEvent:
         event = SimulationEvent(
             event_id=str(uuid.uuid4()),
-            timestamp=datetime.now(timezone.utc),
+            timestamp=clock.now(),
             source="rest_api",
             event_type=event_type,
             payload=payload,
@@ -291,147 +494,286 @@ class SimulatorState:
         return event
 
     async def inject_event(self, event_type: str, payload: dict[str, Any] | None = None) -> SimulationEvent:
-        payload = payload or {}
-        mids = payload.get("mids")
-        if not isinstance(mids, list):
-            mids = EVENT_DEFAULT_MIDS.get(event_type, [])
-        event = self._event_record(event_type, payload, mids)
+        applied = await self.inject_events([(event_type, payload or {})])
+        return applied[0][0]
 
+    async def inject_events(
+        self,
+        batch: list[tuple[str, dict[str, Any]]],
+        *,
+        render_mids: set[tuple[str, int]] | frozenset[tuple[str, int]] = frozenset(),
+    ) -> list[tuple[SimulationEvent, dict[tuple[str, int], bytes | LinkedPayload]]]:
+        """Apply a batch of events under one lock acquisition and persist once.
+
+        For every event, the payloads of its affected MIDs that appear in
+        ``render_mids`` (``(mid, revision)`` pairs) are rendered right after that
+        event is applied, keyed by the same pairs, so pushes
+        reflect the state as of each event rather than the end of the batch.
+        Payloads too large for one frame come back as a :class:`LinkedPayload`
+        whose pieces are encoded once and shared by every subscriber.
+        """
+        applied: list[tuple[SimulationEvent, dict[tuple[str, int], bytes | LinkedPayload]]] = []
+        touched: set[str] = set()
+        revisions: dict[str, list[int]] = {}
+        for mid, revision in sorted(render_mids):
+            revisions.setdefault(mid, []).append(revision)
+        async with self._lock:
+            for event_type, payload in batch:
+                payload = payload or {}
+                mids = payload.get("mids")
+                if not isinstance(mids, list):
+                    mids = EVENT_DEFAULT_MIDS.get(event_type, [])
+                event = self._event_record(event_type, payload, mids)
+                touched.update(self._apply_event_locked(event_type, payload))
+                rendered: dict[tuple[str, int], bytes | LinkedPayload] = {}
+                if revisions:
+                    for mid in mids:
+                        mid = f"{mid:0>4}"[-4:]
+                        for revision in revisions.get(mid, ()):
+                            if (mid, revision) in rendered:
+                                continue
+                            data = self._render_locked(mid, revision)
+                            if isinstance(data, LinkedPayload):
+                                data.pieces = tuple(data.pieces)
+                            rendered[(mid, revision)] = data
+                applied.append((event, rendered))
+            if touched:
+                self.persistence.save_state(self._state)
+                self._notify_state(*sorted(touched))
+        return applied
+
+    def _apply_event_locked(self, event_type: str, payload: dict[str, Any]) -> tuple[str, ...]:
         if event_type == "tightening":
-            await self._update_tightening_state(payload)
-        elif event_type == "alarm":
-            await self._update_alarm_state(payload)
-        elif event_type == "io_change":
-            await self._update_io_state(payload)
-
-        return event
+            self._update_tightening_state(payload)
+            return ("results", "traces")
+        if event_type == "alarm":
+            self._update_alarm_state(payload)
+            return ("alarms",)
+        if event_type == "io_change":
+            self._update_io_state(payload)
+            return ("io",)
+        return ()
+
+    def _update_tightening_state(self, payload: dict[str, Any]) -> None:
+        tightening_id = int(self._state["results"]["last_tightening_id"]) + 1
+        torque = payload.get("torque_nm", 12.34)
+        angle = payload.get("angle_deg", 123.0)
+        ok = payload.get("ok", True)
+        result = {
+            "tightening_id": tightening_id,
+            "timestamp": clock.now().isoformat(),
+            "torque_nm": torque,
+            "angle_deg": angle,
+            "status": "OK" if ok else "NOK",
+        }
+        # Generator streams say which station and pset a cycle belongs to; injected events may not.
+        if "station_id" in payload:
+            result["station_id"] = str(payload["station_id"])
+        if "pset" in payload:
+            result["pset_id"] = str(payload["pset"])
+        history = self._state["results"]["history"]
+        self._state["results"]["last_tightening_id"] = tightening_id
+        history.append(result)
+        if len(history) > 1000:
+            del history[:-1000]
+        self._state["traces"]["latest"] = {
+            "tightening_id": tightening_id,
+            "points": payload.get("trace_points", [10, 12, 14, 15, 14, 12]),
+            # Samples per unit: the MID 0900 coefficient that turns samples back into torque.
+            "scale": int(payload.get("trace_scale", 1)),
+        }
 
-    async def _update_tightening_state(self, payload: dict[str, Any]) -> None:
+    def _update_alarm_state(self, payload: dict[str, Any]) -> None:
+        alarm = {
+            "code": payload.get("code", "0001"),
+            "text": payload.get("text", "Simulated alarm"),
+            "timestamp": clock.now().isoformat(),
+        }
+        history = self._state["alarms"]["history"]
+        self._state["alarms"]["active"] = [alarm]
+        history.append(alarm)
+        if len(history) > 1000:
+            del history[:-1000]
+
+    def _update_io_state(self, payload: dict[str, Any]) -> None:
+        key = payload.get("key", "input_01")
+        value = payload.get("value", True)
+        self._state["io"]["inputs"][key] = value
+
+    def subscribed_targets(self, session: SessionContext) -> dict[str, int]:
+        """MIDs a session should receive pushes for, with the revision to render each at.
+
+        A push goes out at the revision the subscription asked for (MID 0060
+        revision 7 gets MID 0061 revision 7), or the highest one below it that
+        has a payload layout.
+        """
+        targets: dict[str, int] = {}
+        for sub_mid, revision in session.subscriptions.items():
+            # Generic subscription where subscribed MID itself is the target.
+            for target in (*SUBSCRIPTION_TARGETS.get(sub_mid, ()), sub_mid):
+                resolved = self.codecs.revision_for(target, revision)
+                if resolved > targets.get(target, 0):
+                    targets[target] = resolved
+        return targets
+
+    def traffic_occupancy(self) -> tuple[int, int]:
+        return len(self._traffic), self._traffic.maxlen or 0
+
+    def outbound_queue_sizes(self) -> list[int]:
+        """Bytes each session's transport still holds for the socket (sessions without one count as 0)."""
+        sizes = []
+        for session in self._sessions.values():
+            transport = getattr(session.writer, "transport", None)
+            sizes.append(transport.get_write_buffer_size() if transport is not None else 0)
+        return sizes
+
+    def link_window_sizes(self) -> tuple[int, int]:
+        """Frames awaiting a link-level acknowledgement and messages queued behind them, over all sessions."""
+        in_flight = queued = 0
+        for session in self._sessions.values():
+            window = session.link_window
+            if window is not None:
+                in_flight += window.in_flight
+                queued += window.queued
+        return in_flight, queued
+
+    async def session_contexts(self) -> list[SessionContext]:
         async with self._lock:
-            tightening_id = int(self._state["results"]["last_tightening_id"]) + 1
-            torque = payload.get("torque_nm", 12.34)
-            angle = payload.get("angle_deg", 123.0)
-            ok = payload.get("ok", True)
-            result = {
-                "tightening_id": tightening_id,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "torque_nm": torque,
-                "angle_deg": angle,
-                "status": "OK" if ok else "NOK",
-            }
-            self._state["results"]["last_tightening_id"] = tightening_id
-            self._state["results"]["history"].append(result)
-            self._state["results"]["history"] = self._state["results"]["history"][-1000:]
-            self._state["traces"]["latest"] = {
-                "tightening_id": tightening_id,
-                "points": payload.get("trace_points", [10, 12, 14, 15, 14, 12]),
-            }
-            self.persistence.save_state(self._state)
+            return list(self._sessions.values())
 
-    async def _update_alarm_state(self, payload: dict[str, Any]) -> None:
+    async def render_data_for_mid(self, mid: str, revision: int = 1) -> bytes | LinkedPayload:
+        """The payload for ``mid`` from current state; one too large for a frame
+        comes back as a :class:`LinkedPayload` encoded as its parts are sent."""
         async with self._lock:
-            alarm = {
-                "code": payload.get("code", "0001"),
-                "text": payload.get("text", "Simulated alarm"),
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            self._state["alarms"]["active"] = [alarm]
-            self._state["alarms"]["history"].append(alarm)
-            self._state["alarms"]["history"] = self._state["alarms"]["history"][-1000:]
-            self.persistence.save_state(self._state)
+            return self._render_locked(mid, revision)
+
+    def _render_locked(self, mid: str, revision: int = 1) -> bytes | LinkedPayload:
+        source = self._payload_sources.get(mid)
+        values = source() if source else {}
+        codec = self.codecs.get(mid, revision)
+        if not codec.binary:
+            data = codec.encode(values)
+            if len(data) <= MAX_PART_DATA:
+                return data
+        sizes, pieces = codec.encode_pieces(values)
+        if sum(sizes) <= MAX_PART_DATA:
+            return b"".join(pieces)
+        return LinkedPayload(sizes, pieces)
+
+    def _latest_result(self) -> dict[str, Any]:
+        history = self._state["results"]["history"]
+        return history[-1] if history else {}
+
+    def _latest_alarm(self) -> dict[str, Any]:
+        active = self._state["alarms"]["active"]
+        return active[-1] if active else {"code": "0000", "text": "No alarm"}
+
+    def _pset_values(self) -> dict[str, Any]:
+        pset = self._state["pset"]
+        return {
+            "pset_id": pset["selected"],
+            "pset_ids": [pset["selected"]],
+            "batch_size": pset.get("batch_size", 1),
+            "pset_last_change": _op_time(self._state["metadata"].get("created_at")),
+        }
 
-    async def _update_io_state(self, payload: dict[str, Any]) -> None:
-        async with self._lock:
-            key = payload.get("key", "input_01")
-            value = payload.get("value", True)
-            self._state["io"]["inputs"][key] = value
-            self.persistence.save_state(self._state)
+    def _job_values(self) -> dict[str, Any]:
+        job = self._state["job"]
+        return {
+            "job_id": job["selected"],
+            "job_ids": [job["selected"]],
+            "job_batch_size": job.get("batch_size", 1),
+            "job_batch_counter": job.get("batch_counter", 0),
+            "timestamp": _op_time(),
+        }
 
-    async def generate_push_messages(self, session: SessionContext, event: SimulationEvent) -> list[OpenProtocolMessage]:
-        """Build push messages for an event based on subscriptions."""
-        messages: list[OpenProtocolMessage] = []
-        target_mids = {f"{m:0>4}"[-4:] for m in event.affected_mids}
+    def _tool_values(self) -> dict[str, Any]:
+        tool = self._state["tool"]
+        return {
+            "tightening_count": self._state["results"]["last_tightening_id"],
+            "calibration_value": tool.get("calibration_value", 0),
+            "last_calibration_date": _op_time(self._state["metadata"].get("created_at")),
+        }
 
-        # Subscribed pushes from dedicated subscription MIDs.
-        subscribed_targets: set[str] = set()
-        for sub_mid in session.subscriptions:
-            subscribed_targets.update(SUBSCRIPTION_TARGETS.get(sub_mid, []))
-            # Generic subscription where subscribed MID itself is the target.
-            subscribed_targets.add(sub_mid)
+    def _result_values(self) -> dict[str, Any]:
+        latest = self._latest_result()
+        pset = self._state["pset"]
+        ok = int(latest.get("status", "OK") == "OK")
+        return {
+            "vin": self._state["vin"]["current"],
+            "job_id": self._state["job"]["selected"],
+            "pset_id": latest.get("pset_id", pset["selected"]),
+            "batch_size": pset.get("batch_size", 1),
+            "batch_counter": pset.get("batch_counter", 0),
+            "tightening_status": ok,
+            "torque_status": ok,
+            "torque": latest.get("torque_nm", 12.34),
+            "angle": latest.get("angle_deg", 123.0),
+            "timestamp": _op_time(latest.get("timestamp")),
+            "pset_last_change": _op_time(self._state["metadata"].get("created_at")),
+            "tightening_id": latest.get("tightening_id", self._state["results"]["last_tightening_id"]),
+        }
 
-        for mid in sorted(target_mids):
-            if mid not in subscribed_targets:
-                continue
-            data = await self.build_data_for_mid(mid)
-            messages.append(
-                build_message(
-                    mid=mid,
-                    data=data,
-                    revision=1,
-                    sequence_number=session.next_tx_seq if session.ack_mode.value == "link_level" else 0,
-                )
-            )
-        return messages
+    def _operation_values(self) -> dict[str, Any]:
+        """MID 1201: overall status of the last tightening as a one-object operation."""
+        result = self._result_values()
+        ok = result["tightening_status"]
+        return {
+            **result,
+            "result_id": result["tightening_id"],
+            "result_status": ok,
+            "objects": [{"object_id": 1, "object_status": ok}],
+            "data_fields": [(1, "01", "000", "0000", str(ok), "")],
+        }
 
-    async def build_data_for_mid(self, mid: str) -> bytes:
-        async with self._lock:
-            if mid == "0015":
-                return ascii_payload("01", str(self._state["pset"]["selected"]).rjust(3, "0"))
-            if mid == "0022":
-                return ascii_payload("01", "1")
-            if mid == "0035":
-                return ascii_payload("01", str(self._state["job"]["selected"]).rjust(4, "0"))
-            if mid == "0052":
-                return ascii_payload("01", str(self._state["vin"]["current"]).ljust(25)[:25])
-            if mid == "0061":
-                latest = self._state["results"]["history"][-1] if self._state["results"]["history"] else {}
-                tid = str(latest.get("tightening_id", self._state["results"]["last_tightening_id"])).rjust(10, "0")
-                status = latest.get("status", "OK")
-                return ascii_payload("01", tid, "02", status.ljust(3)[:3])
-            if mid == "0071":
-                alarm = self._state["alarms"]["active"][-1] if self._state["alarms"]["active"] else {"code": "0000", "text": "No alarm"}
-                return ascii_payload("01", str(alarm["code"]).rjust(4, "0"), "02", str(alarm["text"]).ljust(25)[:25])
-            if mid == "0211":
-                return ascii_payload("01", "1")
-            if mid == "0217":
-                return ascii_payload("01", "1")
-            if mid == "0221":
-                return ascii_payload("01", "1")
-            if mid == "0401":
-                return ascii_payload("01", "AUTO")
-            if mid == "0421":
-                return ascii_payload("01", "0")
-            if mid == "0501":
-                return ascii_payload("01", "OK")
-            if mid == "0900":
-                points = self._state["traces"]["latest"]["points"] if self._state["traces"]["latest"] else [10, 12, 14, 15]
-                binary = bytes(int(p) & 0xFF for p in points)
-                return ascii_payload("01", "TRACE", "02", f"{len(binary):04d}") + b"\x00" + binary
-            if mid == "1000":
-                alarm = self._state["alarms"]["active"][-1] if self._state["alarms"]["active"] else {"code": "0000", "text": "No alarm"}
-                return ascii_payload("01", str(alarm["code"]).rjust(4, "0"), "02", str(alarm["text"]).ljust(25)[:25])
-            if mid == "1201":
-                latest = self._state["results"]["history"][-1] if self._state["results"]["history"] else {}
-                torque = f"{float(latest.get('torque_nm', 12.34)):07.2f}"
-                angle = f"{float(latest.get('angle_deg', 123.0)):07.2f}"
-                return ascii_payload("01", torque, "02", angle)
-            if mid == "1202":
-                latest = self._state["results"]["history"][-1] if self._state["results"]["history"] else {}
-                return ascii_payload("01", str(latest.get("status", "OK")).ljust(3)[:3])
-            if mid == "0262":
-                return ascii_payload("01", "TAG1234567890")
-            if mid == "0101":
-                return ascii_payload("01", "MS_RESULT")
-            if mid == "0106":
-                return ascii_payload("01", "STATION_RESULT")
-            if mid == "0107":
-                return ascii_payload("01", "BOLT_RESULT")
-            if mid == "0242":
-                return ascii_payload("01", "USER_DATA")
-            if mid == "0251":
-                return ascii_payload("01", str(self._state["selector"]["socket"]).rjust(2, "0"))
-            if mid == "2601":
-                return ascii_payload("01", "0001")
-            if mid == "2603":
-                return ascii_payload("01", "MODE_DEFAULT")
-            return ascii_payload("01", "SIM")
+    def _object_values(self) -> dict[str, Any]:
+        """MID 1202: torque and angle of the single object of the last tightening."""
+        result = self._result_values()
+        return {
+            "result_id": result["tightening_id"],
+            "object_id": 1,
+            "data_fields": [
+                (2001, "03", "001", "0000", f"{float(result['torque']):.2f}", ""),
+                (2011, "03", "050", "0000", f"{float(result['angle']):.1f}", ""),
+            ],
+        }
+
+    def _alarm_values(self) -> dict[str, Any]:
+        alarm = self._latest_alarm()
+        return {
+            "alarm_status": int(bool(self._state["alarms"]["active"])),
+            "error_code": alarm["code"],
+            "alarm_text": alarm["text"],
+            "timestamp": _op_time(alarm.get("timestamp")),
+            "data_fields": [(1700, "04", "000", "0000", str(alarm["text"]), "")],
+        }
+
+    def _input_values(self) -> dict[str, Any]:
+        inputs = self._state["io"]["inputs"]
+        return {f"digital_input_{n}": int(bool(inputs.get(f"input_{n:02d}", False))) for n in range(1, 9)}
+
+    def _selector_values(self) -> dict[str, Any]:
+        lifted = str(self._state["selector"]["socket"]).lstrip("0")
+        return {"sockets": [int(str(n) == lifted) for n in range(1, 9)]}
+
+    def _trace_values(self) -> dict[str, Any]:
+        latest = self._state["traces"]["latest"]
+        points = latest["points"] if latest else [10, 12, 14, 15]
+        scale = latest.get("scale", 1) if latest else 1
+        return {
+            "result_id": latest["tightening_id"] if latest else 0,
+            "timestamp": _op_time(),
+            "data_fields": [(2213, "UI", "000", "0000", str(scale), "")],
+            "sample_count": min(len(points), MAX_TRACE_SAMPLES),
+            "samples": Samples(points[:MAX_TRACE_SAMPLES]),
+        }
+
+    def _mode_values(self) -> dict[str, Any]:
+        mode = self._state["mode"]
+        modes = [{"mode_id": m["id"], "mode_name": m["name"]} for m in mode.get("list", [])]
+        selected = next((m for m in modes if str(m["mode_id"]) == str(mode["selected"])), None)
+        return {
+            "modes": modes,
+            "mode_id": mode["selected"],
+            "mode_name": selected["mode_name"] if selected else "",
+        }
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+from collections import deque
+from typing import Any, Iterable
+
+
+TOPICS = ("traffic", "session", "state")
+
+
+def _normalize_mids(mids: Iterable[str]) -> set[str]:
+    return {f"{m.strip():0>4}"[-4:] for m in mids if m.strip()}
+
+
+class StreamSubscription:
+    """Per-client bounded buffer fed by :class:`StreamHub`.
+
+    Publishing never blocks: when the buffer is full the oldest item is dropped
+    and counted, and state notifications are conflated per domain so a slow
+    client only ever sees the latest change for each domain. Items offered from
+    another thread (the protocol engine thread) are handed over to the loop the
+    subscription was created on.
+    """
+
+    def __init__(
+        self,
+        *,
+        topics: Iterable[str] | None = None,
+        mids: Iterable[str] | None = None,
+        session_ids: Iterable[str] | None = None,
+        domains: Iterable[str] | None = None,
+        max_buffer: int = 1000,
+    ):
+        self.topics = set(topics or TOPICS) & set(TOPICS)
+        self.mids = _normalize_mids(mids or [])
+        self.session_ids = set(session_ids or [])
+        self.domains = set(domains or [])
+        self.max_buffer = max(1, max_buffer)
+        self.dropped = 0
+        self._queue: deque[dict[str, Any]] = deque()
+        self._conflated: dict[str, dict[str, Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._thread_id = threading.get_ident()
+        try:
+            self._loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def wants(self, topic: str, *, mid: str | None = None, session_id: str | None = None, domain: str | None = None) -> bool:
+        if topic not in self.topics:
+            return False
+        if mid is not None and self.mids and mid not in self.mids:
+            return False
+        if session_id is not None and self.session_ids and session_id not in self.session_ids:
+            return False
+        if domain is not None and self.domains and domain not in self.domains:
+            return False
+        return True
+
+    def offer(self, item: dict[str, Any], *, conflate_key: str | None = None) -> None:
+        if self._loop is not None and threading.get_ident() != self._thread_id:
+            with contextlib.suppress(RuntimeError):  # subscriber loop already closed
+                self._loop.call_soon_threadsafe(self._offer, item, conflate_key)
+            return
+        self._offer(item, conflate_key)
+
+    def _offer(self, item: dict[str, Any], conflate_key: str | None) -> None:
+        if conflate_key is not None:
+            self._conflated[conflate_key] = item
+        else:
+            if len(self._queue) >= self.max_buffer:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(item)
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._queue) + len(self._conflated)
+
+    async def next_batch(self) -> tuple[list[dict[str, Any]], int]:
+        """Wait for pending items and return ``(items, dropped_since_last_batch)``."""
+        while not self._queue and not self._conflated:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        items = list(self._queue)
+        self._queue.clear()
+        if self._conflated:
+            items.extend(self._conflated.values())
+            self._conflated.clear()
+        dropped, self.dropped = self.dropped, 0
+        return items, dropped
+
+
+class StreamHub:
+    """Fan-out of traffic, session and state notifications to live subscribers.
+
+    Subscribers come and go on the API loop while the protocol engine thread
+    may be publishing, so the subscriber set is an immutable tuple replaced on
+    every change and each publish iterates the tuple it started with.
+    """
+
+    def __init__(self, buffer_size: int = 1000):
+        self.buffer_size = buffer_size
+        self._subscribers: tuple[StreamSubscription, ...] = ()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(
+        self,
+        *,
+        topics: Iterable[str] | None = None,
+        mids: Iterable[str] | None = None,
+        session_ids: Iterable[str] | None = None,
+        domains: Iterable[str] | None = None,
+    ) -> StreamSubscription:
+        sub = StreamSubscription(
+            topics=topics,
+            mids=mids,
+            session_ids=session_ids,
+            domains=domains,
+            max_buffer=self.buffer_size,
+        )
+        with self._lock:
+            self._subscribers = (*self._subscribers, sub)
+        return sub
+
+    def unsubscribe(self, sub: StreamSubscription) -> None:
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not sub)
+
+    def publish_traffic(self, record: dict[str, Any]) -> None:
+        mid = record["mid"]
+        session_id = record["session_id"]
+        item = {"topic": "traffic", "data": record}
+        for sub in self._subscribers:
+            if sub.wants("traffic", mid=mid, session_id=session_id):
+                sub.offer(item)
+
+    def publish_session(self, action: str, session: dict[str, Any]) -> None:
+        session_id = session["session_id"]
+        item = {"topic": "session", "action": action, "data": session}
+        for sub in self._subscribers:
+            if sub.wants("session", session_id=session_id):
+                sub.offer(item)
+
+    def publish_state(self, domains: Iterable[str], updated_at: str) -> None:
+        subscribers = self._subscribers
+        for domain in domains:
+            item = {"topic": "state", "domain": domain, "updated_at": updated_at}
+            for sub in subscribers:
+                if sub.wants("state", domain=domain):
+                    sub.offer(item, conflate_key=domain)
@@ -3,70 +3,138 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import logging
+import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
 
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+from . import clock
 from .config import Settings
 from .dispatcher import OpenProtocolDispatcher
-from .protocol import NUL, build_message, format_mid_error_payload, next_sequence, parse_stream_buffer
+from .impairment import Impairment, attach, detach, disconnect
+from .latency import MessageTrace
+from .link_layer import FAST_PATH_MIDS, LinkLayer
+from .linking import LinkError, LinkedMessage, LinkedPayload, Reassembler
+from .protocol import build_message, format_mid_error_payload, parse_stream_buffer
 from .state import SimulatorState
-from .types import AckMode, OpenProtocolMessage, SessionContext, SessionRole
+from .transport import TRANSPORTS, ReceiveScratch, SessionProtocol
+from .types import AckMode, OpenProtocolMessage, SessionContext, SessionRole, SimulationEvent
+from .workers import WorkerPool, role_ports
 
 LOG = logging.getLogger(__name__)
 
+# Traffic-log policy for frames answered or consumed by the keepalive/link-ACK fast path.
+KEEPALIVE_CAPTURE = ("all", "none")
+
+
+def _raise_fd_limit(wanted: int) -> None:
+    """Raise the soft open-files limit towards ``wanted`` so large session counts can be accepted."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft >= wanted or soft == resource.RLIM_INFINITY:
+        return
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    with contextlib.suppress(ValueError, OSError):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    if target < wanted:
+        LOG.warning("Open file limit %d is below SIM_MAX_SESSIONS; raise the hard limit (ulimit -n)", target)
+
 
 class TcpService:
     def __init__(self, settings: Settings, state: SimulatorState, dispatcher: OpenProtocolDispatcher):
         self.settings = settings
         self.state = state
         self.dispatcher = dispatcher
+        self.metrics = state.metrics
         self._servers: list[asyncio.AbstractServer] = []
         self._tasks: list[asyncio.Task] = []
         self._stopping = False
+        self._pool: WorkerPool | None = None
+        self.link = LinkLayer(settings, self.metrics, self._keepalive_ok, self._resend)
+        self._background: set[asyncio.Task] = set()
+        # Impairments applied to every session accepted on a role's port.
+        self.impairments: dict[SessionRole, Impairment] = {}
 
     async def start(self) -> None:
-        for role, port in (
-            (SessionRole.CLASSIC, self.settings.classic_port),
-            (SessionRole.ACTOR, self.settings.actor_port),
-            (SessionRole.VIEWER, self.settings.viewer_port),
-        ):
-            server = await asyncio.start_server(
-                lambda r, w, role=role: self._handle_client(r, w, role),
-                host=self.settings.host,
-                port=port,
+        if self.settings.sim_capture_keepalive not in KEEPALIVE_CAPTURE:
+            raise ValueError(
+                f"unknown keepalive capture policy {self.settings.sim_capture_keepalive!r}; "
+                f"expected one of {', '.join(KEEPALIVE_CAPTURE)}"
             )
-            self._servers.append(server)
-            LOG.info("Listening for %s sessions on %s:%d", role.value, self.settings.host, port)
-
+        if self.settings.sim_workers > 0:
+            # Worker processes own the protocol sockets; this process keeps the state.
+            self._pool = WorkerPool(self)
+            await self._pool.start()
+        else:
+            await self._start_listeners()
         self._tasks.append(asyncio.create_task(self._keepalive_watchdog()))
 
+    async def _start_listeners(self) -> None:
+        transport = self.settings.sim_transport
+        if transport not in TRANSPORTS:
+            raise ValueError(f"unknown transport {transport!r}; expected one of {', '.join(TRANSPORTS)}")
+        loop = asyncio.get_running_loop()
+        _raise_fd_limit(self.settings.sim_max_sessions + 256)
+        # One receive buffer shared by every BufferedProtocol session on this loop;
+        # sessions only allocate their own while a frame straddles two reads.
+        scratch = ReceiveScratch(self.settings.sim_read_buffer)
+        for role, port in role_ports(self.settings):
+            if transport == "protocol":
+                server = await loop.create_server(
+                    lambda role=role: SessionProtocol(self, role, scratch),
+                    host=self.settings.host,
+                    port=port,
+                    backlog=self.settings.sim_listen_backlog,
+                )
+            else:
+                server = await asyncio.start_server(
+                    lambda r, w, role=role: self._handle_client(r, w, role),
+                    host=self.settings.host,
+                    port=port,
+                    backlog=self.settings.sim_listen_backlog,
+                )
+            self._servers.append(server)
+            LOG.info("Listening for %s sessions on %s:%d (%s transport)", role.value, self.settings.host, port, transport)
+
     async def stop(self) -> None:
         self._stopping = True
         for server in self._servers:
             server.close()
             await server.wait_closed()
         self._servers.clear()
+        if self._pool is not None:
+            await self._pool.stop()
+            self._pool = None
 
-        for task in self._tasks:
+        for task in [*self._tasks, *self._background]:
             task.cancel()
-            with contextlib.suppress(Exception):
+            with contextlib.suppress(asyncio.CancelledError, Exception):
                 await task
         self._tasks.clear()
+        self._background.clear()
 
     async def _keepalive_watchdog(self) -> None:
+        timeout = self.settings.sim_keepalive_timeout_sec
         while not self._stopping:
-            await asyncio.sleep(1)
-            sessions = await self.state.sessions()
-            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.settings.sim_keepalive_timeout_sec)
-            for session_info in sessions:
-                last_activity = datetime.fromisoformat(session_info["last_activity"])
-                if last_activity < cutoff:
-                    context = await self.state.get_session(session_info["session_id"])
-                    if context and context.writer:
-                        LOG.info("Closing session %s due to keepalive timeout", context.session_id)
-                        context.writer.close()
-                        with contextlib.suppress(Exception):
-                            await context.writer.wait_closed()
+            await clock.sleep(1)
+            # Plain float comparisons over the live contexts; no per-session dicts or datetimes.
+            now = clock.monotonic()
+            for context in await self.state.session_contexts():
+                if context.reassembly is not None:
+                    self._expire_linked(context, now)
+                if self._pool is not None:
+                    # Workers answer keepalives, so they also close idle connections.
+                    continue
+                if context.idle_seconds(now) > timeout and context.writer and not context.writer.is_closing():
+                    LOG.info("Closing session %s due to keepalive timeout", context.session_id)
+                    context.writer.close()
+            if self._pool is not None:
+                self._pool.sync()
 
     async def _send(self, session: SessionContext, message: OpenProtocolMessage, *, direction: str = "tx") -> None:
         writer = session.writer
@@ -74,73 +142,61 @@ class TcpService:
             return
         writer.write(message.raw)
         await writer.drain()
+        self._count_tx(session, (message,))
         await self.state.record_traffic(session, direction, message)
 
-    def _with_sequence_if_needed(self, session: SessionContext, msg: OpenProtocolMessage) -> OpenProtocolMessage:
-        if session.ack_mode != AckMode.LINK_LEVEL:
-            return msg
-        if msg.mid in {"9997", "9998"}:
-            return msg
-        seq = session.next_tx_seq
-        session.next_tx_seq = next_sequence(session.next_tx_seq)
-        append_nul = msg.raw.endswith(NUL)
-        return build_message(
-            mid=msg.mid,
-            data=msg.data,
-            revision=msg.header.revision,
-            no_ack_flag=msg.header.no_ack_flag,
-            station_id=msg.header.station_id,
-            spindle_id=msg.header.spindle_id,
-            sequence_number=seq,
-            message_parts=msg.header.message_parts,
-            message_part_number=msg.header.message_part_number,
-            append_nul=append_nul,
-            binary=msg.binary,
-        )
+    def _count_tx(self, session: SessionContext, messages: Iterable[OpenProtocolMessage]) -> None:
+        metrics = self.metrics
+        for message in messages:
+            metrics.count_frame("tx", session.role, message.mid)
+            if message.mid == "0004":
+                metrics.count_error(message.data)
 
-    async def _handle_link_ack(self, session: SessionContext, msg: OpenProtocolMessage) -> tuple[bool, OpenProtocolMessage | None]:
-        """Returns (continue_processing, outbound_ack)."""
-        if not msg.header.has_sequence:
-            session.ack_mode = AckMode.APPLICATION
-            return True, None
-
-        session.ack_mode = AckMode.LINK_LEVEL
-        seq = msg.header.sequence_int
-        expected = session.next_rx_seq
-
-        if seq == expected:
-            next_expected = next_sequence(expected)
-            session.next_rx_seq = next_expected
-            session.last_rx_seq = seq
-            ack = build_message(
-                mid="9997",
-                data=f"{msg.mid}".encode("ascii"),
-                revision=1,
-                sequence_number=next_expected,
-            )
-            session.last_link_ack = ack
-            return True, ack
+    def _expire_linked(self, session: SessionContext, now: float | None = None) -> None:
+        for mid in session.reassembly.expire(now):
+            self.metrics.linked_expired.inc()
+            LOG.info("Dropped incomplete linked MID %s on session %s after %ss", mid, session.session_id, session.reassembly.timeout)
+        if not session.reassembly:
+            session.reassembly = None
 
-        if seq == session.last_rx_seq and session.last_link_ack is not None:
-            return False, session.last_link_ack
+    async def _reassemble(self, session: SessionContext, msg: OpenProtocolMessage, reply_to: int) -> OpenProtocolMessage | None:
+        """Buffer one part of a linked message; returns the whole message once its last part is in.
 
-        nack = build_message(
-            mid="9998",
-            data=format_mid_error_payload(msg.mid, 3),
-            revision=1,
-            sequence_number=expected,
-        )
-        session.last_link_ack = nack
-        return False, nack
+        A part that breaks its message (out of order, over the session's
+        buffer limit) is answered with MID 0004 error 01, invalid data.
+        """
+        if session.reassembly is not None:
+            self._expire_linked(session)
+        if session.reassembly is None:
+            session.reassembly = Reassembler(self.settings.sim_link_buffer_bytes, self.settings.sim_link_timeout_sec)
+        try:
+            whole = session.reassembly.feed(msg)
+        except LinkError as exc:
+            self.metrics.linked_rejected.inc()
+            LOG.info("Rejected linked message part on session %s: %s", session.session_id, exc)
+            error = build_message(mid="0004", data=format_mid_error_payload(msg.mid, 1), revision=1)
+            await self._send_responses(session, [error], reply_to=reply_to)
+            whole = None
+        else:
+            if whole is not None:
+                self.metrics.linked_reassembled.inc()
+        if not session.reassembly:
+            session.reassembly = None
+        return whole
 
-    async def _handle_client(
-        self,
-        reader: asyncio.StreamReader,
-        writer: asyncio.StreamWriter,
-        role: SessionRole,
-    ) -> None:
-        peer = writer.get_extra_info("peername")
-        remote = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _keepalive_ok(self, session: SessionContext, msg: OpenProtocolMessage) -> bool:
+        return session.communication_started and self.dispatcher.is_supported("9999", msg.revision)
+
+    def _resend(self, session: SessionContext, frames: list[OpenProtocolMessage]) -> None:
+        self._spawn(self._write_frames(session, frames))
+
+    async def open_session(self, role: SessionRole, remote: str, writer: Any) -> SessionContext | None:
+        """Register a new connection, or reject it with error 16 and return None."""
         session = SessionContext(
             session_id=uuid.uuid4().hex[:12],
             role=role,
@@ -153,65 +209,349 @@ class TcpService:
             reject = build_message(mid="0004", data=format_mid_error_payload("0001", 16), revision=1)
             writer.write(reject.raw)
             await writer.drain()
+            self._count_tx(session, (reject,))
             writer.close()
             with contextlib.suppress(Exception):
                 await writer.wait_closed()
             LOG.warning("Rejected %s session (%s): %s", role.value, remote, reason)
+            return None
+        LOG.info("Session connected %s (%s, %s)", session.session_id, role.value, remote)
+        impairment = self.impairments.get(role)
+        if impairment is not None:
+            attach(session, impairment, "port", self.metrics)
+        return session
+
+    async def _flush_fast_path(
+        self,
+        session: SessionContext,
+        handled: list[OpenProtocolMessage],
+        replies: list[OpenProtocolMessage],
+        traces: list[MessageTrace] | None,
+    ) -> None:
+        writer = session.writer
+        if replies and writer is not None and not writer.is_closing():
+            writer.write(b"".join(m.raw for m in replies))
+            enqueued = time.perf_counter()
+            await writer.drain()
+            self._count_tx(session, replies)
+            if traces is not None:
+                drained = time.perf_counter()
+                for trace in traces:
+                    trace.enqueued, trace.drained = enqueued, drained
+        if traces is not None:
+            for msg, trace in zip(handled, traces):
+                self.state.latency.observe(msg.mid, trace)
+        if self.settings.sim_capture_keepalive == "all":
+            await self.state.record_traffic_batch(session, "rx", handled, traces=traces)
+            if replies:
+                await self.state.record_traffic_batch(session, "tx", replies)
+        else:
+            # Frames the link window released or re-sent are logged whatever the keepalive policy.
+            released = [m for m in replies if m.mid not in FAST_PATH_MIDS]
+            if released:
+                await self.state.record_traffic_batch(session, "tx", released)
+
+    async def handle_messages(
+        self,
+        session: SessionContext,
+        incoming: list[OpenProtocolMessage],
+        read_at: float | None = None,
+        framed_at: float | None = None,
+        *,
+        impaired: bool = False,
+        relayed: bool = False,
+    ) -> None:
+        """Process framed messages received on ``session`` and write the replies.
+
+        With ``read_at``/``framed_at`` (``time.perf_counter()`` stamps of the
+        read that delivered ``incoming`` and of its framing) every frame gets a
+        :class:`MessageTrace` that follows it through dispatch and the write of
+        its replies. Frames of an impaired session come back through here, with
+        ``impaired`` set, once the impairment lets them through. ``relayed``
+        frames come from a protocol worker, which has already answered
+        keepalives and done the link-level acknowledging for them.
+        """
+        if session.impairment is not None and not impaired:
+            await session.impairment.inbound(
+                incoming,
+                lambda batch: self.handle_messages(session, batch, read_at, framed_at, impaired=True, relayed=relayed),
+            )
+            return
+        handled: list[OpenProtocolMessage] = []
+        replies: list[OpenProtocolMessage] = []
+        traces: list[MessageTrace] | None = None if read_at is None else []
+        metrics = self.metrics
+        for msg in incoming:
+            metrics.count_frame("rx", session.role, msg.mid)
+            trace = None if read_at is None else MessageTrace(read_at, framed_at if framed_at is not None else read_at)
+            if not relayed and self.link.fast_path(session, msg, replies):
+                handled.append(msg)
+                if trace is not None:
+                    traces.append(trace)
+                continue
+            if handled:
+                # Keep replies in arrival order across fast- and full-path frames.
+                await self._flush_fast_path(session, handled, replies, traces)
+                handled, replies = [], []
+                traces = None if read_at is None else []
+
+            received = await self.state.record_traffic(session, "rx", msg, trace=trace)
+
+            if not relayed:
+                process, link_ack = self.link.receive(session, msg)
+                if link_ack:
+                    await self._send(session, link_ack)
+                if session.link_window is not None and session.ack_mode == AckMode.APPLICATION:
+                    await self._send_many(session, self.link.leave(session))
+                if not process:
+                    continue
+            if msg.header.linked_message:
+                # Every part is logged and link-level acknowledged; only the whole message is dispatched.
+                msg = await self._reassemble(session, msg, received.seq)
+                if msg is None:
+                    continue
+
+            definition = self.dispatcher.catalog.get(msg.mid)
+            started = time.perf_counter()
+            responses = await self.dispatcher.dispatch(session, msg)
+            finished = time.perf_counter()
+            metrics.dispatch_histogram(definition.category if definition else "unknown").observe(finished - started)
+            if trace is None:
+                await self._send_responses(session, responses, reply_to=received.seq)
+                continue
+            trace.dispatch_start, trace.dispatch_end = started, finished
+            await self._send_responses(session, responses, reply_to=received.seq, trace=trace)
+            self.state.latency.observe(msg.mid, trace)
+        if handled:
+            await self._flush_fast_path(session, handled, replies, traces)
+
+    async def close_session(self, session: SessionContext) -> None:
+        if session.link_window is not None:
+            self.link.leave(session)
+        if session.impairment is not None:
+            session.impairment.stop()
+        writer = session.writer
+        writer.close()
+        with contextlib.suppress(Exception):
+            await writer.wait_closed()
+        await self.state.unregister_session(session.session_id)
+        LOG.info("Session closed %s", session.session_id)
+
+    async def _handle_client(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        role: SessionRole,
+    ) -> None:
+        peer = writer.get_extra_info("peername")
+        remote = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+        session = await self.open_session(role, remote, writer)
+        if session is None:
             return
 
-        LOG.info("Session connected %s (%s, %s)", session.session_id, role.value, remote)
         buffer = bytearray()
+        tracing = self.settings.sim_trace_latency
         try:
             while not reader.at_eof():
-                chunk = await reader.read(4096)
+                chunk = await reader.read(self.settings.sim_read_buffer)
                 if not chunk:
                     break
+                read_at = time.perf_counter() if tracing else None
                 session.touch()
                 buffer.extend(chunk)
-                incoming = parse_stream_buffer(buffer)
-                for msg in incoming:
-                    await self.state.record_traffic(session, "rx", msg)
-
-                    process, link_ack = await self._handle_link_ack(session, msg)
-                    if link_ack:
-                        await self._send(session, link_ack)
-                    if not process:
-                        continue
-
-                    responses = await self.dispatcher.dispatch(session, msg)
-                    for response in responses:
-                        out = self._with_sequence_if_needed(session, response)
-                        await self._send(session, out)
+                messages = parse_stream_buffer(buffer)
+                await self.handle_messages(session, messages, read_at, time.perf_counter() if tracing else None)
         except asyncio.CancelledError:
             raise
         except Exception:  # pragma: no cover - defensive.
             LOG.exception("Session failed %s", session.session_id)
         finally:
-            writer.close()
-            with contextlib.suppress(Exception):
-                await writer.wait_closed()
-            await self.state.unregister_session(session.session_id)
-            LOG.info("Session closed %s", session.session_id)
+            await self.close_session(session)
 
-    async def publish_event(self, event_type: str, payload: dict | None = None) -> dict:
-        event = await self.state.inject_event(event_type, payload or {})
-        session_list = await self.state.sessions()
-        pushed = 0
+    async def _send_many(
+        self,
+        session: SessionContext,
+        messages: list[OpenProtocolMessage],
+        *,
+        direction: str = "tx",
+        reply_to: int | None = None,
+        trace: MessageTrace | None = None,
+    ) -> None:
+        """Write several frames with a single drain and one traffic-log lock acquisition."""
+        await self._write_frames(session, self.link.admit(session, messages), direction=direction, reply_to=reply_to, trace=trace)
 
-        for info in session_list:
-            session = await self.state.get_session(info["session_id"])
-            if not session or not session.communication_started:
-                continue
-            messages = await self.state.generate_push_messages(session, event)
-            for msg in messages:
-                out = self._with_sequence_if_needed(session, msg)
-                await self._send(session, out)
-                pushed += 1
+    async def _write_frames(
+        self,
+        session: SessionContext,
+        messages: list[OpenProtocolMessage],
+        *,
+        direction: str = "tx",
+        reply_to: int | None = None,
+        trace: MessageTrace | None = None,
+    ) -> None:
+        writer = session.writer
+        if writer is None or writer.is_closing() or not messages:
+            return
+        writer.write(b"".join(m.raw for m in messages))
+        if trace is not None:
+            trace.enqueued = time.perf_counter()
+        await writer.drain()
+        if trace is not None:
+            trace.drained = time.perf_counter()
+        self._count_tx(session, messages)
+        await self.state.record_traffic_batch(session, direction, messages, reply_to=reply_to)
+
+    async def _send_responses(
+        self,
+        session: SessionContext,
+        responses: list[OpenProtocolMessage | LinkedMessage],
+        *,
+        reply_to: int | None = None,
+        trace: MessageTrace | None = None,
+    ) -> None:
+        """Sequence and write replies in order; linked messages go out part by part.
 
+        In link-level mode the send window decides what goes out now; the rest
+        follows as the peer acknowledges.
+        """
+        if session.ack_mode == AckMode.LINK_LEVEL:
+            await self._send_many(session, responses, reply_to=reply_to, trace=trace)
+            return
+        batch: list[OpenProtocolMessage] = []
+        for response in responses:
+            if isinstance(response, LinkedMessage):
+                await self._write_frames(session, batch, reply_to=reply_to)
+                batch = []
+                await self._send_parts(session, response, reply_to=reply_to, trace=trace)
+            else:
+                batch.append(response)
+        await self._write_frames(session, batch, reply_to=reply_to, trace=trace)
+
+    async def _send_parts(
+        self,
+        session: SessionContext,
+        message: LinkedMessage,
+        *,
+        reply_to: int | None = None,
+        trace: MessageTrace | None = None,
+    ) -> None:
+        """Write a linked message one part at a time.
+
+        Each part is encoded only after the previous one has drained, so a
+        large payload never sits in memory or in the transport buffer whole.
+        """
+        writer = session.writer
+        try:
+            for part in message.parts():
+                if writer is None or writer.is_closing():
+                    return
+                writer.write(part.raw)
+                if trace is not None and trace.enqueued is None:
+                    trace.enqueued = time.perf_counter()
+                await writer.drain()
+                self._count_tx(session, (part,))
+                await self.state.record_traffic(session, "tx", part, reply_to=reply_to)
+        except LinkError:
+            LOG.exception("Cannot send MID %s to session %s as linked parts", message.mid, session.session_id)
+            return
+        self.metrics.linked_segmented.inc()
+        if trace is not None:
+            trace.drained = time.perf_counter()
+
+    async def _publish_batch(self, batch: list[tuple[str, dict]]) -> tuple[list[SimulationEvent], list[int]]:
+        started = time.perf_counter()
+        sessions = [s for s in await self.state.session_contexts() if s.communication_started]
+        targets = {s.session_id: self.state.subscribed_targets(s) for s in sessions}
+        render_mids = {pair for session_targets in targets.values() for pair in session_targets.items()}
+
+        applied = await self.state.inject_events(batch, render_mids=render_mids)
+        pushed = [0] * len(applied)
+
+        for session in sessions:
+            session_targets = targets[session.session_id]
+            outbound: list[OpenProtocolMessage | LinkedMessage] = []
+            for index, (event, rendered) in enumerate(applied):
+                for mid, revision in sorted(rendered):
+                    if session_targets.get(mid) != revision:
+                        continue
+                    data = rendered[(mid, revision)]
+                    if isinstance(data, LinkedPayload):
+                        outbound.append(LinkedMessage(mid, revision, data))
+                    else:
+                        outbound.append(build_message(mid=mid, data=data, revision=revision))
+                    pushed[index] += 1
+            try:
+                await self._send_responses(session, outbound)
+            except (ConnectionError, OSError):
+                LOG.info("Dropping pushes for disconnected session %s", session.session_id)
+        self.metrics.fanout_time.observe(time.perf_counter() - started)
+        for count in pushed:
+            self.metrics.fanout_size.observe(count)
+        return [event for event, _ in applied], pushed
+
+    async def publish_event(self, event_type: str, payload: dict | None = None) -> dict:
+        events, pushed = await self._publish_batch([(event_type, payload or {})])
+        event = events[0]
         return {
             "event_id": event.event_id,
             "event_type": event.event_type,
             "affected_mids": event.affected_mids,
-            "pushed_messages": pushed,
+            "pushed_messages": pushed[0],
+        }
+
+    async def publish_events(self, batch: list[tuple[str, dict]]) -> dict:
+        """Inject many events at once; results are returned column-wise to keep them compact."""
+        events, pushed = await self._publish_batch(batch)
+        return {
+            "count": len(events),
+            "pushed_messages": sum(pushed),
+            "event_ids": [event.event_id for event in events],
+            "pushed": pushed,
         }
 
+    async def impairments_status(self) -> dict[str, Any]:
+        sessions = await self.state.session_contexts()
+        return {
+            "ports": {role.value: impairment.to_dict() for role, impairment in self.impairments.items()},
+            "sessions": {s.session_id: s.impairment.snapshot() for s in sessions if s.impairment is not None},
+        }
+
+    async def set_port_impairment(self, role: SessionRole, impairment: Impairment | None) -> dict[str, Any]:
+        """Impair a port's sessions, present and future, except those with an impairment of their own."""
+        if impairment is None or not impairment.active:
+            self.impairments.pop(role, None)
+            impairment = None
+        else:
+            self.impairments[role] = impairment
+        for session in await self.state.session_contexts():
+            if session.role is not role or (session.impairment is not None and session.impairment.scope == "session"):
+                continue
+            if impairment is None:
+                detach(session)
+            else:
+                attach(session, impairment, "port", self.metrics)
+        return await self.impairments_status()
+
+    async def set_session_impairment(self, session_id: str, impairment: Impairment | None) -> dict[str, Any] | None:
+        """Impair one session; None hands it back to its port's impairment. Raises KeyError for unknown sessions."""
+        session = await self.state.get_session(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if impairment is None:
+            detach(session)
+            impairment = self.impairments.get(session.role)
+            if impairment is not None:
+                attach(session, impairment, "port", self.metrics)
+        else:
+            attach(session, impairment, "session", self.metrics)
+        return session.impairment.snapshot() if session.impairment is not None else None
+
+    async def disconnect_session(self, session_id: str) -> None:
+        session = await self.state.get_session(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        LOG.info("Forcing session %s off the network", session.session_id)
+        disconnect(session)
+
+    def workers_status(self) -> list[dict[str, Any]]:
+        return self._pool.status() if self._pool is not None else []
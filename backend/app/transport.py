@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from .protocol import split_frames
+from .types import OpenProtocolMessage, SessionContext, SessionRole
+
+if TYPE_CHECKING:
+    from .tcp_server import TcpService
+
+LOG = logging.getLogger(__name__)
+
+TRANSPORTS = ("stream", "protocol")
+# Largest Open Protocol frame: 9999-byte length field plus the trailing NUL.
+MAX_FRAME_SIZE = 10000
+# Stop reading from a client that has this many received chunks still waiting for dispatch.
+PENDING_HIGH_WATER = 64
+
+
+class TransportWriter:
+    """``StreamWriter``-compatible view of a protocol's transport, with drain flow control."""
+
+    def __init__(self, transport: asyncio.Transport):
+        self.transport = transport
+        self._paused = False
+        self._drain_waiter: asyncio.Future | None = None
+        self._closed = asyncio.get_running_loop().create_future()
+
+    def write(self, data: bytes) -> None:
+        self.transport.write(data)
+
+    async def drain(self) -> None:
+        if self._closed.done():
+            raise ConnectionResetError("Connection lost")
+        if self._paused:
+            self._drain_waiter = asyncio.get_running_loop().create_future()
+            await self._drain_waiter
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def wait_closed(self) -> None:
+        await asyncio.shield(self._closed)
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self._wake_drain()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self._wake_drain(ConnectionResetError("Connection lost") if exc is None else exc)
+
+    def _wake_drain(self, exc: Exception | None = None) -> None:
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+
+class ReceiveScratch:
+    """Receive buffer shared by all sessions on one event loop.
+
+    ``recv_into`` and the following ``buffer_updated`` run back to back on the
+    loop thread, so sessions without a partial frame can all read into the same
+    memory and idle sessions own no receive buffer at all.
+    """
+
+    def __init__(self, size: int):
+        self.data = bytearray(max(size, MAX_FRAME_SIZE))
+        self.view = memoryview(self.data)
+
+
+class SessionProtocol(asyncio.BufferedProtocol):
+    """Receives into a shared scratch buffer and frames it in place.
+
+    Complete frames are cut out with :func:`split_frames`. Only a trailing
+    partial frame is copied into a private per-session buffer, which is
+    released again once the frame completes. Dispatch runs in a short-lived task
+    per burst of input, which keeps message order, so idle sessions hold no
+    task. Reads pause when dispatch falls behind.
+    """
+
+    def __init__(self, service: TcpService, role: SessionRole, scratch: ReceiveScratch):
+        self.service = service
+        self.role = role
+        self.session: SessionContext | None = None
+        self._scratch = scratch
+        self._buffer: bytearray | None = None
+        self._filled = 0
+        # Framed batches awaiting dispatch, with their read/framed stamps when latency tracing is on.
+        self._pending: deque[tuple[list[OpenProtocolMessage], float | None, float | None]] | None = None
+        self._tracing = service.settings.sim_trace_latency
+        self._reading_paused = False
+        self._lost = False
+        self._closed = False
+        self._transport: asyncio.Transport | None = None
+        self._writer: TransportWriter | None = None
+        self._task: asyncio.Task | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = transport  # type: ignore[assignment]
+        self._writer = TransportWriter(self._transport)
+        self._task = asyncio.get_running_loop().create_task(self._open())
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self._buffer is None:
+            return self._scratch.view
+        if self._filled == len(self._buffer):
+            # Cannot happen with a buffer of at least one maximum frame, kept as a guard.
+            grown = bytearray(len(self._buffer) * 2)
+            grown[: self._filled] = self._buffer
+            self._buffer = grown
+        return memoryview(self._buffer)[self._filled :]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        read_at = time.perf_counter() if self._tracing else None
+        if self.session is not None:
+            self.session.touch()
+        if self._buffer is None:
+            data, end = self._scratch.data, nbytes
+        else:
+            self._filled += nbytes
+            data, end = self._buffer, self._filled
+        messages, consumed = split_frames(data, 0, end)
+        remaining = end - consumed
+        if not remaining:
+            self._buffer = None
+            self._filled = 0
+        elif data is self._scratch.data:
+            self._buffer = bytearray(MAX_FRAME_SIZE + len(self._scratch.data))
+            self._buffer[:remaining] = data[consumed:end]
+            self._filled = remaining
+        elif consumed:
+            self._buffer[:remaining] = self._buffer[consumed:end]
+            self._filled = remaining
+        if messages:
+            if self._pending is None:
+                self._pending = deque()
+            self._pending.append((messages, read_at, time.perf_counter() if self._tracing else None))
+            if len(self._pending) >= PENDING_HIGH_WATER and not self._reading_paused:
+                self._reading_paused = True
+                self._transport.pause_reading()
+            self._schedule()
+
+    def eof_received(self) -> bool:
+        return False
+
+    def pause_writing(self) -> None:
+        self._writer.pause_writing()
+
+    def resume_writing(self) -> None:
+        self._writer.resume_writing()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._lost = True
+        self._writer.connection_lost(exc)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self.session is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _open(self) -> None:
+        peer = self._transport.get_extra_info("peername")
+        remote = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+        session = await self.service.open_session(self.role, remote, self._writer)
+        if session is None:
+            return
+        self.session = session
+        await self._drain()
+
+    async def _drain(self) -> None:
+        session = self.session
+        pending = self._pending
+        try:
+            while pending:
+                batch, read_at, framed_at = pending.popleft()
+                if self._reading_paused and len(pending) < PENDING_HIGH_WATER // 2:
+                    self._reading_paused = False
+                    self._transport.resume_reading()
+                await self.service.handle_messages(session, batch, read_at, framed_at)
+                pending = self._pending
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # pragma: no cover - defensive.
+            LOG.exception("Session failed %s", session.session_id)
+            self._transport.close()
+            self._lost = True
+        finally:
+            if self._pending is not None and not self._pending:
+                self._pending = None
+            if self._lost and not self._closed:
+                self._closed = True
+                await self.service.close_session(session)
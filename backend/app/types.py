@@ -3,7 +3,15 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterator, Mapping
+
+from . import clock
+from .latency import MessageTrace
+
+if TYPE_CHECKING:
+    from .impairment import Impairer
+    from .link_window import LinkWindow
+    from .linking import Reassembler
 
 
 class SessionRole(str, Enum):
@@ -102,13 +110,44 @@ class MidDefinition:
     profile_overrides: dict[str, Any]
 
 
-@dataclass
+class _NoSubscriptions(Mapping[str, int]):
+    """The empty, shared subscription map of every session that has none."""
+
+    __slots__ = ()
+
+    def __getitem__(self, mid: str) -> int:
+        raise KeyError(mid)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(())
+
+    def __len__(self) -> int:
+        return 0
+
+    def __hash__(self) -> int:
+        return 0
+
+
+# Sessions map each subscribed MID to the header revision it was subscribed with.
+NO_SUBSCRIPTIONS: Mapping[str, int] = _NoSubscriptions()
+
+
+@dataclass(slots=True)
 class SessionContext:
+    """Per-connection protocol state.
+
+    Slotted and lean so tens of thousands of idle sessions stay cheap:
+    ``created_at`` is ``clock.epoch()`` seconds, ``last_activity`` is
+    ``clock.monotonic()`` seconds, and the subscription set, pending-reply
+    dict, linked-message reassembler, link-level send window and network
+    impairment are only allocated once something is stored in them.
+    """
+
     session_id: str
     role: SessionRole
     remote: str
-    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
-    last_activity: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: float = field(default_factory=lambda: clock.epoch())
+    last_activity: float = field(default_factory=lambda: clock.monotonic())
     ack_mode: AckMode = AckMode.APPLICATION
     next_tx_seq: int = 1
     next_rx_seq: int = 1
@@ -116,13 +155,31 @@ class SessionContext:
     communication_started: bool = False
     station_id: str = "01"
     spindle_id: str = "01"
-    subscriptions: set[str] = field(default_factory=set)
-    pending_replies: dict[str, Any] = field(default_factory=dict)
+    subscriptions: dict[str, int] | Mapping[str, int] = NO_SUBSCRIPTIONS
+    pending_replies: dict[str, Any] | None = None
     last_link_ack: OpenProtocolMessage | None = None
+    reassembly: Reassembler | None = None
+    link_window: LinkWindow | None = None
+    impairment: Impairer | None = None
     writer: Any | None = None
 
     def touch(self) -> None:
-        self.last_activity = datetime.now(timezone.utc)
+        self.last_activity = clock.monotonic()
+
+    def idle_seconds(self, now: float | None = None) -> float:
+        return (clock.monotonic() if now is None else now) - self.last_activity
+
+    def subscribe(self, mid: str, revision: int = 1) -> None:
+        if self.subscriptions is NO_SUBSCRIPTIONS:
+            self.subscriptions = {}
+        self.subscriptions[mid] = revision
+
+    def unsubscribe(self, mid: str) -> None:
+        if mid in self.subscriptions:
+            del self.subscriptions[mid]
+
+    def clear_subscriptions(self) -> None:
+        self.subscriptions = NO_SUBSCRIPTIONS
 
 
 @dataclass
@@ -139,10 +196,12 @@ class SimulationEvent:
 class ScenarioDefinition:
     name: str
     steps: list[dict[str, Any]]
+    seed: int | None = None
 
 
 @dataclass
 class TrafficRecord:
+    seq: int
     timestamp: datetime
     session_id: str
     role: SessionRole
@@ -152,4 +211,7 @@ class TrafficRecord:
     length: int
     raw_ascii: str
     decoded_data: str
+    # Traffic seq of the received frame this one answers, and that frame's lifecycle stamps.
+    reply_to: int | None = None
+    trace: MessageTrace | None = None
 
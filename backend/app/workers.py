@@ -0,0 +1,536 @@
+"""Multi-process protocol front-end.
+
+With ``SIM_WORKERS=N`` the simulator spawns N worker processes that all bind
+the Classic/Actor/Viewer ports with SO_REUSEPORT, so the kernel spreads
+accepted connections across them. Workers frame what they read and do the
+session-local work themselves: keepalives are answered, link-level MID
+9997/9998 acknowledging and sequencing run in the worker, and only frames
+that need the simulator state are relayed, already split, over a Unix socket
+to the owner process. The owner keeps the single ``SimulatorState`` and runs
+the dispatcher, so session limits, actor exclusivity (errors 35/92) and event
+fan-out behave exactly as with the in-process listeners; workers send it
+traffic records and metric increments for what they answered locally.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterable
+
+from . import clock
+from .config import Settings
+from .engine import new_event_loop
+from .link_layer import FAST_PATH_MIDS, LinkLayer
+from .metrics import ProtocolMetrics
+from .protocol import decode_frame, parse_stream_buffer
+from .types import AckMode, OpenProtocolMessage, SessionContext, SessionRole
+
+if TYPE_CHECKING:
+    from .tcp_server import TcpService
+
+LOG = logging.getLogger(__name__)
+
+# IPC frame header: payload length, kind, worker-local connection id.
+_HEADER = struct.Struct("!IBI")
+# DATA and TRAFFIC payloads are whole protocol frames, each behind its length.
+_FRAME_LENGTH = struct.Struct("!I")
+# Worker to owner: HELLO, OPEN, DATA, CLOSE, TRAFFIC, STATS. Owner to worker:
+# WRITE, CLOSE, DONE (a DATA batch is fully answered) and STATE (the MID 9999
+# revisions the worker may answer for a connection; empty before MID 0001).
+HELLO, OPEN, DATA, CLOSE, WRITE, DONE, STATE, TRAFFIC, STATS = range(1, 10)
+
+WORKER_READ_SIZE = 65536
+# A client that stops reading is dropped once this much output is queued for it.
+WORKER_WRITE_LIMIT = 4 * 1024 * 1024
+READY_TIMEOUT_SEC = 15.0
+
+
+def role_ports(settings: Settings) -> tuple[tuple[SessionRole, int], ...]:
+    return (
+        (SessionRole.CLASSIC, settings.classic_port),
+        (SessionRole.ACTOR, settings.actor_port),
+        (SessionRole.VIEWER, settings.viewer_port),
+    )
+
+
+def ipc_path(settings: Settings) -> str:
+    name = f"opsim-{os.getpid()}-{settings.classic_port}.sock"
+    return settings.sim_ipc_path or os.path.join(tempfile.gettempdir(), name)
+
+
+def encode_frame(kind: int, conn_id: int, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(len(payload), kind, conn_id) + payload
+
+
+def pack_frames(frames: Iterable[OpenProtocolMessage]) -> bytes:
+    return b"".join(_FRAME_LENGTH.pack(len(m.raw)) + m.raw for m in frames)
+
+
+def unpack_frames(payload: bytes) -> list[OpenProtocolMessage]:
+    """The frames of a DATA or TRAFFIC payload, decoded without re-scanning the byte stream."""
+    frames: list[OpenProtocolMessage] = []
+    pos, end = 0, len(payload)
+    while pos < end:
+        (length,) = _FRAME_LENGTH.unpack_from(payload, pos)
+        pos += _FRAME_LENGTH.size
+        frames.append(decode_frame(payload[pos : pos + length]))
+        pos += length
+    return frames
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[int, int, bytes]:
+    length, kind, conn_id = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    payload = await reader.readexactly(length) if length else b""
+    return kind, conn_id, payload
+
+
+class RemoteWriter:
+    """``StreamWriter`` stand-in for a session whose socket lives in a worker."""
+
+    def __init__(self, channel: asyncio.StreamWriter, conn_id: int):
+        self._channel = channel
+        self._conn_id = conn_id
+        self._closing = False
+
+    def write(self, data: bytes) -> None:
+        if not self.is_closing():
+            self._channel.write(encode_frame(WRITE, self._conn_id, data))
+
+    async def drain(self) -> None:
+        await self._channel.drain()
+
+    def is_closing(self) -> bool:
+        return self._closing or self._channel.is_closing()
+
+    def close(self) -> None:
+        if not self.is_closing():
+            self._channel.write(encode_frame(CLOSE, self._conn_id))
+        self._closing = True
+
+    def mark_closed(self) -> None:
+        """The worker already dropped the socket; do not echo a close back."""
+        self._closing = True
+
+    async def wait_closed(self) -> None:
+        return None
+
+
+class WorkerPool:
+    """Owner side: spawns workers and bridges their connections to ``TcpService``."""
+
+    def __init__(self, service: TcpService):
+        self.service = service
+        self.settings = service.settings
+        self.path = ipc_path(self.settings)
+        self._server: asyncio.AbstractServer | None = None
+        self._processes: list[multiprocessing.process.BaseProcess] = []
+        self._workers: dict[int, dict[str, Any]] = {}
+        self._changed = asyncio.Event()
+        # Last STATE sent per session id.
+        self._states: dict[str, bytes] = {}
+
+    async def start(self) -> None:
+        await self.serve()
+        ctx = multiprocessing.get_context("spawn")
+        for index in range(self.settings.sim_workers):
+            proc = ctx.Process(
+                target=run_worker,
+                args=(self.settings, self.path, index),
+                name=f"opsim-worker-{index}",
+                daemon=True,
+            )
+            proc.start()
+            self._processes.append(proc)
+        if not await self.wait_ready(self.settings.sim_workers):
+            LOG.warning("Only %d of %d protocol workers became ready", len(self._workers), self.settings.sim_workers)
+
+    async def serve(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_channel, path=self.path)
+        LOG.info("Protocol worker IPC listening on %s", self.path)
+
+    async def wait_ready(self, count: int, timeout: float = READY_TIMEOUT_SEC) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self._workers) < count:
+            self._changed.clear()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._changed.wait(), remaining)
+        return True
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for worker in list(self._workers.values()):
+            worker["channel"].close()
+        for proc in self._processes:
+            await asyncio.to_thread(proc.join, 5)
+            if proc.is_alive():
+                proc.terminate()
+        self._processes.clear()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    def status(self) -> list[dict[str, Any]]:
+        return [
+            {"worker": index, "pid": worker["pid"], "sessions": len(worker["sessions"])}
+            for index, worker in sorted(self._workers.items())
+        ]
+
+    def sync(self) -> None:
+        """Re-send the keepalive state of sessions changed outside a relayed batch (reset, profile switch)."""
+        for worker in self._workers.values():
+            for conn_id, session in worker["sessions"].items():
+                self._sync_state(worker["channel"], conn_id, session)
+
+    def _sync_state(self, channel: asyncio.StreamWriter, conn_id: int, session: SessionContext) -> None:
+        revisions = self.service.dispatcher.accepted_revisions("9999") if session.communication_started else ()
+        state = ",".join(str(revision) for revision in sorted(revisions)).encode("ascii")
+        if self._states.get(session.session_id, b"") != state and not channel.is_closing():
+            self._states[session.session_id] = state
+            channel.write(encode_frame(STATE, conn_id, state))
+
+    async def _handle_channel(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sessions: dict[int, SessionContext] = {}
+        # DATA and TRAFFIC frames per connection, each connection handled by a task of
+        # its own so a session blocked on its output never holds up the others.
+        inboxes: dict[int, asyncio.Queue[tuple[int, float | None, bytes] | None]] = {}
+        handlers: dict[int, asyncio.Task] = {}
+        index: int | None = None
+        service = self.service
+        tracing = service.settings.sim_trace_latency
+        try:
+            while True:
+                kind, conn_id, payload = await read_frame(reader)
+                if kind == DATA or kind == TRAFFIC:
+                    inbox = inboxes.get(conn_id)
+                    if inbox is None:
+                        if kind == DATA:
+                            # The worker holds its own replies for this connection until the owner's are out.
+                            writer.write(encode_frame(DONE, conn_id))
+                        continue
+                    if kind == DATA:
+                        sessions[conn_id].touch()
+                    # Frames arrive already cut by the worker; "read" here is their arrival at the owner.
+                    inbox.put_nowait((kind, time.perf_counter() if tracing else None, payload))
+                elif kind == STATS:
+                    stats = json.loads(payload)
+                    service.metrics.add_deltas(stats["metrics"])
+                    now = clock.monotonic()
+                    for active in stats["active"]:
+                        session = sessions.get(active)
+                        if session is not None:
+                            session.last_activity = now
+                elif kind == OPEN:
+                    role, _, remote = payload.decode("utf-8").partition("\n")
+                    session = await self.service.open_session(SessionRole(role), remote, RemoteWriter(writer, conn_id))
+                    if session is not None:
+                        sessions[conn_id] = session
+                        inbox = inboxes[conn_id] = asyncio.Queue()
+                        handlers[conn_id] = asyncio.create_task(self._handle_connection(writer, sessions, conn_id, inbox))
+                elif kind == CLOSE:
+                    inbox = inboxes.pop(conn_id, None)
+                    if inbox is not None:
+                        # Closed by the handler once the frames queued before it are done.
+                        inbox.put_nowait(None)
+                elif kind == HELLO:
+                    index = conn_id
+                    self._workers[index] = {"pid": int(payload), "sessions": sessions, "channel": writer}
+                    self._changed.set()
+                    LOG.info("Protocol worker %d ready (pid %s)", index, payload.decode("ascii"))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            if index is not None:
+                self._workers.pop(index, None)
+                LOG.info("Protocol worker %d disconnected", index)
+            running = [task for task in handlers.values() if not task.done()]
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            for session in sessions.values():
+                self._states.pop(session.session_id, None)
+                session.writer.mark_closed()
+                await self.service.close_session(session)
+            writer.close()
+
+    async def _handle_connection(
+        self,
+        channel: asyncio.StreamWriter,
+        sessions: dict[int, SessionContext],
+        conn_id: int,
+        inbox: asyncio.Queue[tuple[int, float | None, bytes] | None],
+    ) -> None:
+        """Hand one connection's batches and traffic to the service in order, then close it once the worker has."""
+        service = self.service
+        session = sessions[conn_id]
+        while (item := await inbox.get()) is not None:
+            kind, read_at, payload = item
+            if kind == TRAFFIC:
+                await service.state.record_traffic_batch(session, payload[:2].decode("ascii"), unpack_frames(payload[2:]))
+                continue
+            try:
+                await service.handle_messages(session, unpack_frames(payload), read_at, read_at, relayed=True)
+            except (ConnectionError, OSError):
+                session.writer.close()
+            except Exception:  # pragma: no cover - defensive.
+                LOG.exception("Session failed %s", session.session_id)
+                session.writer.close()
+            if channel.is_closing():
+                return
+            self._sync_state(channel, conn_id, session)
+            channel.write(encode_frame(DONE, conn_id))
+        self._states.pop(session.session_id, None)
+        session.writer.mark_closed()
+        await service.close_session(session)
+        del sessions[conn_id]
+
+
+@dataclass(slots=True)
+class _Client:
+    """Worker-side state of one accepted connection."""
+
+    conn_id: int
+    session: SessionContext
+    writer: asyncio.StreamWriter
+    # MID 9999 revisions answered here, as last reported by the owner.
+    keepalive: frozenset[int] = frozenset()
+    # DATA batches relayed to the owner, and how many of them it has answered.
+    relayed: int = 0
+    done: int = 0
+    # Output of this worker queued behind replies the owner still owes, each
+    # entry tagged with the number of batches relayed before it.
+    held: deque[tuple[int, bytes]] = field(default_factory=deque)
+    active: bool = False
+
+
+class ProtocolWorker:
+    """Worker side: accepts protocol connections, answers what it can and relays the rest to the owner."""
+
+    def __init__(self, settings: Settings, path: str, index: int):
+        self.settings = settings
+        self.path = path
+        self.index = index
+        self.metrics = ProtocolMetrics()
+        self.link = LinkLayer(settings, self.metrics, self._keepalive_ok, self._resend)
+        self._capture = settings.sim_capture_keepalive == "all"
+        self._clients: dict[int, _Client] = {}
+        self._ids = itertools.count(1)
+        self._channel: asyncio.StreamWriter | None = None
+
+    async def run(self) -> None:
+        reader, self._channel = await asyncio.open_unix_connection(self.path)
+        servers: list[asyncio.AbstractServer] = []
+        watchdog = asyncio.create_task(self._watchdog())
+        try:
+            for role, port in role_ports(self.settings):
+                servers.append(
+                    await asyncio.start_server(
+                        lambda r, w, role=role: self._handle_client(r, w, role),
+                        host=self.settings.host,
+                        port=port,
+                        reuse_port=True,
+                        backlog=self.settings.sim_listen_backlog,
+                    )
+                )
+            self._channel.write(encode_frame(HELLO, self.index, str(os.getpid()).encode("ascii")))
+            await self._relay_owner(reader)
+        finally:
+            watchdog.cancel()
+            for server in servers:
+                server.close()
+            for client in self._clients.values():
+                client.writer.close()
+            self._channel.close()
+
+    async def _relay_owner(self, reader: asyncio.StreamReader) -> None:
+        with contextlib.suppress(asyncio.IncompleteReadError, ConnectionError):
+            while True:
+                kind, conn_id, payload = await read_frame(reader)
+                client = self._clients.get(conn_id)
+                if client is None or client.writer.is_closing():
+                    continue
+                if kind == WRITE:
+                    session = client.session
+                    if session.ack_mode == AckMode.LINK_LEVEL:
+                        # The owner writes unsequenced; the link window here numbers and paces the frames.
+                        frames = self.link.admit(session, parse_stream_buffer(bytearray(payload)))
+                        payload = b"".join(m.raw for m in frames)
+                    if payload:
+                        self._send(client, payload)
+                elif kind == DONE:
+                    client.done += 1
+                    held = client.held
+                    while held and held[0][0] <= client.done:
+                        self._send(client, held.popleft()[1])
+                elif kind == STATE:
+                    client.keepalive = frozenset(int(revision) for revision in payload.split(b",") if revision)
+                elif kind == CLOSE:
+                    client.writer.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, role: SessionRole) -> None:
+        channel = self._channel
+        conn_id = next(self._ids)
+        peer = writer.get_extra_info("peername")
+        remote = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+        client = self._clients[conn_id] = _Client(
+            conn_id, SessionContext(session_id=str(conn_id), role=role, remote=remote, writer=writer), writer
+        )
+        channel.write(encode_frame(OPEN, conn_id, f"{role.value}\n{remote}".encode("utf-8")))
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(WORKER_READ_SIZE)
+                if not chunk:
+                    break
+                client.session.touch()
+                client.active = True
+                buffer.extend(chunk)
+                frames = parse_stream_buffer(buffer)
+                if frames:
+                    self._receive(client, frames)
+                    await channel.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._clients.pop(conn_id, None)
+            if client.session.link_window is not None:
+                self.link.leave(client.session)
+            if not channel.is_closing():
+                channel.write(encode_frame(CLOSE, conn_id))
+            writer.close()
+
+    def _receive(self, client: _Client, frames: list[OpenProtocolMessage]) -> None:
+        """Answer keepalives and link ACKs, check sequence numbers and relay the rest, keeping replies in order."""
+        session = client.session
+        link = self.link
+        relay: list[OpenProtocolMessage] = []
+        for msg in frames:
+            replies: list[OpenProtocolMessage] = []
+            if link.fast_path(session, msg, replies):
+                self._count(session, "rx", (msg,))
+                if relay:
+                    self._relay(client, relay)
+                    relay = []
+                self._write(client, replies)
+                self._log(client, "rx", [msg], logged=self._capture)
+                if msg.mid == "9998":
+                    # Every unacknowledged frame went out again; logged whatever the keepalive policy.
+                    self._log(client, "tx", replies)
+                else:
+                    # Frames of the owner's that the window released were logged when the owner wrote them.
+                    self._log(client, "tx", [m for m in replies if m.mid in FAST_PATH_MIDS], logged=self._capture)
+                continue
+            process, link_ack = link.receive(session, msg)
+            out = [] if link_ack is None else [link_ack]
+            if session.link_window is not None and session.ack_mode == AckMode.APPLICATION:
+                out.extend(link.leave(session))
+            if out:
+                if relay:
+                    self._relay(client, relay)
+                    relay = []
+                self._write(client, out)
+            if process:
+                relay.append(msg)
+            else:
+                self._count(session, "rx", (msg,))
+                self._log(client, "rx", [msg])
+            if link_ack is not None:
+                self._log(client, "tx", [link_ack])
+        if relay:
+            self._relay(client, relay)
+
+    def _relay(self, client: _Client, frames: list[OpenProtocolMessage]) -> None:
+        self._channel.write(encode_frame(DATA, client.conn_id, pack_frames(frames)))
+        client.relayed += 1
+
+    def _write(self, client: _Client, frames: list[OpenProtocolMessage]) -> None:
+        if not frames:
+            return
+        data = b"".join(m.raw for m in frames)
+        if client.done < client.relayed:
+            client.held.append((client.relayed, data))
+        else:
+            self._send(client, data)
+
+    def _send(self, client: _Client, data: bytes) -> None:
+        writer = client.writer
+        if writer.is_closing():
+            return
+        writer.write(data)
+        if writer.transport.get_write_buffer_size() > WORKER_WRITE_LIMIT:
+            LOG.warning("Dropping client %d: %d bytes of unread output", client.conn_id, WORKER_WRITE_LIMIT)
+            writer.close()
+
+    def _count(self, session: SessionContext, direction: str, messages: Iterable[OpenProtocolMessage]) -> None:
+        metrics = self.metrics
+        for message in messages:
+            metrics.count_frame(direction, session.role, message.mid)
+            if direction == "tx" and message.mid == "0004":
+                metrics.count_error(message.data)
+
+    def _log(self, client: _Client, direction: str, frames: list[OpenProtocolMessage], *, logged: bool = True) -> None:
+        """Send frames to the owner's traffic log if ``logged``; frames sent from here are counted either way."""
+        if not frames:
+            return
+        if direction == "tx":
+            self._count(client.session, "tx", frames)
+        if logged and not self._channel.is_closing():
+            self._channel.write(encode_frame(TRAFFIC, client.conn_id, direction.encode("ascii") + pack_frames(frames)))
+
+    def _keepalive_ok(self, session: SessionContext, msg: OpenProtocolMessage) -> bool:
+        client = self._clients.get(int(session.session_id))
+        return client is not None and msg.revision in client.keepalive
+
+    def _resend(self, session: SessionContext, frames: list[OpenProtocolMessage]) -> None:
+        client = self._clients.get(int(session.session_id))
+        if client is not None:
+            self._write(client, frames)
+            self._log(client, "tx", frames)
+
+    async def _watchdog(self) -> None:
+        """Close idle connections and send the owner metric increments and activity, once a second."""
+        timeout = self.settings.sim_keepalive_timeout_sec
+        while True:
+            await clock.sleep(1)
+            now = clock.monotonic()
+            active: list[int] = []
+            for client in list(self._clients.values()):
+                if client.active:
+                    client.active = False
+                    active.append(client.conn_id)
+                if client.session.idle_seconds(now) > timeout and not client.writer.is_closing():
+                    LOG.info("Closing client %d due to keepalive timeout", client.conn_id)
+                    client.writer.close()
+            if self._channel.is_closing():
+                continue
+            stats = {"metrics": self.metrics.take_deltas(), "active": active}
+            if stats["metrics"] or active:
+                self._channel.write(encode_frame(STATS, 0, json.dumps(stats).encode("utf-8")))
+
+
+def run_worker(settings: Settings, path: str, index: int) -> None:
+    """Process entry point for one protocol worker."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s %(levelname)s worker-{index} %(name)s %(message)s")
+    clock.install(clock.from_settings(settings))
+    loop = new_event_loop()
+    with contextlib.suppress(KeyboardInterrupt):
+        loop.run_until_complete(ProtocolWorker(settings, path, index).run())
+    loop.close()
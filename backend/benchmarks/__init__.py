@@ -0,0 +1 @@
+"""Offline microbenchmarks for the simulator hot paths."""
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import importlib
+import inspect
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCH_DIR / "results.json"
+MODULES = ("benchmarks.hotpaths", "benchmarks.transport")
+
+LOOP = asyncio.new_event_loop()
+asyncio.set_event_loop(LOOP)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    ops: int = 1
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def bench(name: str, *, ops: int = 1) -> Callable[[Callable[[], Callable[[], Any]]], Callable[[], Callable[[], Any]]]:
+    """Register a benchmark.
+
+    The decorated function performs any setup and returns the operation to time,
+    either a plain callable or a coroutine function. ``ops`` is the number of
+    logical operations one call performs (e.g. frames parsed), so results are
+    reported per operation.
+    """
+
+    def wrap(setup: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+        BENCHMARKS[name] = Benchmark(name=name, setup=setup, ops=ops)
+        return setup
+
+    return wrap
+
+
+def run_async(coro: Any) -> Any:
+    """Run setup coroutines on the harness loop that async benchmarks also use."""
+    return LOOP.run_until_complete(coro)
+
+
+def _time_sync(op: Callable[[], Any], n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        op()
+    return time.perf_counter() - started
+
+
+def _time_async(op: Callable[[], Any], n: int) -> float:
+    async def _loop() -> float:
+        started = time.perf_counter()
+        for _ in range(n):
+            await op()
+        return time.perf_counter() - started
+
+    return LOOP.run_until_complete(_loop())
+
+
+def measure(benchmark: Benchmark, *, repeat: int, min_time: float) -> dict[str, Any]:
+    op = benchmark.setup()
+    timer = _time_async if inspect.iscoroutinefunction(op) else _time_sync
+    n = 1
+    # As in timeit, collections triggered by earlier allocations would land on whichever run is unlucky.
+    gc.collect()
+    gc.disable()
+    try:
+        while True:
+            elapsed = timer(op, n)
+            if elapsed >= min_time:
+                break
+            n = max(n * 2, int(n * min_time / max(elapsed, 1e-9) * 1.2))
+        # Best of N: the minimum is the least noisy estimate of the code's own cost.
+        best = min([elapsed] + [timer(op, n) for _ in range(repeat - 1)])
+    finally:
+        gc.enable()
+    ns = best / (n * benchmark.ops) * 1e9
+    return {"ns_per_op": round(ns, 2), "ops_per_sec": round(1e9 / ns, 1), "iterations": n}
+
+
+def _calibrate(min_time: float = 0.1) -> float:
+    """Cost of a fixed pure-Python loop, used to normalize results across machines."""
+
+    def op() -> int:
+        total = 0
+        for i in range(1000):
+            total += i * i
+        return total
+
+    return measure(Benchmark("calibration", lambda: op, ops=1000), repeat=5, min_time=min_time)["ns_per_op"]
+
+
+def run(benchmark: Benchmark, *, repeat: int, min_time: float) -> dict[str, Any]:
+    """Measure ``benchmark`` along with a calibration taken right before it.
+
+    The machine's speed drifts over a run (other processes, frequency scaling);
+    normalizing each result by its own calibration keeps that drift out of the
+    comparison.
+    """
+    calibration = _calibrate(0.02)
+    return {**measure(benchmark, repeat=repeat, min_time=min_time), "calibration_ns": calibration}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[dict[str, Any]]:
+    """Compare calibration-normalized timings; ``ratio > 1 + tolerance`` is a regression.
+
+    Results carrying their own ``calibration_ns`` are normalized by it, others
+    by the run's.
+    """
+    rows = []
+    for name, result in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append({"name": name, "status": "new", "ratio": None})
+            continue
+        scale = base.get("calibration_ns", baseline["calibration_ns"]) / result.get("calibration_ns", current["calibration_ns"])
+        ratio = result["ns_per_op"] * scale / base["ns_per_op"]
+        status = "regression" if ratio > 1 + tolerance else "improved" if ratio < 1 - tolerance else "ok"
+        rows.append({"name": name, "status": status, "ratio": round(ratio, 3)})
+    return rows
+
+
+def _normalized(result: dict[str, Any]) -> float:
+    return result["ns_per_op"] / result["calibration_ns"]
+
+
+def _in_fresh_process(names: list[str], args: argparse.Namespace) -> dict[str, dict[str, Any]]:
+    """Measure ``names`` again in a new interpreter.
+
+    Timings of one process can sit in a slow mode for its whole life (memory
+    layout, hash seed), so repeats within it do not average that out.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "results.json"
+        command = [sys.executable, "-m", "benchmarks", "--repeat", str(args.repeat), "--min-time", str(args.min_time)]
+        command += ["--output", str(output), "--baseline", str(Path(tmp) / "none.json")]
+        for name in names:
+            command += ["--only", name]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        return json.loads(output.read_text(encoding="utf-8"))["results"]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Simulator hot-path microbenchmarks")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--only", action="append", default=[], help="Only run the benchmark of this name (repeatable)")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed slowdown vs baseline (0.3 = 30%%)")
+    parser.add_argument(
+        "--recheck", type=int, default=2, help="Fresh processes that re-measure apparent regressions; the best result counts"
+    )
+    parser.add_argument("--update-baseline", action="store_true", help="Write results to the baseline file")
+    parser.add_argument(
+        "--baseline-runs", type=int, default=3, help="Processes a baseline is measured in; each benchmark keeps the median"
+    )
+    args = parser.parse_args(argv)
+
+    for module in MODULES:
+        importlib.import_module(module)
+
+    current: dict[str, Any] = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_ns": _calibrate(),
+        "results": {},
+    }
+    for name, benchmark in BENCHMARKS.items():
+        if (args.filter and args.filter not in name) or (args.only and name not in args.only):
+            continue
+        result = run(benchmark, repeat=args.repeat, min_time=args.min_time)
+        current["results"][name] = result
+        print(f"{name:<45} {result['ns_per_op']:>12.1f} ns/op {result['ops_per_sec']:>14.1f} ops/s")
+
+    if args.update_baseline:
+        names = list(current["results"])
+        runs = [current["results"]] + [_in_fresh_process(names, args) for _ in range(args.baseline_runs - 1)]
+        for name in names:
+            current["results"][name] = sorted((r[name] for r in runs), key=_normalized)[len(runs) // 2]
+        args.output.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        args.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        args.output.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    rows = compare(current, baseline, args.tolerance)
+    regressions = [r for r in rows if r["status"] == "regression"]
+    for _ in range(args.recheck):
+        if not regressions:
+            break
+        for name, result in _in_fresh_process([r["name"] for r in regressions], args).items():
+            if _normalized(result) < _normalized(current["results"][name]):
+                current["results"][name] = result
+        rows = compare(current, baseline, args.tolerance)
+        regressions = [r for r in rows if r["status"] == "regression"]
+    args.output.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+    for row in rows:
+        if row["status"] != "ok":
+            print(f"{row['status']:<11} {row['name']} (x{row['ratio']} vs baseline)")
+    print(f"{len(rows)} benchmarks compared, {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Microbenchmarks for the protocol, dispatcher and state hot paths."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from app.config import Settings
+from app.dispatcher import OpenProtocolDispatcher
+from app.link_window import LinkWindow
+from app.linking import LinkedMessage, LinkedPayload, Reassembler
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.protocol import build_message, encode_variable_fields, parse_stream_buffer
+from app.state import SimulatorState
+from app.tcp_server import TcpService
+from app.types import AckMode, SessionContext, SessionRole
+
+from .harness import bench, run_async
+
+FRAMES_PER_BUFFER = 100
+
+
+def _simulator() -> tuple[SimulatorState, OpenProtocolDispatcher, TcpService]:
+    settings = Settings()
+    catalog = MidCatalog.from_file(settings.data_dir / "mid_catalog.json")
+    profiles = ProfileStore.from_directory(settings.data_dir / "profiles", active="atlas_pf")
+    state = SimulatorState(
+        catalog=catalog,
+        profiles=profiles,
+        persistence=PersistenceStore(enabled=False, db_path=""),
+        keepalive_timeout_sec=15,
+        inactivity_hint_sec=10,
+        max_sessions=1000,
+    )
+    dispatcher = OpenProtocolDispatcher(settings, catalog, profiles, state)
+    return state, dispatcher, TcpService(settings, state, dispatcher)
+
+
+def _started_session(dispatcher: OpenProtocolDispatcher, session_id: str = "bench") -> SessionContext:
+    session = SessionContext(session_id=session_id, role=SessionRole.CLASSIC, remote="127.0.0.1:1")
+    run_async(dispatcher.state.register_session(session))
+    run_async(dispatcher.dispatch(session, build_message(mid="0001", revision=7)))
+    return session
+
+
+def _stream(noisy: bool) -> bytes:
+    frames = [
+        build_message(mid="0061", data=b"010000000001020K ", revision=1).raw,
+        build_message(mid="9999", revision=1).raw,
+        build_message(mid="0005", data=b"0060", revision=1).raw,
+        build_message(mid="0010", revision=1).raw,
+    ]
+    out = bytearray()
+    for i in range(FRAMES_PER_BUFFER):
+        if noisy and i % 4 == 0:
+            out += b"\r\nXX\xff"
+        out += frames[i % len(frames)]
+    return bytes(out)
+
+
+@bench("protocol.parse_stream_buffer.clean", ops=FRAMES_PER_BUFFER)
+def parse_clean() -> Any:
+    data = _stream(noisy=False)
+    return lambda: parse_stream_buffer(bytearray(data))
+
+
+@bench("protocol.parse_stream_buffer.noisy", ops=FRAMES_PER_BUFFER)
+def parse_noisy() -> Any:
+    data = _stream(noisy=True)
+    return lambda: parse_stream_buffer(bytearray(data))
+
+
+@bench("protocol.build_message")
+def build() -> Any:
+    return lambda: build_message(mid="0061", data=b"010000000001020K ", revision=1, sequence_number=7)
+
+
+@bench("protocol.encode_variable_fields", ops=10)
+def variable_fields() -> Any:
+    fields = [(1000 + i, "50", "001", "0001", f"{i * 1.25:.2f}", "") for i in range(10)]
+    return lambda: encode_variable_fields(fields)
+
+
+@bench("payloads.encode_0061")
+def encode_result_payload() -> Any:
+    state, _, _ = _simulator()
+    run_async(state.inject_event("tightening", {"torque_nm": 12.5}))
+    return lambda: state._render_locked("0061")
+
+
+@bench("payloads.decode_0061")
+def decode_result_payload() -> Any:
+    state, _, _ = _simulator()
+    data = state._render_locked("0061")
+    return lambda: state.codecs.decode("0061", 1, data)
+
+
+@bench("linking.segment_0900")
+def segment_trace() -> Any:
+    state, _, _ = _simulator()
+    run_async(state.inject_event("tightening", {"trace_points": [n % 1000 for n in range(40000)]}))
+
+    def op() -> None:
+        payload = state._render_locked("0900")
+        for _ in LinkedMessage("0900", 1, payload).parts():
+            pass
+
+    return op
+
+
+@bench("linking.reassemble_0900")
+def reassemble_trace() -> Any:
+    state, _, _ = _simulator()
+    run_async(state.inject_event("tightening", {"trace_points": [n % 1000 for n in range(40000)]}))
+    payload = state._render_locked("0900")
+    parts = list(LinkedMessage("0900", 1, LinkedPayload(payload.sizes, tuple(payload.pieces))).parts())
+
+    def op() -> None:
+        reassembler = Reassembler()
+        for part in parts:
+            reassembler.feed(part)
+
+    return op
+
+
+@bench("link_window.send_and_ack")
+def link_window_round_trip() -> Any:
+    session = SessionContext(session_id="bench", role=SessionRole.CLASSIC, remote="127.0.0.1:1", ack_mode=AckMode.LINK_LEVEL)
+    window = LinkWindow(session)
+    msg = build_message(mid="0061", data=b"010000000001020K ", revision=1)
+
+    def op() -> None:
+        window.submit(msg, 0.0)
+        window.ack(session.next_tx_seq, 0.0)
+
+    return op
+
+
+def _dispatch_bench(mid: str, data: bytes = b"", revision: int = 1) -> Any:
+    _, dispatcher, _ = _simulator()
+    session = _started_session(dispatcher)
+    msg = build_message(mid=mid, data=data, revision=revision)
+
+    async def op() -> None:
+        await dispatcher.dispatch(session, msg)
+
+    return op
+
+
+@bench("dispatch.keepalive_9999")
+def dispatch_keepalive() -> Any:
+    return _dispatch_bench("9999")
+
+
+@bench("dispatch.session_0001_0003", ops=2)
+def dispatch_session() -> Any:
+    _, dispatcher, _ = _simulator()
+    session = _started_session(dispatcher)
+    stop, start = build_message(mid="0003"), build_message(mid="0001", revision=7)
+
+    async def op() -> None:
+        await dispatcher.dispatch(session, stop)
+        await dispatcher.dispatch(session, start)
+
+    return op
+
+
+@bench("dispatch.ack_0005")
+def dispatch_ack() -> Any:
+    return _dispatch_bench("0005", b"0061")
+
+
+@bench("dispatch.reply_0013")
+def dispatch_reply() -> Any:
+    return _dispatch_bench("0013")
+
+
+@bench("dispatch.event_or_data_0061")
+def dispatch_event_or_data() -> Any:
+    return _dispatch_bench("0061")
+
+
+@bench("dispatch.request_0010")
+def dispatch_request() -> Any:
+    return _dispatch_bench("0010")
+
+
+@bench("dispatch.command_0018")
+def dispatch_command() -> Any:
+    return _dispatch_bench("0018", b"001")
+
+
+@bench("dispatch.command_0018.500_sessions")
+def dispatch_command_crowded() -> Any:
+    _, dispatcher, _ = _simulator()
+    for i in range(499):
+        _started_session(dispatcher, f"s{i}")
+    session = _started_session(dispatcher)
+    msg = build_message(mid="0018", data=b"001", revision=1)
+
+    async def op() -> None:
+        await dispatcher.dispatch(session, msg)
+
+    return op
+
+
+@bench("dispatch.subscribe_0060")
+def dispatch_subscribe() -> Any:
+    return _dispatch_bench("0060")
+
+
+@bench("dispatch.generic_request_0006")
+def dispatch_generic_request() -> Any:
+    return _dispatch_bench("0006", b"0015")
+
+
+@bench("dispatch.unsupported_revision")
+def dispatch_error() -> Any:
+    return _dispatch_bench("0018", b"001", revision=9)
+
+
+class _NullWriter:
+    def write(self, data: bytes) -> None:
+        pass
+
+    async def drain(self) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+
+@bench("tcp.publish_batch.10_sessions", ops=10)
+def push_fanout() -> Any:
+    state, dispatcher, service = _simulator()
+    sessions = [_started_session(dispatcher, f"s{i}") for i in range(10)]
+    for session in sessions:
+        session.writer = _NullWriter()
+        run_async(state.add_subscription(session, "0060"))
+        run_async(state.add_subscription(session, "0070"))
+    batch = [("tightening", {"torque_nm": 12.5})]
+
+    async def op() -> None:
+        await service._publish_batch(batch)
+
+    return op
+
+
+@bench("state.record_traffic")
+def record_traffic() -> Any:
+    state, _, _ = _simulator()
+    session = SessionContext(session_id="bench", role=SessionRole.CLASSIC, remote="127.0.0.1:1")
+    msg = build_message(mid="0061", data=b"010000000001020K ", revision=1)
+
+    async def op() -> None:
+        await state.record_traffic(session, "tx", msg)
+
+    return op
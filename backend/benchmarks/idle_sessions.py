@@ -0,0 +1,136 @@
+"""Memory cost per idle protocol session.
+
+Starts an in-process TcpService, opens N sessions from a separate client
+process (each completes the MID 0001 handshake and then stays silent), and
+reports the server-side growth in traced Python memory and in RSS, per session.
+
+    python -m benchmarks.idle_sessions --sessions 10000 --transport protocol
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tracemalloc
+from dataclasses import replace
+from typing import Any
+
+from app.config import Settings
+from app.protocol import build_message
+from app.state import TRAFFIC_BUFFER_SIZE
+from app.tcp_server import TcpService, _raise_fd_limit
+from app.transport import TRANSPORTS
+from app.types import SessionContext, SessionRole
+
+from .hotpaths import _simulator
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm", encoding="ascii") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _clients(port: int, count: int, conn: Any) -> None:
+    _raise_fd_limit(count + 64)
+    hello = build_message(mid="0001", revision=7).raw
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(hello)
+        sockets.append(sock)
+    for sock in sockets:
+        sock.recv(4096)
+    conn.send("ready")
+    conn.recv()
+    for sock in sockets:
+        sock.close()
+
+
+async def _wait_for(state: Any, count: int) -> None:
+    while True:
+        contexts = await state.session_contexts()
+        if len(contexts) >= count and all(c.communication_started for c in contexts):
+            return
+        await asyncio.sleep(0.1)
+
+
+async def measure(sessions: int, transport: str) -> dict[str, Any]:
+    state, _, tcp = _simulator()
+    state.max_sessions = sessions + 16
+    tcp.settings = replace(
+        Settings(),
+        host="127.0.0.1",
+        classic_port=_free_port(),
+        actor_port=_free_port(),
+        viewer_port=_free_port(),
+        sim_transport=transport,
+        sim_max_sessions=sessions + 16,
+        sim_listen_backlog=4096,
+    )
+    # Fill the bounded traffic log first so handshake traffic does not count as session cost.
+    filler = SessionContext(session_id="filler", role=SessionRole.CLASSIC, remote="-")
+    await state.record_traffic_batch(filler, "rx", [build_message(mid="9999")] * TRAFFIC_BUFFER_SIZE)
+    await tcp.start()
+
+    gc.collect()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    rss_before = _rss_bytes()
+
+    parent, child = multiprocessing.get_context("spawn").Pipe()
+    proc = multiprocessing.get_context("spawn").Process(target=_clients, args=(tcp.settings.classic_port, sessions, child))
+    proc.start()
+    await asyncio.to_thread(parent.recv)
+    await _wait_for(state, sessions)
+
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0] - traced_before
+    rss = _rss_bytes() - rss_before
+
+    parent.send("done")
+    await asyncio.to_thread(proc.join, 30)
+    await tcp.stop()
+    return {
+        "sessions": sessions,
+        "transport": transport,
+        "traced_bytes_per_session": round(traced / sessions, 1),
+        "rss_bytes_per_session": round(rss / sessions, 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.idle_sessions", description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--transport", choices=TRANSPORTS + ("both",), default="both")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    _raise_fd_limit(args.sessions + 256)
+    tracemalloc.start()
+    results = []
+    for transport in TRANSPORTS if args.transport == "both" else (args.transport,):
+        results.append(asyncio.run(measure(args.sessions, transport)))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(
+                f"{r['transport']:<9} {r['sessions']:>6} idle sessions: "
+                f"{r['traced_bytes_per_session']:>8.0f} B/session traced, {r['rss_bytes_per_session']:>8.0f} B/session RSS"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
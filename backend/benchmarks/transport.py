@@ -0,0 +1,62 @@
+"""Loopback round trips through the StreamReader and BufferedProtocol server paths."""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+from dataclasses import replace
+from typing import Any
+
+from app.config import Settings
+from app.protocol import build_message, parse_stream_buffer
+
+from .harness import bench, run_async
+from .hotpaths import _simulator
+
+PIPELINE = 50
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _roundtrip(transport: str) -> Any:
+    _, dispatcher, tcp = _simulator()
+    tcp.settings = replace(
+        Settings(),
+        host="127.0.0.1",
+        classic_port=_free_port(),
+        actor_port=_free_port(),
+        viewer_port=_free_port(),
+        sim_transport=transport,
+    )
+    run_async(tcp.start())
+    reader, writer = run_async(asyncio.open_connection("127.0.0.1", tcp.settings.classic_port))
+    burst = build_message(mid="9999").raw * PIPELINE
+    buffer = bytearray()
+
+    async def exchange(payload: bytes, expected: int) -> None:
+        writer.write(payload)
+        received = 0
+        while received < expected:
+            buffer.extend(await reader.read(65536))
+            received += len(parse_stream_buffer(buffer))
+
+    run_async(exchange(build_message(mid="0001", revision=7).raw, 1))
+
+    async def op() -> None:
+        await exchange(burst, PIPELINE)
+
+    return op
+
+
+@bench("transport.stream.keepalive_pipeline", ops=PIPELINE)
+def stream_roundtrip() -> Any:
+    return _roundtrip("stream")
+
+
+@bench("transport.protocol.keepalive_pipeline", ops=PIPELINE)
+def protocol_roundtrip() -> Any:
+    return _roundtrip("protocol")
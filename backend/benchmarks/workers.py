@@ -0,0 +1,143 @@
+"""Keepalive throughput by number of protocol worker processes.
+
+Starts a TcpService with ``SIM_WORKERS`` set to each requested count (0 keeps
+the listeners in-process), drives it from separate client processes that keep
+a pipeline of frames in flight on every connection, and reports the frames
+answered per second and the CPU time the owner process spent per frame. With
+workers the owner should only see the frames that need the simulator state, so
+its CPU per keepalive drops towards zero and throughput grows with the worker
+count until the cores (or the clients) run out.
+
+    python -m benchmarks.workers --workers 0,1,2,4 --seconds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+from app.config import Settings
+from app.protocol import build_message, parse_stream_buffer
+
+from .hotpaths import _simulator
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _drive(port: int, connections: int, pipeline: int, seconds: float, mid: str) -> int:
+    hello = build_message(mid="0001", revision=7).raw
+    burst = build_message(mid=mid).raw * pipeline
+
+    async def connection() -> int:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        buffer = bytearray()
+
+        async def replies(count: int) -> None:
+            while count > 0:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                buffer.extend(chunk)
+                count -= len(parse_stream_buffer(buffer))
+
+        writer.write(hello)
+        await replies(1)
+        done = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            writer.write(burst)
+            await replies(pipeline)
+            done += pipeline
+        writer.close()
+        return done
+
+    return sum(await asyncio.gather(*(connection() for _ in range(connections))))
+
+
+def _clients(port: int, connections: int, pipeline: int, seconds: float, mid: str, conn: Any) -> None:
+    conn.send(asyncio.run(_drive(port, connections, pipeline, seconds, mid)))
+
+
+async def measure(workers: int, args: argparse.Namespace) -> dict[str, Any]:
+    state, _, tcp = _simulator()
+    with tempfile.TemporaryDirectory() as tmp:
+        tcp.settings = replace(
+            Settings(),
+            host="127.0.0.1",
+            classic_port=_free_port(),
+            actor_port=_free_port(),
+            viewer_port=_free_port(),
+            sim_workers=workers,
+            sim_ipc_path=str(Path(tmp) / "ipc.sock"),
+            sim_capture_keepalive=args.capture,
+            sim_listen_backlog=4096,
+        )
+        await tcp.start()
+        ctx = multiprocessing.get_context("spawn")
+        pipes, procs = [], []
+        for _ in range(args.clients):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_clients,
+                args=(tcp.settings.classic_port, args.connections, args.pipeline, args.seconds, args.mid, child),
+            )
+            pipes.append(parent)
+            procs.append(proc)
+        cpu_before, started = time.process_time(), time.perf_counter()
+        for proc in procs:
+            proc.start()
+        frames = 0
+        for parent in pipes:
+            frames += await asyncio.to_thread(parent.recv)
+        elapsed, owner_cpu = time.perf_counter() - started, time.process_time() - cpu_before
+        for proc in procs:
+            await asyncio.to_thread(proc.join, 30)
+        await tcp.stop()
+    return {
+        "workers": workers,
+        "mid": args.mid,
+        "frames": frames,
+        "frames_per_sec": round(frames / elapsed, 1),
+        "owner_cpu_us_per_frame": round(owner_cpu / max(frames, 1) * 1e6, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.workers", description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="0,1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--clients", type=int, default=2, help="Client processes")
+    parser.add_argument("--connections", type=int, default=16, help="Connections per client process")
+    parser.add_argument("--pipeline", type=int, default=32, help="Frames in flight per connection")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--mid", default="9999", help="MID to send; 9999 is answered by the workers, e.g. 0010 is relayed")
+    parser.add_argument("--capture", choices=("all", "none"), default="none", help="SIM_CAPTURE_KEEPALIVE for the run")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = [asyncio.run(measure(int(count), args)) for count in args.workers.split(",")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(
+                f"{r['workers']:>2} workers, MID {r['mid']}: {r['frames_per_sec']:>10.0f} frames/s, "
+                f"{r['owner_cpu_us_per_frame']:>7.2f} us owner CPU/frame"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
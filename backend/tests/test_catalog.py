@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import re
 import unittest
 from pathlib import Path
 
 from app.mid_catalog import MidCatalog
+from app.payload_layouts import PAYLOAD_LAYOUTS
+from app.payloads import PayloadCodec, layouts_from_schema
 
 
 class CatalogTests(unittest.TestCase):
@@ -14,6 +17,38 @@ class CatalogTests(unittest.TestCase):
         for mid in ("0001", "0002", "0061", "0900", "2500", "9999"):
             self.assertTrue(catalog.contains(mid), mid)
 
+    def test_extracted_payload_schemas_compile_and_match_in_tree_layouts(self) -> None:
+        catalog = MidCatalog.from_file(Path(__file__).resolve().parent.parent / "data" / "mid_catalog.json")
+        compared = 0
+        for mid in catalog.mids():
+            extracted = layouts_from_schema(catalog.get(mid).payload_schema)
+            for revision, fields in extracted.items():
+                PayloadCodec(mid, revision, fields)
+            for revision, fields in PAYLOAD_LAYOUTS.get(mid, {}).items():
+                # List fields come out of the spec tables as a count and a variable tail.
+                if revision not in extracted or any(f.type == "list" for f in fields):
+                    continue
+                expected = [(f.pid, f.length) for f in fields if f.type in ("num", "str")]
+                self.assertEqual([(f.pid, f.length) for f in extracted[revision]], expected, f"MID {mid} rev {revision}")
+                compared += 1
+        self.assertGreaterEqual(compared, 50)
+
+    def test_extracted_payload_schemas_name_every_field_once(self) -> None:
+        catalog = MidCatalog.from_file(Path(__file__).resolve().parent.parent / "data" / "mid_catalog.json")
+        for mid in catalog.mids():
+            for revision, fields in catalog.get(mid).payload_schema.items():
+                where = f"MID {mid} rev {revision}"
+                names = [f["name"] for f in fields]
+                self.assertEqual([n for n in names if re.fullmatch(r"field(_\d+)+", n)], [], where)
+                self.assertEqual(len(set(names)), len(names), where)
+                pids = [f["pid"] for f in fields if f["name"] != "variable_data"]
+                if any(pids):
+                    # None included: a table with parameter ids gives one to every fixed field but a stray one.
+                    self.assertEqual(len(set(pids)), len(pids), where)
+        schema = catalog.get("0105").payload_schema["2"]
+        self.assertEqual([f["name"] for f in schema], ["data_no_system", "send_only_new_data"])
+        self.assertEqual([f["pid"] for f in catalog.get("0152").payload_schema["1"]], ["01", "02", "03", "04"])
+
 
 if __name__ == "__main__":
     unittest.main()
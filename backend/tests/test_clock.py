@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import unittest
+from datetime import datetime, timezone
+
+from app import clock
+from app.clock import Clock, VirtualClock
+
+
+class ClockTests(unittest.IsolatedAsyncioTestCase):
+    async def test_advance_wakes_sleepers_in_deadline_order(self) -> None:
+        virtual = VirtualClock(start=datetime(2026, 1, 5, 6, 0, tzinfo=timezone.utc).timestamp())
+        woke: list[int] = []
+
+        async def sleeper(seconds: int) -> None:
+            await virtual.sleep(seconds)
+            woke.append(seconds)
+
+        tasks = [asyncio.create_task(sleeper(seconds)) for seconds in (3600, 60, 7200)]
+        fired: list[str] = []
+        virtual.call_later(1800, fired.append, "timer")
+        await asyncio.sleep(0)
+        self.assertEqual(virtual.snapshot()["pending_timers"], 4)
+
+        virtual.advance(3600)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.assertEqual((woke, fired), ([60, 3600], ["timer"]))
+        self.assertEqual(virtual.now().strftime("%H:%M"), "07:00")
+
+        virtual.advance(3600)
+        await asyncio.gather(*tasks)
+        self.assertEqual(woke, [60, 3600, 7200])
+        self.assertEqual(virtual.snapshot()["pending_timers"], 0)
+        with self.assertRaises(ValueError):
+            virtual.advance(-1)
+
+    async def test_speed_compresses_sleeps_and_keeps_time_continuous(self) -> None:
+        virtual = VirtualClock(speed=1000)
+        started = time.monotonic()
+        await virtual.sleep(2.0)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreaterEqual(virtual.monotonic(), 2.0)
+
+        before = virtual.monotonic()
+        virtual.set_speed(1)
+        self.assertAlmostEqual(virtual.monotonic(), before, delta=0.1)
+
+    async def test_install_rebinds_the_module_functions(self) -> None:
+        self.addCleanup(clock.install, Clock())
+        virtual = VirtualClock(start=0.0)
+        clock.install(virtual)
+        self.assertIs(clock.current(), virtual)
+        self.assertLess(clock.epoch(), 60.0)
+        self.assertEqual(clock.now().year, 1970)
+        clock.install(Clock())
+        self.assertIs(clock.monotonic, time.monotonic)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.config import Settings
+from app.controllers import ControllerRegistry, load_controller_specs
+from app.engine import ProtocolEngine
+from app.mid_catalog import MidCatalog
+from app.profiles import ProfileStore
+from app.scenarios import load_scenarios
+
+
+class ControllerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.settings = Settings()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _specs(self, raw: dict) -> list:
+        path = Path(self.tmp.name) / "controllers.json"
+        path.write_text(json.dumps(raw), encoding="utf-8")
+        return load_controller_specs(path, self.settings)
+
+    def test_ports_are_assigned_from_base(self) -> None:
+        specs = self._specs(
+            {
+                "port_base": 5000,
+                "defaults": {"max_sessions": 4},
+                "controllers": [{"id": "a"}, {"id": "b", "profile": "cleco"}, {"id": "c", "classic_port": 6000}],
+            }
+        )
+        self.assertEqual([(s.classic_port, s.actor_port, s.viewer_port) for s in specs], [(5000, 5001, 5002), (5003, 5004, 5005), (6000, 6001, 6002)])
+        self.assertEqual([s.profile for s in specs], ["atlas_pf", "cleco", "atlas_pf"])
+        self.assertEqual({s.max_sessions for s in specs}, {4})
+
+        with self.assertRaises(ValueError):
+            self._specs({"controllers": [{"id": "a", "classic_port": 5000}, {"id": "b", "classic_port": 5002}]})
+        with self.assertRaises(ValueError):
+            self._specs({"controllers": [{"id": "a/b"}]})
+
+    async def test_controllers_share_read_only_data_and_isolate_state(self) -> None:
+        specs = self._specs({"controllers": [{"id": "a"}, {"id": "b", "profile": "cleco"}]})
+        registry = ControllerRegistry(
+            specs,
+            settings=self.settings,
+            catalog=MidCatalog.from_file(self.settings.data_dir / "mid_catalog.json"),
+            profiles=ProfileStore.from_directory(self.settings.data_dir / "profiles", active="atlas_pf"),
+            engine=ProtocolEngine(),
+            scenarios=load_scenarios(self.settings.data_dir / "scenarios.json"),
+        )
+        a, b = registry.get("a"), registry.get("b")
+        self.assertIs(registry.default, a)
+        self.assertIs(a.catalog, b.catalog)
+        self.assertIs(a.scenario_runner.timelines, b.scenario_runner.timelines)
+        self.assertIs(a.state.codecs, b.state.codecs)
+        self.assertEqual((a.profiles.active_name, b.profiles.active_name), ("atlas_pf", "cleco"))
+
+        await a.state.update_state_domain("vin", {"current": "VIN-A"})
+        self.assertEqual((await b.state.get_state_domain("vin"))["current"], "SIMVIN00000000001")
+        result = await b.publish_event("tightening", {"torque_nm": 9.0})
+        self.assertEqual(result["event_type"], "tightening")
+        self.assertEqual((await a.state.get_state_domain("results"))["history"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import unittest
+
+from app.diagnostics import AllocationTracker, LoopMonitor, ProfileBusy, StackSampler, loop_metric_families
+from app.metrics import render_exposition
+
+
+def _blocking_call() -> None:
+    time.sleep(0.3)
+
+
+class LoopMonitorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_stall_is_measured_and_located(self) -> None:
+        monitor = LoopMonitor("test", interval=0.01, threshold=0.05)
+        await monitor.start()
+        self.addAsyncCleanup(monitor.stop)
+        await asyncio.sleep(0.05)
+
+        _blocking_call()
+        for _ in range(50):
+            if monitor.stalls:
+                break
+            await asyncio.sleep(0.01)
+
+        snapshot = monitor.snapshot()
+        self.assertEqual(snapshot["stall_count"], 1)
+        stall = snapshot["stalls"][0]
+        self.assertGreaterEqual(stall["duration_ms"], 200)
+        self.assertIn("_blocking_call", "".join(stall["stack"]))
+        self.assertGreaterEqual(snapshot["max_lag_ms"], 200)
+
+        text = render_exposition([({}, loop_metric_families([monitor]))])
+        self.assertIn('opsim_loop_stalls_total{loop="test"} 1', text)
+        self.assertIn('opsim_loop_lag_seconds_count{loop="test"}', text)
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_sampler_collapses_busy_thread_stacks(self) -> None:
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(stop.set)
+
+        sampler = StackSampler()
+        result = sampler.run(0.2, hz=200)
+        self.assertFalse(sampler.active)
+        collapsed = StackSampler.collapsed(result)
+        self.assertTrue(any(line.startswith("busy;") and "_busy_loop" in line for line in collapsed.splitlines()))
+        top = StackSampler.top(result)
+        self.assertTrue(any("_busy_loop" in entry["function"] for entry in top["functions"]))
+
+        sampler._busy.acquire()
+        with self.assertRaises(ProfileBusy):
+            sampler.run(0.01)
+        sampler._busy.release()
+
+    def test_allocation_diff_shows_new_sites(self) -> None:
+        tracker = AllocationTracker()
+        tracker.start()
+        self.addCleanup(tracker.stop)
+        retained = [bytearray(1024) for _ in range(2000)]
+        report = tracker.snapshot(limit=5)
+        self.assertTrue(report["diff"])
+        self.assertIn("test_diagnostics.py", report["top"][0]["site"])
+        self.assertGreaterEqual(report["top"][0]["size_diff_kb"], 2000)
+        self.assertEqual(len(retained), 2000)
+        self.assertFalse(tracker.stop()["active"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -45,6 +45,45 @@ class DispatcherTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(resp[0].mid, "0005")
         self.assertIn("0060", self.session.subscriptions)
 
+    async def test_commands_and_data_requests_use_payload_codecs(self) -> None:
+        await self.dispatcher.dispatch(self.session, build_message(mid="0001", revision=7, data=b"01"))
+        await self.dispatcher.dispatch(self.session, build_message(mid="0018", revision=1, data=b"007"))
+        self.assertEqual((await self.state.get_state_domain("pset"))["selected"], "007")
+        await self.dispatcher.dispatch(self.session, build_message(mid="0038", revision=2, data=b"0012"))
+        self.assertEqual((await self.state.get_state_domain("job"))["selected"], "0012")
+        reply = (await self.dispatcher.dispatch(self.session, build_message(mid="0006", revision=1, data=b"001500200")))[0]
+        self.assertEqual((reply.mid, reply.header.revision), ("0015", "002"))
+        self.assertEqual(self.state.codecs.decode("0015", 2, reply.data)["pset_id"], 7)
+
+    async def test_actor_exclusivity_follows_registry_changes(self) -> None:
+        first = SessionContext(session_id="a1", role=SessionRole.ACTOR, remote="127.0.0.1:1")
+        second = SessionContext(session_id="a2", role=SessionRole.ACTOR, remote="127.0.0.1:2")
+        for session in (self.session, first, second):
+            await self.state.register_session(session)
+        self.assertEqual(self.state.role_counts(), {"classic": 1, "actor": 2, "viewer": 0})
+
+        async def send(session: SessionContext, mid: str) -> str:
+            revision = 7 if mid == "0001" else 1
+            reply = (await self.dispatcher.dispatch(session, build_message(mid=mid, revision=revision)))[0]
+            return reply.mid if reply.mid != "0004" else reply.data_ascii()[4:6]
+
+        await send(self.session, "0001")
+        self.assertEqual(await send(self.session, "0042"), "0005")
+        self.assertEqual(await send(first, "0001"), "0002")
+        self.assertEqual(await send(second, "0001"), "35")
+        self.assertEqual(await send(self.session, "0042"), "92")
+
+        await send(first, "0003")
+        self.assertEqual(await send(second, "0001"), "0002")
+        await self.state.unregister_session("a2")
+        self.assertEqual(await send(self.session, "0001"), "97")
+        self.assertEqual(await send(self.session, "0042"), "0005")
+        self.assertEqual(self.state.role_counts()["actor"], 1)
+
+        self.assertEqual(await send(first, "0001"), "0002")
+        await self.state.reset()
+        self.assertFalse(self.state.actor_active())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import socket
+import threading
+import unittest
+from pathlib import Path
+
+from app.config import Settings
+from app.dispatcher import OpenProtocolDispatcher
+from app.engine import ProtocolEngine
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.protocol import build_message, parse_stream_buffer
+from app.state import SimulatorState
+from app.stream import StreamHub
+from app.tcp_server import TcpService
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ProtocolEngineTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        root = Path(__file__).resolve().parent.parent
+        self.settings = Settings(
+            host="127.0.0.1",
+            classic_port=_free_port(),
+            actor_port=_free_port(),
+            viewer_port=_free_port(),
+        )
+        catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        profiles = ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf")
+        self.hub = StreamHub()
+        self.state = SimulatorState(
+            catalog=catalog,
+            profiles=profiles,
+            persistence=PersistenceStore(enabled=False, db_path=""),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+            stream=self.hub,
+        )
+        dispatcher = OpenProtocolDispatcher(self.settings, catalog, profiles, self.state)
+        self.service = TcpService(self.settings, self.state, dispatcher)
+        self.engine = ProtocolEngine(mode="thread")
+        await self.engine.start(self.service.start)
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.stop(self.service.stop)
+
+    async def test_protocol_replies_while_api_loop_is_blocked(self) -> None:
+        sub = self.hub.subscribe(topics=["traffic"])
+        # A blocking client on the API loop: this only completes if the
+        # protocol side runs on its own loop.
+        with socket.create_connection(("127.0.0.1", self.settings.classic_port), timeout=5) as client:
+            client.sendall(build_message(mid="0001", revision=7).raw)
+            buffer = bytearray()
+            while not (messages := parse_stream_buffer(buffer)):
+                buffer.extend(client.recv(4096))
+        self.assertEqual(messages[0].mid, "0002")
+
+        items, _ = await sub.next_batch()
+        self.assertIn("0001", [item["data"]["mid"] for item in items])
+
+    async def test_call_runs_on_engine_thread(self) -> None:
+        async def whoami() -> int:
+            return threading.get_ident()
+
+        self.assertNotEqual(await self.engine.call(whoami), threading.get_ident())
+        self.assertEqual(await self.engine.call(self.state.sessions), [])
+        with self.assertRaises(KeyError):
+            await self.engine.call(self.state.get_state_domain, "missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+import unittest
+from pathlib import Path
+from typing import Any
+
+from app.generator import TighteningGenerator
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.state import SimulatorState
+
+
+class GeneratorTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.batches: list[list[tuple[str, dict[str, Any]]]] = []
+
+        async def publish_many(batch: list[tuple[str, dict[str, Any]]]) -> dict[str, Any]:
+            self.batches.append(batch)
+            return {"pushed_messages": 0}
+
+        self.generator = TighteningGenerator(publish_many)
+
+    async def asyncTearDown(self) -> None:
+        await self.generator.stop()
+
+    async def _run(self, seed: int) -> list[dict[str, Any]]:
+        self.batches.clear()
+        await self.generator.start(
+            {
+                "seed": seed,
+                "tick_ms": 10,
+                "streams": [
+                    {
+                        "station_id": "02",
+                        "pset": "007",
+                        "rate_per_sec": 1000,
+                        "torque_nm": {"dist": "normal", "mean": 12.0, "std": 0.1},
+                        "nok_ratio": 0.1,
+                        "trace_points": 8,
+                    }
+                ],
+            }
+        )
+        await asyncio.sleep(0.05)
+        await self.generator.stop()
+        return [payload for batch in self.batches for _, payload in batch]
+
+    async def test_generates_seeded_batches(self) -> None:
+        first = await self._run(seed=3)
+        self.assertGreater(len(first), 20)
+        sample = first[0]
+        self.assertEqual(sample["station_id"], "02")
+        self.assertEqual(len(sample["trace_points"]), 8)
+        self.assertIsInstance(sample["ok"], bool)
+        status = self.generator.status()
+        self.assertFalse(status["running"])
+        self.assertEqual(status["cycles"], len(first))
+
+        second = await self._run(seed=3)
+        n = min(len(first), len(second))
+        self.assertEqual(first[:n], second[:n])
+
+    async def test_generated_trace_survives_mid_0900(self) -> None:
+        payload = (await self._run(seed=5))[-1]
+        self.assertTrue(all(isinstance(p, int) for p in payload["trace_points"]))
+        root = Path(__file__).resolve().parent.parent
+        state = SimulatorState(
+            catalog=MidCatalog.from_file(root / "data" / "mid_catalog.json"),
+            profiles=ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf"),
+            persistence=PersistenceStore(enabled=False, db_path=""),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+        )
+        [(_, rendered)] = await state.inject_events([("tightening", payload)], render_mids={("0061", 1)})
+
+        trace = state.codecs.decode("0900", 1, await state.render_data_for_mid("0900"))
+        coefficient = int(trace["data_fields"][0]["value"])
+        torque = [n / coefficient for n in struct.unpack(f">{trace['sample_count']}h", trace["samples"])]
+        self.assertEqual(len(torque), 8)
+        self.assertAlmostEqual(torque[-1], payload["torque_nm"], delta=0.1 * payload["torque_nm"])
+        # Hundredths of a newton-metre survive the 16-bit samples.
+        self.assertTrue(any(t != int(t) for t in torque))
+        result = state.codecs.decode("0061", 1, rendered[("0061", 1)])
+        self.assertEqual(result["pset_id"], 7)
+        self.assertEqual((await state.get_state_domain("results"))["history"][-1]["station_id"], "02")
+
+    async def test_rejects_invalid_stream(self) -> None:
+        with self.assertRaises(ValueError):
+            await self.generator.start({"streams": [{"rate_per_sec": 0}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import unittest
+
+from app.impairment import Impairment, attach, detach
+from app.protocol import build_message, parse_stream_buffer
+from app.types import SessionContext, SessionRole
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.writes: list[tuple[float, bytes]] = []
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.writes.append((asyncio.get_running_loop().time(), data))
+
+    async def drain(self) -> None:
+        return None
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _collect(into: list):
+    async def deliver(batch: list) -> None:
+        into.append(batch)
+
+    return deliver
+
+
+def _session(writer: _Writer) -> SessionContext:
+    return SessionContext(session_id="s1", role=SessionRole.CLASSIC, remote="127.0.0.1:1", writer=writer)
+
+
+class ImpairmentTests(unittest.IsolatedAsyncioTestCase):
+    def test_settings_are_validated(self) -> None:
+        self.assertFalse(Impairment(seed=3).active)
+        self.assertTrue(Impairment(drop_rate=0.1).active)
+        for raw in ({"drop_rate": 1.5}, {"latency_ms": -1}, {"direction": "sideways"}, {"loss": 0.1}):
+            with self.subTest(raw=raw), self.assertRaises(ValueError):
+                Impairment.from_dict(raw)
+
+    async def test_sent_frames_are_delayed_split_and_duplicated_in_order(self) -> None:
+        writer = _Writer()
+        session = _session(writer)
+        impairer = attach(session, Impairment(latency_ms=30, fragment_bytes=8, duplicate_rate=1.0, direction="tx"), "session")
+        self.assertIsNot(session.writer, writer)
+        first, second = build_message(mid="0061", data=b"first"), build_message(mid="0035", data=b"second")
+        started = asyncio.get_running_loop().time()
+        session.writer.write(first.raw + second.raw)
+        await session.writer.drain()
+        for _ in range(50):
+            if impairer.writer.queued_bytes == 0:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertGreaterEqual(writer.writes[0][0] - started, 0.029)
+        self.assertTrue(all(len(data) <= 8 for _, data in writer.writes))
+        frames = parse_stream_buffer(bytearray(b"".join(data for _, data in writer.writes)))
+        self.assertEqual([m.mid for m in frames], ["0061", "0061", "0035", "0035"])
+        self.assertEqual(impairer.counts["tx", "duplicated"], 2)
+
+        # Received frames are untouched by a tx-only impairment.
+        delivered: list = []
+        await impairer.inbound([first], _collect(delivered))
+        self.assertEqual(delivered, [[first]])
+        detach(session)
+        self.assertIs(session.writer, writer)
+        self.assertIsNone(session.impairment)
+
+    async def test_received_batches_stay_in_order_with_jitter(self) -> None:
+        impairer = attach(_session(_Writer()), Impairment(jitter_ms=4, direction="rx", seed=22), "session")
+        # The seed delays the first batch by about 3.7 ms and the next two by nothing.
+        reference = random.Random(22)
+        self.assertEqual([max(0.0, reference.uniform(-4, 4)) > 0 for _ in range(3)], [True, False, False])
+        delivered: list[int] = []
+        running = overlapped = 0
+
+        async def deliver(batch: list) -> None:
+            nonlocal running, overlapped
+            running += 1
+            overlapped = max(overlapped, running)
+            await asyncio.sleep(0.03)
+            delivered.extend(int(m.data) for m in batch)
+            running -= 1
+
+        def batch(n: int) -> list:
+            return [build_message(mid="0061", data=str(n).encode())]
+
+        await impairer.inbound(batch(0), deliver)
+        # The first batch is being handled when the undelayed ones come in.
+        await asyncio.sleep(0.01)
+        await impairer.inbound(batch(1), deliver)
+        await impairer.inbound(batch(2), deliver)
+        for _ in range(100):
+            if len(delivered) == 3:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(delivered, [0, 1, 2])
+        self.assertEqual(overlapped, 1)
+
+    async def test_faults_follow_the_seed_and_drop_the_connection(self) -> None:
+        def run() -> list:
+            impairer = attach(_session(_Writer()), Impairment(drop_rate=0.3, corrupt_rate=0.3, seed=7), "port")
+            return [impairer.faults("rx", b"00200001001         ") for _ in range(20)]
+
+        outcomes = run()
+        self.assertEqual(outcomes, run())
+        self.assertIn([], outcomes)
+        self.assertTrue(any(o and o[0] != b"00200001001         " for o in outcomes))
+
+        # Every received frame gets a bit flipped, some in the header; none of them ends the session.
+        impairer = attach(_session(_Writer()), Impairment(corrupt_rate=1.0, direction="rx", seed=3), "session")
+        delivered = []
+        for _ in range(200):
+            await impairer.inbound([build_message(mid="0018", data=b"001")], _collect(delivered))
+        self.assertEqual(impairer.counts["rx", "corrupted"], 200)
+        self.assertLess(sum(len(batch) for batch in delivered), 200)
+        self.assertFalse(impairer.session.writer.is_closing())
+
+        writer = _Writer()
+        session = _session(writer)
+        impairer = attach(session, Impairment(disconnect_rate=1.0), "session")
+        delivered = []
+        await impairer.inbound([build_message(mid="9999")], _collect(delivered))
+        self.assertEqual(delivered, [])
+        self.assertTrue(writer.closed)
+        self.assertEqual(impairer.counts["rx", "disconnected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import unittest
+
+from app.link_window import LinkLost, LinkWindow
+from app.linking import LinkedMessage, LinkedPayload
+from app.protocol import build_message
+from app.types import AckMode, SessionContext, SessionRole
+
+
+def _session() -> SessionContext:
+    return SessionContext(session_id="s1", role=SessionRole.CLASSIC, remote="127.0.0.1:1", ack_mode=AckMode.LINK_LEVEL)
+
+
+class LinkWindowTests(unittest.TestCase):
+    def test_frames_queue_behind_the_window_and_ack_releases_them(self) -> None:
+        session = _session()
+        window = LinkWindow(session, size=2)
+        messages = [build_message(mid="0061", data=str(n).encode()) for n in range(4)]
+        sent = [window.submit(msg, now=0.0) for msg in messages]
+        self.assertEqual([f.header.sequence_int for f in sent[:2]], [1, 2])
+        self.assertEqual(sent[2:], [None, None])
+        self.assertEqual((window.in_flight, window.queued), (2, 2))
+        self.assertEqual(sent[0].raw, build_message(mid="0061", data=b"0", sequence_number=1).raw)
+
+        # A stale ACK changes nothing; a 9997 expecting 3 acknowledges both frames.
+        self.assertEqual(window.ack(1, now=0.1), ([], None))
+        released, rtt = window.ack(3, now=0.5)
+        self.assertEqual([(f.header.sequence_int, f.data) for f in released], [(3, b"2"), (4, b"3")])
+        self.assertAlmostEqual(rtt, 0.5)
+        self.assertEqual((window.acked, window.srtt), (2, 0.5))
+        self.assertEqual(session.next_tx_seq, 5)
+
+    def test_retransmits_stored_frames_until_the_peer_is_lost(self) -> None:
+        window = LinkWindow(_session(), ack_timeout=2.0, max_retransmits=2)
+        frame = window.submit(build_message(mid="0061"), now=0.0)
+        self.assertEqual(window.expired(now=1.9), [])
+        self.assertIs(window.expired(now=2.0)[0], frame)
+        self.assertEqual(window.deadline(), 4.0)
+        self.assertIs(window.nack(now=3.0)[0], frame)
+        with self.assertRaises(LinkLost):
+            window.expired(now=5.0)
+
+        # Karn's rule: no round-trip sample from a re-sent frame.
+        window = LinkWindow(_session())
+        window.submit(build_message(mid="0061"), now=0.0)
+        window.nack(now=1.0)
+        self.assertEqual(window.ack(2, now=1.5), ([], None))
+        self.assertEqual(window.snapshot()["retransmits"], 1)
+
+    def test_linked_parts_are_pulled_as_the_window_opens(self) -> None:
+        session = _session()
+        window = LinkWindow(session, queue_limit=2)
+        payload = LinkedPayload([9000, 9000, 9000], [b"a" * 9000, b"b" * 9000, b"c" * 9000])
+        first = window.submit_parts(LinkedMessage("0061", 1, payload).parts(), now=0.0)
+        self.assertEqual([(f.header.message_part_number, f.header.sequence_int) for f in first], [("1", 1)])
+        self.assertEqual(window.queued, 1)
+        window.submit(build_message(mid="9999"), now=0.0)
+        with self.assertRaises(LinkLost):
+            window.submit(build_message(mid="9999"), now=0.0)
+
+        numbers = []
+        for expected in range(2, 6):
+            released, _ = window.ack(expected, now=1.0)
+            numbers.extend((f.mid, f.header.message_part_number) for f in released)
+        self.assertEqual(numbers, [("0061", "2"), ("0061", "3"), ("9999", " ")])
+        self.assertEqual((window.in_flight, window.queued), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
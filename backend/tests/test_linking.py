@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import unittest
+
+from app.linking import MAX_PART_DATA, LinkError, LinkedMessage, LinkedPayload, Reassembler, part_sizes, segment
+from app.payloads import Field, PayloadCodec, Samples
+from app.protocol import build_message, parse_stream_buffer
+
+
+class LinkingTests(unittest.TestCase):
+    def test_parts_break_between_pieces_and_reassemble(self) -> None:
+        self.assertEqual(part_sizes([6000, 3000, 2000]), [9000, 2000])
+        self.assertEqual(part_sizes([5, 25000]), [MAX_PART_DATA, MAX_PART_DATA, 25005 - 2 * MAX_PART_DATA])
+        self.assertEqual(part_sizes([]), [0])
+
+        codec = PayloadCodec(
+            "0900", 1, (Field(None, "count", 5, "num"), Field(None, "separator", 1, default="\x00"), Field(None, "samples", 0, "bin"))
+        )
+        points = [(n % 700) - 350 for n in range(30000)]
+        sizes, pieces = codec.encode_pieces({"count": len(points), "samples": Samples(points)})
+        parts = list(LinkedMessage("0900", 1, LinkedPayload(sizes, pieces), append_nul=False, binary=True).parts())
+        self.assertEqual(len(parts), 7)
+        self.assertEqual([(p.header.message_parts, p.header.message_part_number) for p in parts], [("7", str(n)) for n in range(1, 8)])
+        self.assertTrue(all(p.header.length <= 9999 and len(p.data) % 2 == 0 for p in parts[1:]))
+
+        frames = parse_stream_buffer(bytearray(b"".join(p.raw for p in parts)))
+        reassembler = Reassembler()
+        self.assertEqual([reassembler.feed(f) for f in frames[:-1]], [None] * 6)
+        self.assertEqual(reassembler.buffered, sum(len(p.data) for p in parts[:-1]))
+        whole = reassembler.feed(frames[-1])
+        self.assertEqual(whole.data, codec.encode({"count": len(points), "samples": Samples(points)}))
+        self.assertFalse(whole.header.linked_message)
+        self.assertEqual((len(reassembler), reassembler.buffered), (0, 0))
+
+    def test_segment_checks_part_count_and_declared_sizes(self) -> None:
+        with self.assertRaises(LinkError):
+            list(segment("0061", LinkedPayload([MAX_PART_DATA] * 10, [b"x" * MAX_PART_DATA] * 10)))
+        with self.assertRaises(LinkError):
+            list(segment("0061", LinkedPayload([MAX_PART_DATA, 10], [b"x" * MAX_PART_DATA])))
+
+    def test_reassembler_rejects_and_expires_broken_messages(self) -> None:
+        def part(number: int, parts: int = 3, data: bytes = b"abcd", mid: str = "0061"):
+            return build_message(mid=mid, data=data, message_parts=str(parts), message_part_number=str(number))
+
+        reassembler = Reassembler(limit=10, timeout=5.0)
+        reassembler.feed(part(1), now=0.0)
+        with self.assertRaises(LinkError):
+            reassembler.feed(part(3), now=1.0)
+        self.assertEqual(len(reassembler), 0)
+        with self.assertRaises(LinkError):
+            reassembler.feed(part(4), now=1.0)
+
+        reassembler.feed(part(1), now=1.0)
+        reassembler.feed(part(2), now=1.0)
+        with self.assertRaises(LinkError):
+            reassembler.feed(part(1, mid="0015"), now=1.0)
+        self.assertEqual(reassembler.buffered, 8)
+
+        self.assertEqual(reassembler.expire(now=5.5), [])
+        self.assertEqual(reassembler.expire(now=6.5), ["0061"])
+        self.assertEqual((len(reassembler), reassembler.buffered), (0, 0))
+        self.assertEqual(reassembler.feed(part(1, parts=1)).data, b"abcd")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import time
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+from app.config import Settings
+from app.dispatcher import OpenProtocolDispatcher
+from app.loadgen import LatencyRecorder, LoadClient, LoadConfig, _parse_mix, run_load
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.state import SimulatorState
+from app.tcp_server import TcpService
+from app.types import SessionRole
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoadgenTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        root = Path(__file__).resolve().parent.parent
+        settings = replace(
+            Settings(), host="127.0.0.1", classic_port=_free_port(), actor_port=_free_port(), viewer_port=_free_port()
+        )
+        catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        profiles = ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf")
+        state = SimulatorState(
+            catalog=catalog,
+            profiles=profiles,
+            persistence=PersistenceStore(enabled=False, db_path=""),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+        )
+        self.service = TcpService(settings, state, OpenProtocolDispatcher(settings, catalog, profiles, state))
+        await self.service.start()
+        self.addAsyncCleanup(self.service.stop)
+        self.config = LoadConfig(classic_port=settings.classic_port, actor_port=settings.actor_port)
+
+    def test_mix_pads_mids_and_defaults_weights(self) -> None:
+        self.assertEqual(_parse_mix("10:4, 9999 ,0030:2"), [("0010", 4), ("9999", 1), ("0030", 2)])
+
+    def test_latency_summary_percentiles_and_histogram(self) -> None:
+        self.assertEqual(LatencyRecorder().summary(), {"count": 0})
+        recorder = LatencyRecorder()
+        for ms in range(1, 101):
+            recorder.add(ms / 1000.0)
+        summary = recorder.summary()
+        self.assertEqual((summary["count"], summary["mean_ms"], summary["max_ms"]), (100, 50.5, 100.0))
+        self.assertEqual((summary["p50_ms"], summary["p90_ms"], summary["p99_ms"]), (51.0, 91.0, 100.0))
+        self.assertEqual(sum(summary["histogram_us"].values()), 100)
+        self.assertEqual(summary["histogram_us"]["<1024"], 1)
+
+    async def test_short_run_against_the_simulator(self) -> None:
+        config = replace(self.config, classic=2, actor=1, duration_sec=0.3, rate_per_session=20.0, mix=[("0010", 1), ("9999", 1)])
+        report = await run_load(config)
+        self.assertEqual(report["sessions"]["connected"], 3)
+        self.assertGreater(report["requests_sent"], 0)
+        self.assertEqual(report["replies_received"], report["requests_sent"])
+        self.assertEqual(report["reply_latency"]["count"], report["replies_received"])
+        self.assertEqual(report["error_codes"], {})
+
+    async def test_push_latency_follows_mid_0061_pushes_only(self) -> None:
+        client = LoadClient(0, SessionRole.CLASSIC, self.config.classic_port, replace(self.config, subscribe=["0060", "0070"]))
+        await client.connect()
+        self.addAsyncCleanup(client.close)
+        client.event_times = []
+        receiver = asyncio.create_task(client._receive_loop())
+        self.addCleanup(receiver.cancel)
+        # An alarm push (MID 0071) comes first; it must not use up the tightening's event time.
+        await self.service.publish_event("alarm", {"code": "E101"})
+        client.event_times.append(time.perf_counter())
+        await self.service.publish_event("tightening", {"ok": True})
+        for _ in range(100):
+            if client.pushes >= 2:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual((client.pushes, client.event_pushes), (2, 1))
+        self.assertEqual(client.push_latency.summary()["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import unittest
+
+from app.metrics import MetricFamily, ProtocolMetrics, render_exposition
+from app.types import SessionRole
+
+
+class MetricsTests(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        family = MetricFamily("op_seconds", "histogram", "Op time.", ("kind",), (0.1, 1.0))
+        child = family.labels("a")
+        self.assertIs(family.labels("a"), child)
+        for value in (0.05, 0.1, 0.5, 2.0):
+            child.observe(value)
+        text = render_exposition([({"controller": "st01"}, [family])])
+        self.assertIn("# TYPE op_seconds histogram", text)
+        self.assertIn('op_seconds_bucket{controller="st01",kind="a",le="0.1"} 2', text)
+        self.assertIn('op_seconds_bucket{controller="st01",kind="a",le="1"} 3', text)
+        self.assertIn('op_seconds_bucket{controller="st01",kind="a",le="+Inf"} 4', text)
+        self.assertIn('op_seconds_count{controller="st01",kind="a"} 4', text)
+        with self.assertRaises(ValueError):
+            family.labels("a", "b")
+
+    def test_controllers_merge_under_one_family_header(self) -> None:
+        first, second = ProtocolMetrics(), ProtocolMetrics()
+        first.count_frame("rx", SessionRole.CLASSIC, "0018")
+        first.count_frame("rx", SessionRole.CLASSIC, "0018")
+        second.count_frame("tx", SessionRole.ACTOR, "0005")
+        first.count_error(b"001892")
+        text = render_exposition([({"controller": "a"}, first.families()), ({"controller": "b"}, second.families())])
+        self.assertEqual(text.count("# TYPE opsim_frames_total counter"), 1)
+        self.assertIn('opsim_frames_total{controller="a",direction="rx",role="classic",mid="0018"} 2', text)
+        self.assertIn('opsim_frames_total{controller="b",direction="tx",role="actor",mid="0005"} 1', text)
+        self.assertIn('opsim_mid_errors_total{controller="a",code="92"} 1', text)
+
+    def test_deltas_move_counts_without_unbinding_children(self) -> None:
+        worker, owner = ProtocolMetrics(), ProtocolMetrics()
+        owner.nack_rx.inc(2)
+        worker.count_frame("rx", SessionRole.CLASSIC, "9999")
+        worker.nack_rx.inc()
+        worker.link_ack_rtt.observe(0.003)
+        worker.sessions.labels("classic").set(4)
+        owner.add_deltas(worker.take_deltas())
+        worker.nack_rx.inc()
+        owner.add_deltas(worker.take_deltas())
+
+        self.assertEqual(owner.nack_rx.value, 4)
+        self.assertEqual(owner.frames.labels("rx", "classic", "9999").value, 1)
+        self.assertEqual((owner.link_ack_rtt.count, owner.link_ack_rtt.counts[3]), (1, 1))
+        self.assertEqual(owner.sessions.children, {})
+        self.assertEqual((worker.nack_rx.value, worker.link_ack_rtt.count), (0, 0))
+        self.assertEqual(worker.take_deltas(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+
+from app.mid_catalog import MidCatalog
+from app.payload_layouts import PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES
+from app.payloads import CodecRegistry, Field, PayloadCodec
+
+
+class PayloadCodecTests(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(__file__).resolve().parent.parent
+        self.catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        self.codecs = CodecRegistry(self.catalog, PAYLOAD_LAYOUTS, SCHEMA_FIELD_NAMES)
+
+    def test_every_layout_round_trips_its_defaults(self) -> None:
+        for mid in self.catalog.mids():
+            for revision in self.catalog.get(mid).supported_revisions:
+                codec = self.codecs.get(mid, revision)
+                data = codec.encode({})
+                self.assertEqual(codec.encode(codec.decode(data)), data, f"MID {mid} rev {revision}")
+
+    def test_0002_revision_7_carries_spec_fields_only(self) -> None:
+        data = self.codecs.encode("0002", 7, {}).decode("ascii")
+        self.assertTrue(data.startswith("010001020103OpenProtocolSim          04ACT05"))
+        self.assertTrue(data.endswith("15Simulator Station        161170"))
+        self.assertNotIn("18", data[data.index("17") + 3 :])
+        self.assertEqual(self.codecs.revision_for("0002", 9), 7)
+        self.assertEqual(self.codecs.revision_for("0061", 7), 7)
+
+    def test_fields_decode_by_position_and_parameter_id(self) -> None:
+        self.assertEqual(self.codecs.decode("0046", 1, b"0102"), {"primary_tool": 2})
+        self.assertEqual(self.codecs.decode("0038", 2, b"0012"), {"job_id": 12})
+        self.assertEqual(self.codecs.decode("0008", 1, b"0015002"), {"mid": 15, "revision": 2})
+        self.assertEqual(self.codecs.decode("0018", 1, b"x1"), {"pset_id": None})
+
+    def test_lists_scaled_numbers_and_binary_tail(self) -> None:
+        codec = PayloadCodec(
+            "9000",
+            1,
+            (
+                Field("01", "torque", 6, "num", scale=100),
+                Field("02", "ids", 2, "list", items=(Field(None, "id", 3, "num"),)),
+                Field(None, "samples", 0, "bin"),
+            ),
+        )
+        data = codec.encode({"torque": 12.34, "ids": [1, 22], "samples": b"\x00\xff"})
+        self.assertEqual(data, b"010012340202001022\x00\xff")
+        self.assertEqual(codec.decode(data), {"torque": 12.34, "ids": [1, 22], "samples": b"\x00\xff"})
+        with self.assertRaises(ValueError):
+            PayloadCodec("9000", 1, (Field(None, "samples", 0, "bin"), Field(None, "after", 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
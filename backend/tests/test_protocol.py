@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import unittest
 
-from app.protocol import build_message, next_sequence, parse_stream_buffer
+from app.protocol import build_message, next_sequence, parse_stream_buffer, split_frames
 
 
 class ProtocolTests(unittest.TestCase):
@@ -23,6 +23,15 @@ class ProtocolTests(unittest.TestCase):
         self.assertEqual(len(parsed), 1)
         self.assertEqual(parsed[0].mid, "0003")
 
+    def test_split_frames_leaves_partial_frame(self) -> None:
+        first = build_message(mid="0001", revision=7).raw
+        second = build_message(mid="9999").raw
+        buffer = bytearray(b"\xff" + first + second[:10])
+        messages, consumed = split_frames(buffer, 0, len(buffer))
+        self.assertEqual([m.mid for m in messages], ["0001"])
+        self.assertEqual(consumed, 1 + len(first))
+        self.assertEqual(len(buffer), 1 + len(first) + 10)
+
     def test_next_sequence_wrap(self) -> None:
         self.assertEqual(next_sequence(1), 2)
         self.assertEqual(next_sequence(99), 1)
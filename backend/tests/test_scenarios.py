@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import Any
+
+from app import clock
+from app.scenarios import RESULTS_TAIL, ScenarioRunner, compile_scenario
+from app.types import ScenarioDefinition
+
+
+class ScenarioRunnerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.published: list[tuple[str, dict[str, Any]]] = []
+
+        async def publish(event: str, payload: dict[str, Any]) -> dict[str, Any]:
+            self.published.append((event, payload))
+            return {"event_type": event, "pushed_messages": 1}
+
+        self.runner = ScenarioRunner(
+            {
+                "short": ScenarioDefinition(
+                    name="short",
+                    steps=[{"delay_sec": 0.0, "event": "tightening", "payload": {"ok": True}}] * 3,
+                ),
+                "long": ScenarioDefinition(name="long", steps=[{"delay_sec": 10.0, "event": "alarm"}]),
+            },
+            publish,
+        )
+
+    async def test_job_runs_in_background_to_completion(self) -> None:
+        job = self.runner.start("short", {"torque_nm": 5.0})
+        self.assertEqual(job.status, "pending")
+        await self.runner.wait(job)
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.steps_done, 3)
+        self.assertEqual(job.pushed_messages, 3)
+        self.assertEqual(self.published[0], ("tightening", {"ok": True, "torque_nm": 5.0}))
+
+    async def test_cancel_running_job(self) -> None:
+        job = self.runner.start("long")
+        await asyncio.sleep(0)
+        self.runner.cancel(job.job_id)
+        await self.runner.wait(job)
+        self.assertEqual(job.status, "cancelled")
+        self.assertEqual(job.steps_done, 0)
+        self.assertEqual(self.published, [])
+
+    async def test_cancel_before_the_job_starts(self) -> None:
+        job = self.runner.start("short")
+        self.runner.cancel(job.job_id)
+        await self.runner.wait(job)
+        self.assertEqual((job.status, job.steps_done, self.published), ("cancelled", 0, []))
+        self.assertTrue(job.finished)
+        self.assertIsNotNone(job.finished_at)
+
+    async def test_results_keep_only_the_latest(self) -> None:
+        self.runner.scenarios["many"] = definition = ScenarioDefinition(
+            name="many", steps=[{"event": "tightening", "rate_per_sec": 1000.0, "count": RESULTS_TAIL + 50}]
+        )
+        self.runner.timelines["many"] = compile_scenario(definition)
+        job = self.runner.start("many")
+        await self.runner.wait(job)
+        self.assertEqual((job.steps_done, job.pushed_messages), (RESULTS_TAIL + 50, RESULTS_TAIL + 50))
+        self.assertEqual(len(job.results), RESULTS_TAIL)
+
+    async def test_delays_run_on_the_virtual_clock(self) -> None:
+        virtual = clock.VirtualClock(start=0.0)
+        clock.install(virtual)
+        self.addCleanup(clock.install, clock.Clock())
+        job = self.runner.start("long")
+        await asyncio.sleep(0)
+        virtual.advance(10.0)
+        await asyncio.wait_for(self.runner.wait(job), 1)
+        self.assertEqual((job.status, self.published), ("completed", [("alarm", {})]))
+        self.assertEqual((job.started_at.year, (job.finished_at - job.started_at).seconds), (1970, 10))
+
+    async def test_unknown_scenario(self) -> None:
+        with self.assertRaises(KeyError):
+            self.runner.start("missing")
+
+
+class ScenarioCompileTests(unittest.TestCase):
+    def test_repeat_and_rate_blocks(self) -> None:
+        definition = ScenarioDefinition(
+            name="load",
+            seed=7,
+            steps=[
+                {"repeat": 2, "steps": [{"delay_sec": 1.0, "event": "alarm"}]},
+                {
+                    "event": "tightening",
+                    "rate_per_sec": 4,
+                    "duration_sec": 10,
+                    "ramp_up_sec": 2,
+                    "ramp_down_sec": 2,
+                    "params": {"torque_nm": {"dist": "normal", "mean": 12.0, "std": 0.5}, "ok": {"dist": "bernoulli", "p": 0.5}},
+                },
+            ],
+        )
+        timeline = compile_scenario(definition)
+        # 2 alarms + rate 4/s over 10 s with 2 s linear ramps on each side = 32 tightenings.
+        self.assertEqual(len(timeline), 34)
+        self.assertEqual(list(timeline.offsets[:3]), [1.0, 2.0, 2.0])
+        self.assertLess(timeline.duration_sec, 12.0)
+        self.assertEqual(timeline.event_at(0), ("alarm", {}))
+        event, payload = timeline.event_at(5)
+        self.assertEqual(event, "tightening")
+        self.assertIsInstance(payload["ok"], bool)
+        self.assertEqual(compile_scenario(definition).event_at(5), (event, payload))
+
+    def test_rate_blocks_emit_exactly_their_count(self) -> None:
+        for node, expected in (
+            ({"rate_per_sec": 0.3, "count": 7}, 7),
+            ({"rate_per_sec": 3, "count": 10, "ramp_up_sec": 1, "ramp_down_sec": 0.5}, 10),
+            ({"interval_sec": 0.1, "duration_sec": 0.3}, 3),
+            ({"rate_per_sec": 4, "duration_sec": 2.6}, 10),
+        ):
+            with self.subTest(node=node):
+                timeline = compile_scenario(ScenarioDefinition(name="rate", steps=[{"event": "tightening", **node}]))
+                self.assertEqual(len(timeline), expected)
+                self.assertEqual(list(timeline.offsets), sorted(timeline.offsets))
+
+    def test_parallel_branches_are_merged_by_offset(self) -> None:
+        definition = ScenarioDefinition(
+            name="stations",
+            steps=[
+                {
+                    "parallel": [
+                        [{"event": "tightening", "interval_sec": 0.2, "count": 3, "payload": {"station_id": "01"}}],
+                        [{"delay_sec": 0.1, "event": "tightening", "interval_sec": 0.2, "count": 3, "payload": {"station_id": "02"}}],
+                    ]
+                }
+            ],
+        )
+        timeline = compile_scenario(definition)
+        stations = [timeline.event_at(i)[1]["station_id"] for i in range(len(timeline))]
+        self.assertEqual(stations, ["01", "02", "01", "02", "01", "02"])
+
+    def test_rejects_unknown_step(self) -> None:
+        with self.assertRaises(ValueError):
+            compile_scenario(ScenarioDefinition(name="bad", steps=[{"delay_sec": 1}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
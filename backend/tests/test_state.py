@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.latency import MessageTrace
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.protocol import build_message
+from app.state import SimulatorState
+from app.types import SessionContext, SessionRole
+
+
+class StateTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        root = Path(__file__).resolve().parent.parent
+        catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        profiles = ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf")
+        self.state = SimulatorState(
+            catalog=catalog,
+            profiles=profiles,
+            persistence=PersistenceStore(enabled=False, db_path="/tmp/openprotocol_sim_test.db"),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+        )
+        self.session = SessionContext(session_id="s1", role=SessionRole.CLASSIC, remote="127.0.0.1:9999")
+
+    async def test_traffic_since_cursor(self) -> None:
+        for mid in ("0001", "0002", "9999"):
+            await self.state.record_traffic(self.session, "rx", build_message(mid=mid))
+        page = await self.state.traffic_since(0)
+        self.assertEqual([t["seq"] for t in page["items"]], [1, 2, 3])
+        self.assertEqual(page["cursor"], 3)
+
+        await self.state.record_traffic(self.session, "tx", build_message(mid="0005"))
+        page = await self.state.traffic_since(page["cursor"])
+        self.assertEqual([t["mid"] for t in page["items"]], ["0005"])
+        self.assertEqual(page["cursor"], 4)
+
+        page = await self.state.traffic_since(4)
+        self.assertEqual(page["items"], [])
+        self.assertEqual(page["cursor"], 4)
+
+    async def test_traffic_since_pages_and_filters(self) -> None:
+        for _ in range(5):
+            await self.state.record_traffic(self.session, "rx", build_message(mid="9999"))
+            await self.state.record_traffic(self.session, "tx", build_message(mid="0005"))
+        page = await self.state.traffic_since(0, limit=2, mid="5")
+        self.assertEqual([t["seq"] for t in page["items"]], [2, 4])
+        self.assertEqual(page["cursor"], 4)
+        page = await self.state.traffic_since(page["cursor"], limit=10, mid="0005")
+        self.assertEqual([t["seq"] for t in page["items"]], [6, 8, 10])
+        self.assertEqual(page["cursor"], 10)
+
+    async def test_inject_events_renders_per_event_snapshot(self) -> None:
+        applied = await self.state.inject_events(
+            [("tightening", {"ok": True}), ("tightening", {"ok": False}), ("alarm", {"code": "0101"})],
+            render_mids={("0061", 1), ("0071", 1)},
+        )
+        self.assertEqual(len(applied), 3)
+        first = self.state.codecs.decode("0061", 1, applied[0][1][("0061", 1)])
+        second = self.state.codecs.decode("0061", 1, applied[1][1][("0061", 1)])
+        self.assertEqual((first["tightening_status"], second["tightening_status"]), (1, 0))
+        self.assertEqual(second["tightening_id"], first["tightening_id"] + 1)
+        self.assertEqual(set(applied[2][1]), {("0071", 1)})
+        results = await self.state.get_state_domain("results")
+        self.assertEqual(results["last_tightening_id"], 3)
+
+    async def test_catalog_revisions_render_state_values(self) -> None:
+        await self.state.inject_events([("tightening", {"ok": True})])
+        # MID 0101 has no in-tree layout; MID 0061 rev 2 only a catalog one next to the in-tree rev 1.
+        multi = self.state.codecs.decode("0101", 1, await self.state.render_data_for_mid("0101", 1))
+        self.assertEqual((multi["vin"], multi["batch_size"]), ("SIMVIN00000000001", 1))
+        self.assertEqual(len(multi["pset_last_change"]), 19)
+        self.assertEqual(self.state.codecs.revision_for("0061", 2), 2)
+        result = self.state.codecs.decode("0061", 2, await self.state.render_data_for_mid("0061", 2))
+        last_id = (await self.state.get_state_domain("results"))["last_tightening_id"]
+        self.assertEqual((result["vin"], result["tightening_id"]), ("SIMVIN00000000001", last_id))
+        self.assertEqual((result["controller_name"], result["cell_id"]), ("OpenProtocolSim", 1))
+        self.assertEqual(len(result["timestamp"]), 19)
+
+    async def test_idle_session_allocates_subscriptions_lazily(self) -> None:
+        other = SessionContext(session_id="s2", role=SessionRole.CLASSIC, remote="127.0.0.1:9998")
+        self.assertIs(self.session.subscriptions, other.subscriptions)
+        await self.state.add_subscription(self.session, "0060")
+        self.assertEqual(self.session.subscriptions, {"0060": 1})
+        self.assertEqual(other.subscriptions, {})
+        await self.state.remove_subscription(self.session, "0060")
+        await self.state.remove_subscription(other, "0060")
+        self.assertFalse(self.session.subscriptions)
+        self.assertGreaterEqual(self.session.idle_seconds(), 0.0)
+        await self.state.register_session(self.session)
+        sessions = await self.state.sessions()
+        self.assertEqual(sessions[0]["session_id"], "s1")
+
+    async def test_persisted_traffic_keeps_reply_and_timings(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = f"{tmp}/sim.db"
+            # A traffic table from before records carried reply links and stamps.
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "CREATE TABLE traffic (id INTEGER PRIMARY KEY, timestamp DATETIME NOT NULL, session_id VARCHAR(128) NOT NULL,"
+                    " role VARCHAR(32) NOT NULL, direction VARCHAR(32) NOT NULL, mid VARCHAR(4) NOT NULL, revision INTEGER NOT NULL,"
+                    " length INTEGER NOT NULL, raw_ascii TEXT NOT NULL, decoded_data TEXT NOT NULL)"
+                )
+            self.state.persistence = PersistenceStore(enabled=True, db_path=db_path)
+            trace = MessageTrace(read=1.0, framed=1.0005, enqueued=1.002)
+            await self.state.record_traffic_batch(self.session, "rx", [build_message(mid="0018", data=b"001")], traces=[trace])
+            await self.state.record_traffic_batch(self.session, "tx", [build_message(mid="0005", data=b"0018")], reply_to=1)
+            with sqlite3.connect(db_path) as conn:
+                rows = conn.execute("SELECT mid, role, reply_to, timings_ms FROM traffic ORDER BY id").fetchall()
+        self.assertEqual([row[:3] for row in rows], [("0018", "classic", None), ("0005", "classic", 1)])
+        self.assertEqual(json.loads(rows[0][3])["enqueued"], 2.0)
+        self.assertIsNone(rows[1][3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import unittest
+
+from app.stream import StreamHub
+
+
+class StreamHubTests(unittest.IsolatedAsyncioTestCase):
+    async def test_filters_and_bounded_buffer(self) -> None:
+        hub = StreamHub(buffer_size=2)
+        sub = hub.subscribe(topics=["traffic"], mids=["61"])
+        for seq in range(1, 5):
+            hub.publish_traffic({"seq": seq, "mid": "0061", "session_id": "s1"})
+        hub.publish_traffic({"seq": 5, "mid": "9999", "session_id": "s1"})
+        hub.publish_session("connected", {"session_id": "s1"})
+        items, dropped = await sub.next_batch()
+        self.assertEqual([i["data"]["seq"] for i in items], [3, 4])
+        self.assertEqual(dropped, 2)
+
+    async def test_state_notifications_are_conflated(self) -> None:
+        hub = StreamHub()
+        sub = hub.subscribe(topics=["state"], domains=["results", "io"])
+        hub.publish_state(["results"], "t1")
+        hub.publish_state(["results", "alarms"], "t2")
+        hub.publish_state(["io"], "t3")
+        items, _ = await sub.next_batch()
+        self.assertEqual([(i["domain"], i["updated_at"]) for i in items], [("results", "t2"), ("io", "t3")])
+        hub.unsubscribe(sub)
+        self.assertFalse(hub.active)
+
+    async def test_subscribing_during_a_publish_does_not_disturb_it(self) -> None:
+        hub = StreamHub()
+        first = hub.subscribe(topics=["traffic"])
+        late: list = []
+
+        class _Joiner:
+            def wants(self, *args, **kwargs) -> bool:
+                late.append(hub.subscribe(topics=["traffic"]))
+                hub.unsubscribe(first)
+                return False
+
+        hub._subscribers = (_Joiner(), *hub._subscribers)
+        hub.publish_traffic({"seq": 1, "mid": "0061", "session_id": "s1"})
+        items, _ = await first.next_batch()
+        self.assertEqual([i["data"]["seq"] for i in items], [1])
+        self.assertEqual(late[0].pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
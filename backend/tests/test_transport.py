@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+from app import clock
+from app.config import Settings
+from app.dispatcher import OpenProtocolDispatcher
+from app.impairment import Impairment
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.protocol import build_message, parse_stream_buffer
+from app.state import SimulatorState
+from app.tcp_server import TcpService
+from app.types import SessionRole
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TransportTests(unittest.IsolatedAsyncioTestCase):
+    async def _service(self, transport: str, **overrides) -> tuple[TcpService, SimulatorState]:
+        root = Path(__file__).resolve().parent.parent
+        settings = replace(
+            Settings(),
+            host="127.0.0.1",
+            classic_port=_free_port(),
+            actor_port=_free_port(),
+            viewer_port=_free_port(),
+            sim_transport=transport,
+            sim_read_buffer=1024,
+            **overrides,
+        )
+        catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        profiles = ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf")
+        state = SimulatorState(
+            catalog=catalog,
+            profiles=profiles,
+            persistence=PersistenceStore(enabled=False, db_path=""),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+        )
+        service = TcpService(settings, state, OpenProtocolDispatcher(settings, catalog, profiles, state))
+        await service.start()
+        self.addAsyncCleanup(service.stop)
+        return service, state
+
+    async def test_both_transports_frame_split_and_pipelined_input(self) -> None:
+        for transport in ("stream", "protocol"):
+            with self.subTest(transport=transport):
+                service, state = await self._service(transport)
+                reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+                stream = b"\xffNOISE" + build_message(mid="0001", revision=7).raw + build_message(mid="9999").raw * 200
+                # Dribble the bytes in uneven chunks so frames straddle reads.
+                for i in range(0, len(stream), 777):
+                    writer.write(stream[i : i + 777])
+                    await writer.drain()
+
+                buffer = bytearray()
+                replies = []
+                while len(replies) < 201:
+                    buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                    replies.extend(parse_stream_buffer(buffer))
+                self.assertEqual(replies[0].mid, "0002")
+                self.assertEqual({m.mid for m in replies[1:]}, {"9999"})
+                self.assertEqual(len(await state.sessions()), 1)
+
+                writer.close()
+                for _ in range(50):
+                    if not await state.sessions():
+                        break
+                    await asyncio.sleep(0.02)
+                self.assertEqual(await state.sessions(), [])
+
+    async def test_keepalive_fast_path_and_capture_policy(self) -> None:
+        for capture in ("all", "none"):
+            with self.subTest(capture=capture):
+                service, state = await self._service("protocol", sim_capture_keepalive=capture)
+                reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+                buffer = bytearray()
+
+                async def exchange(*frames: bytes) -> list:
+                    writer.write(b"".join(frames))
+                    while True:
+                        buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                        replies = parse_stream_buffer(buffer)
+                        if replies:
+                            return replies
+
+                # Before MID 0001 keepalives still take the full path and are rejected.
+                reply = await exchange(build_message(mid="9999").raw)
+                self.assertEqual((reply[0].mid, reply[0].data[4:6]), ("0004", b"97"))
+                self.assertEqual((await exchange(build_message(mid="0001", revision=7).raw))[0].mid, "0002")
+                cursor = (await state.traffic_since(0))["cursor"]
+
+                # Link ACKs are consumed silently; the keepalive is mirrored.
+                keepalive = build_message(mid="9999").raw
+                replies = await exchange(build_message(mid="9997", data=b"0002", sequence_number=1).raw, keepalive)
+                self.assertEqual([m.raw for m in replies], [keepalive])
+
+                page = await state.traffic_since(cursor)
+                expected = [("rx", "9997"), ("rx", "9999"), ("tx", "9999")] if capture == "all" else []
+                self.assertEqual([(t["direction"], t["mid"]) for t in page["items"]], expected)
+                writer.close()
+
+    async def test_latency_trace_links_replies_to_requests(self) -> None:
+        for transport in ("stream", "protocol"):
+            with self.subTest(transport=transport):
+                service, state = await self._service(transport, sim_trace_latency=True)
+                reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+                writer.write(build_message(mid="0001", revision=7).raw + build_message(mid="0010").raw + build_message(mid="9999").raw)
+                buffer = bytearray()
+                replies = []
+                while len(replies) < 3:
+                    buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                    replies.extend(parse_stream_buffer(buffer))
+
+                items = (await state.traffic_since(0))["items"]
+                request = next(t for t in items if t["direction"] == "rx" and t["mid"] == "0010")
+                reply = next(t for t in items if t["direction"] == "tx" and t["mid"] == "0011")
+                self.assertEqual(reply["reply_to"], request["seq"])
+                timings = request["timings_ms"]
+                self.assertLessEqual(timings["framed"], timings["dispatch_start"])
+                self.assertLessEqual(timings["dispatch_end"], timings["drained"])
+
+                summary = {item["mid"]: item for item in await state.latency_summary()}
+                self.assertEqual(set(summary), {"0001", "0010", "9999"})
+                self.assertEqual(summary["0010"]["count"], 1)
+                self.assertGreaterEqual(summary["0010"]["stages"]["total"]["max_ms"], summary["0010"]["stages"]["dispatch"]["max_ms"])
+                writer.close()
+
+    async def test_linked_messages_are_reassembled_and_segmented(self) -> None:
+        service, state = await self._service("protocol")
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+        buffer = bytearray()
+
+        async def receive(count: int) -> list:
+            frames = []
+            while len(frames) < count:
+                buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                frames.extend(parse_stream_buffer(buffer))
+            return frames
+
+        def linked(mid: str, *chunks: bytes, numbers: str = "") -> bytes:
+            numbers = numbers or "".join(str(n) for n in range(1, len(chunks) + 1))
+            return b"".join(
+                build_message(mid=mid, data=chunk, message_parts=str(len(chunks)), message_part_number=number).raw
+                for chunk, number in zip(chunks, numbers)
+            )
+
+        writer.write(build_message(mid="0001", revision=7).raw)
+        await receive(1)
+        # MID 0006 asking for MID 0015 rev 2, split between its two fields.
+        writer.write(linked("0006", b"0015", b"002"))
+        reply = (await receive(1))[0]
+        self.assertEqual((reply.mid, reply.header.revision), ("0015", "002"))
+        writer.write(linked("0006", b"0015", b"002", numbers="21"))
+        self.assertEqual([(m.mid, m.data) for m in await receive(1)], [("0004", b"000601")])
+
+        points = [n % 1000 for n in range(40000)]
+        await service.publish_event("tightening", {"trace_points": points})
+        writer.write(build_message(mid="0006", data=b"0900001").raw)
+        parts = await receive(9)
+        self.assertEqual({(m.mid, m.header.message_parts) for m in parts}, {("0900", "9")})
+        self.assertEqual([m.header.message_part_number for m in parts], [str(n) for n in range(1, 10)])
+        data = b"".join(m.data for m in parts)
+        values = state.codecs.decode("0900", 1, data)
+        self.assertEqual(values["sample_count"], 40000)
+        self.assertEqual(values["samples"][-4:], b"\x03\xe6\x03\xe7")
+        self.assertEqual(service.metrics.linked_reassembled.value, 1)
+        self.assertEqual(service.metrics.linked_rejected.value, 1)
+        self.assertEqual(service.metrics.linked_segmented.value, 1)
+        writer.close()
+
+    async def test_pushes_use_the_subscribed_revision(self) -> None:
+        service, state = await self._service("protocol")
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+        buffer = bytearray()
+
+        async def receive(count: int) -> list:
+            frames = []
+            while len(frames) < count:
+                buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                frames.extend(parse_stream_buffer(buffer))
+            return frames
+
+        writer.write(
+            build_message(mid="0001", revision=7).raw
+            + build_message(mid="0014", revision=2).raw
+            + build_message(mid="0060", revision=1).raw
+        )
+        self.assertEqual([m.mid for m in await receive(3)], ["0002", "0005", "0005"])
+        result = await service.publish_event("pset_change", {"mids": ["0015", "0061"]})
+        self.assertEqual(result["pushed_messages"], 2)
+        pushes = {m.mid: m for m in await receive(2)}
+        self.assertEqual({mid: m.header.revision for mid, m in pushes.items()}, {"0015": "002", "0061": "001"})
+        self.assertIn("pset_last_change", state.codecs.decode("0015", 2, pushes["0015"].data))
+        writer.close()
+
+    async def test_link_level_window_queues_and_retransmits(self) -> None:
+        service, state = await self._service("protocol", sim_link_ack_timeout_ms=100, sim_link_max_retransmits=1)
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+        buffer = bytearray()
+
+        async def receive(count: int) -> list:
+            frames = []
+            while len(frames) < count:
+                buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+                frames.extend(parse_stream_buffer(buffer))
+            return frames
+
+        writer.write(build_message(mid="0001", revision=7, sequence_number=1).raw)
+        ack, reply = await receive(2)
+        self.assertEqual((ack.mid, ack.header.sequence_int, reply.mid, reply.header.sequence_int), ("9997", 2, "0002", 1))
+        # MID 0002 is unacknowledged, so the MID 0011 reply waits in the window.
+        writer.write(build_message(mid="0010", sequence_number=2).raw)
+        self.assertEqual([m.mid for m in await receive(1)], ["9997"])
+        session = (await state.session_contexts())[0]
+        self.assertEqual((session.link_window.in_flight, session.link_window.queued), (1, 1))
+
+        writer.write(build_message(mid="9997", data=b"0002", sequence_number=2).raw)
+        released = (await receive(1))[0]
+        self.assertEqual((released.mid, released.header.sequence_int), ("0011", 2))
+        # Left unacknowledged, the frame is re-sent byte for byte once, then the session is dropped.
+        self.assertEqual((await receive(1))[0].raw, released.raw)
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+        self.assertEqual(service.metrics.link_acked.value, 1)
+        self.assertEqual(service.metrics.link_resent_timeout.value, 1)
+        self.assertEqual(service.metrics.link_lost.labels("timeout").value, 1)
+        self.assertEqual(service.metrics.link_ack_rtt.count, 1)
+        tx = [t["mid"] for t in (await state.traffic_since(0))["items"] if t["direction"] == "tx"]
+        self.assertEqual(tx, ["9997", "0002", "9997", "0011", "0011"])
+        writer.close()
+
+    async def test_port_and_session_impairments(self) -> None:
+        service, state = await self._service("protocol")
+        await service.set_port_impairment(SessionRole.CLASSIC, Impairment(fragment_bytes=5, direction="tx"))
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+        buffer = bytearray()
+        writer.write(build_message(mid="0001", revision=7).raw)
+        while not parse_stream_buffer(buffer):
+            buffer.extend(await asyncio.wait_for(reader.read(65536), 5))
+        session = (await state.session_contexts())[0]
+        self.assertEqual(session.impairment.scope, "port")
+
+        # A session impairment overrides the port's: the keepalive never reaches the simulator.
+        await service.set_session_impairment(session.session_id, Impairment(drop_rate=1.0, direction="rx"))
+        writer.write(build_message(mid="9999").raw)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(reader.read(65536), 0.2)
+        self.assertEqual(service.metrics.impaired_frames.labels("rx", "dropped").value, 1)
+        status = await service.impairments_status()
+        self.assertEqual((status["ports"]["classic"]["fragment_bytes"], status["sessions"][session.session_id]["scope"]), (5, "session"))
+
+        self.assertEqual((await service.set_session_impairment(session.session_id, None))["scope"], "port")
+        await service.disconnect_session(session.session_id)
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+        await service.set_port_impairment(SessionRole.CLASSIC, None)
+        self.assertEqual(await service.impairments_status(), {"ports": {}, "sessions": {}})
+        writer.close()
+
+    async def test_keepalive_timeout_follows_the_virtual_clock(self) -> None:
+        virtual = clock.VirtualClock()
+        clock.install(virtual)
+        self.addCleanup(clock.install, clock.Clock())
+        service, state = await self._service("protocol")
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.settings.classic_port)
+        writer.write(build_message(mid="0001", revision=7).raw)
+        await asyncio.wait_for(reader.read(65536), 5)
+        self.assertEqual(len(await state.session_contexts()), 1)
+
+        # Fifteen silent seconds pass in an instant; the watchdog drops the session.
+        virtual.advance(service.settings.sim_keepalive_timeout_sec + 1)
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
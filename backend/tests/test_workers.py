@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.config import Settings
+from app.dispatcher import OpenProtocolDispatcher
+from app.mid_catalog import MidCatalog
+from app.persistence import PersistenceStore
+from app.profiles import ProfileStore
+from app.protocol import build_message, parse_stream_buffer
+from app.state import SimulatorState
+from app.tcp_server import TcpService
+from app.types import OpenProtocolMessage
+from app.workers import ProtocolWorker, WorkerPool
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.buffer = bytearray()
+        self.pending: list[OpenProtocolMessage] = []
+
+    async def request(self, mid: str, data: bytes = b"", revision: int = 1) -> OpenProtocolMessage:
+        self.writer.write(build_message(mid=mid, data=data, revision=revision).raw)
+        await self.writer.drain()
+        return await self.receive()
+
+    async def receive(self) -> OpenProtocolMessage:
+        while not self.pending:
+            self.pending.extend(parse_stream_buffer(self.buffer))
+            if not self.pending:
+                self.buffer.extend(await asyncio.wait_for(self.reader.read(4096), 5))
+        return self.pending.pop(0)
+
+
+class WorkerPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        root = Path(__file__).resolve().parent.parent
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = Settings(
+            host="127.0.0.1",
+            classic_port=_free_port(),
+            actor_port=_free_port(),
+            viewer_port=_free_port(),
+            sim_workers=2,
+            sim_ipc_path=str(Path(self.tmp.name) / "ipc.sock"),
+        )
+        catalog = MidCatalog.from_file(root / "data" / "mid_catalog.json")
+        profiles = ProfileStore.from_directory(root / "data" / "profiles", active="atlas_pf")
+        self.state = SimulatorState(
+            catalog=catalog,
+            profiles=profiles,
+            persistence=PersistenceStore(enabled=False, db_path=""),
+            keepalive_timeout_sec=15,
+            inactivity_hint_sec=10,
+            max_sessions=10,
+        )
+        dispatcher = OpenProtocolDispatcher(self.settings, catalog, profiles, self.state)
+        self.service = TcpService(self.settings, self.state, dispatcher)
+        # Run both workers on the test loop instead of spawning processes; the
+        # IPC path and SO_REUSEPORT listeners are the same as in production.
+        self.pool = WorkerPool(self.service)
+        await self.pool.serve()
+        self.worker_tasks = [
+            asyncio.create_task(ProtocolWorker(self.settings, self.pool.path, index).run()) for index in range(2)
+        ]
+        self.assertTrue(await self.pool.wait_ready(2, timeout=5))
+        self.clients: list[Client] = []
+
+    async def asyncTearDown(self) -> None:
+        for client in self.clients:
+            client.writer.close()
+        await self.pool.stop()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.tmp.cleanup()
+
+    async def _connect(self, port: int) -> Client:
+        client = Client(*await asyncio.open_connection("127.0.0.1", port))
+        self.clients.append(client)
+        return client
+
+    async def test_actor_exclusivity_and_fanout_across_workers(self) -> None:
+        actor = await self._connect(self.settings.actor_port)
+        self.assertEqual((await actor.request("0001", revision=7)).mid, "0002")
+
+        second_actor = await self._connect(self.settings.actor_port)
+        reply = await second_actor.request("0001", revision=7)
+        self.assertEqual((reply.mid, reply.data), ("0004", b"000135"))
+
+        classic = await self._connect(self.settings.classic_port)
+        await classic.request("0001", revision=7)
+        reply = await classic.request("0042")
+        self.assertEqual((reply.mid, reply.data), ("0004", b"004292"))
+        self.assertEqual((await classic.request("0060")).mid, "0005")
+
+        result = await self.service.publish_event("tightening", {"torque_nm": 12.5})
+        self.assertEqual(result["pushed_messages"], 1)
+        self.assertEqual((await classic.receive()).mid, "0061")
+
+        status = self.pool.status()
+        self.assertEqual(sum(worker["sessions"] for worker in status), 3)
+
+    async def test_a_blocked_session_does_not_stall_the_others(self) -> None:
+        # With one worker left every connection shares its channel to the owner.
+        self.worker_tasks[1].cancel()
+        await asyncio.gather(self.worker_tasks[1], return_exceptions=True)
+        for _ in range(100):
+            if len(self.pool.status()) == 1:
+                break
+            await asyncio.sleep(0.01)
+        blocked, release = await self._connect(self.settings.classic_port), asyncio.Event()
+        await blocked.request("0001", revision=7)
+        handle_messages = self.service.handle_messages
+
+        async def stalling(session, incoming, *args, **kwargs) -> None:
+            if incoming[0].mid == "0010":
+                await release.wait()
+            await handle_messages(session, incoming, *args, **kwargs)
+
+        self.service.handle_messages = stalling
+        blocked.writer.write(build_message(mid="0010").raw)
+        await blocked.writer.drain()
+        other = await self._connect(self.settings.classic_port)
+        self.assertEqual((await other.request("0001", revision=7)).mid, "0002")
+        release.set()
+        self.assertEqual((await blocked.receive()).mid, "0011")
+
+    async def _traffic(self, count: int) -> list[tuple[str, str]]:
+        for _ in range(100):
+            items = (await self.state.traffic_since(0))["items"]
+            if len(items) >= count:
+                break
+            await asyncio.sleep(0.02)
+        return [(t["direction"], t["mid"]) for t in items]
+
+    async def test_keepalives_are_answered_in_the_worker_in_order(self) -> None:
+        relayed: list[str] = []
+        handle_messages = self.service.handle_messages
+
+        async def recording(session, incoming, *args, **kwargs) -> None:
+            relayed.extend(m.mid for m in incoming)
+            await handle_messages(session, incoming, *args, **kwargs)
+
+        self.service.handle_messages = recording
+        client = await self._connect(self.settings.classic_port)
+        # Before MID 0001 keepalives go to the owner and are rejected.
+        reply = await client.request("9999")
+        self.assertEqual((reply.mid, reply.data[4:6]), ("0004", b"97"))
+        await client.request("0001", revision=7)
+
+        # The worker answers the keepalives at once but holds the replies behind MID 0011.
+        keepalive = build_message(mid="9999").raw
+        client.writer.write(build_message(mid="0010").raw + keepalive + keepalive)
+        self.assertEqual([(await client.receive()).mid for _ in range(3)], ["0011", "9999", "9999"])
+        self.assertEqual(relayed, ["9999", "0001", "0010"])
+
+        traffic = await self._traffic(10)
+        self.assertEqual(traffic[-6:], [("rx", "0010"), ("tx", "0011"), ("rx", "9999"), ("tx", "9999"), ("rx", "9999"), ("tx", "9999")])
+        counter = self.service.metrics.frames.labels("rx", "classic", "9999")
+        for _ in range(100):
+            if counter.value == 3:
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(counter.value, 3)
+
+    async def test_link_level_sequencing_runs_in_the_worker(self) -> None:
+        client = await self._connect(self.settings.classic_port)
+        client.writer.write(build_message(mid="0001", revision=7, sequence_number=1).raw)
+        ack, reply = await client.receive(), await client.receive()
+        self.assertEqual((ack.mid, ack.header.sequence_int, reply.mid, reply.header.sequence_int), ("9997", 2, "0002", 1))
+        # MID 0002 is unacknowledged, so the MID 0011 reply waits in the worker's window.
+        client.writer.write(build_message(mid="0010", sequence_number=2).raw)
+        self.assertEqual((await client.receive()).mid, "9997")
+        client.writer.write(build_message(mid="9997", data=b"0002", sequence_number=2).raw)
+        released = await client.receive()
+        self.assertEqual((released.mid, released.header.sequence_int), ("0011", 2))
+        # An out-of-sequence frame is NACKed without reaching the owner.
+        client.writer.write(build_message(mid="9999", sequence_number=7).raw)
+        nack = await client.receive()
+        self.assertEqual((nack.mid, nack.header.sequence_int, nack.data), ("9998", 3, b"999903"))
+
+        traffic = await self._traffic(10)
+        self.assertEqual([mid for direction, mid in traffic if direction == "tx"], ["9997", "0002", "9997", "0011", "9998"])
+        session = (await self.state.session_contexts())[0]
+        self.assertIsNone(session.link_window)
+
+    async def test_disconnect_unregisters_session(self) -> None:
+        client = await self._connect(self.settings.classic_port)
+        await client.request("0001", revision=7)
+        self.assertEqual(len(await self.state.sessions()), 1)
+        client.writer.close()
+        for _ in range(50):
+            if not await self.state.sessions():
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(await self.state.sessions(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 
 const API_BASE = "/api/v1";
+const TRAFFIC_ROWS = 50;
 
 async function fetchJson(path, options = {}) {
   const res = await fetch(`${API_BASE}${path}`, {
@@ -40,19 +41,34 @@ export default function App() {
   const [scenarioName, setScenarioName] = useState("tightening_burst");
   const [scenarioList, setScenarioList] = useState([]);
   const [error, setError] = useState("");
+  const trafficCursor = useRef(null);
 
   const summary = useMemo(() => {
     if (!health) return "Loading...";
     return `Profile ${health.profile} | MIDs ${health.mid_count} | Sessions ${health.sessions}`;
   }, [health]);
 
+  async function fetchTraffic() {
+    if (trafficCursor.current === null) {
+      const items = await fetchJson(`/traffic?limit=${TRAFFIC_ROWS}`);
+      trafficCursor.current = items.length ? items[items.length - 1].seq : 0;
+      setTraffic(items);
+      return;
+    }
+    const page = await fetchJson(`/traffic?since=${trafficCursor.current}&limit=${TRAFFIC_ROWS}`);
+    trafficCursor.current = page.cursor;
+    if (page.items.length) {
+      setTraffic((prev) => prev.concat(page.items).slice(-TRAFFIC_ROWS));
+    }
+  }
+
   async function refresh() {
     try {
-      const [h, p, s, t, st, c, sc] = await Promise.all([
+      const [h, p, s, , st, c, sc] = await Promise.all([
         fetchJson("/health"),
         fetchJson("/profiles"),
         fetchJson("/sessions"),
-        fetchJson("/traffic?limit=50"),
+        fetchTraffic(),
         fetchJson("/state"),
         fetchJson("/capabilities"),
         fetchJson("/scenarios")
@@ -60,7 +76,6 @@ export default function App() {
       setHealth(h);
       setProfiles(p);
       setSessions(s);
-      setTraffic(t);
       setStateDump(st);
       setCapabilities(c.items || []);
       setScenarioList(sc.scenarios || []);
@@ -227,8 +242,8 @@ export default function App() {
               </tr>
             </thead>
             <tbody>
-              {traffic.map((t, idx) => (
-                <tr key={`${t.timestamp}-${idx}`}>
+              {traffic.map((t) => (
+                <tr key={t.seq}>
                   <td>{t.timestamp?.slice(11, 19)}</td>
                   <td>{t.direction}</td>
                   <td>{t.mid}</td>
@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
-"""Extract Open Protocol MID catalog and revision hints from the PDF spec text."""
+"""Extract Open Protocol MID catalog, revision hints and data field layouts from the PDF spec."""
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
 import re
-import subprocess
+import time
+import zlib
 from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable
 
 
-MID_INDEX_RE = re.compile(r"^MID\s+(\d{4})\s+(.+?)\s*\.{3,}\d+\s*$")
+# Index entries, with or without the section number glued to the front ("5.2.1MID 0001 ...").
+MID_INDEX_RE = re.compile(r"^(?:\d+(?:\.\d+)*\s*)?MID\s+(\d{4})\s+(.+?)\s*\.{3,}\s*\d*\s*$")
 MID_IN_LINE_RE = re.compile(r"\bMID\s+(\d{4})\b")
 
 # Captures:
@@ -26,6 +31,36 @@ REV_LIST_RE = re.compile(r"\brevision(?:s)?\s+([0-9,\sand]+)", re.IGNORECASE)
 REV_ONLY_RE = re.compile(r"\brevision(?:s)?\s+(\d{1,3})\b", re.IGNORECASE)
 
 
+PDF_OBJECT_RE = re.compile(rb"(\d+)\s+0\s+obj(.*?)endobj", re.S)
+PDF_REF_RE = re.compile(rb"(\d+)\s+0\s+R")
+PDF_TEXT_BLOCK_RE = re.compile(rb"BT(.*?)ET", re.S)
+PDF_SHOW_TEXT_RE = re.compile(rb"\[(.*?)\]\s*TJ|\(((?:\\.|[^\\)])*)\)\s*Tj", re.S)
+PDF_STRING_RE = re.compile(rb"\(((?:\\.|[^\\)])*)\)")
+PDF_ESCAPE_RE = re.compile(rb"\\([nrtbf()\\]|[0-7]{1,3})")
+PDF_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+# Field tables: "Table 12 MID 0002 Revision 1", one table per revision or per set of additions.
+TABLE_RE = re.compile(r"^Table\s+\d+\s+MID\s*(\d{3,4})\b(.*)$")
+BYTE_RANGE_RE = re.compile(r"^(\d{2,4})(?:\s*-\s*(\d{2,4}))?$")
+# A byte range whose end depends on the data ("24-(23+Npset*3)", "171-"): the rest of the payload is variable.
+VARIABLE_RANGE_RE = re.compile(r"^\d{2,4}\s*-\s*(?:[(\w]*[A-Za-z(]|$)")
+# Cells of a "Revision" column ("2-3", "3", "1, 2 and 4"), which some tables put between name and bytes.
+REVISION_CELL_RE = re.compile(r"^\d{1,3}(?:\s*(?:-|,|and)\s*\d{1,3})*$")
+# Next section or table title; wrapped sentences such as "Table 176 and add ..." do not end a table.
+TABLE_END_RE = re.compile(r"^(\d+(\.\d+)+\s*MID|Table\s+\d+\s+[A-Z])")
+# Widths stated in a description win over the byte range, which has typos in places.
+NUMBER_WORDS = {
+    word: n
+    for n, word in enumerate(("one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"), start=1)
+}
+STATED_WIDTH_RE = re.compile(
+    r"\b(?:(\d+) (?:bytes? long|ASCII (?:characters|digits))|(" + "|".join(NUMBER_WORDS) + r") bytes? long)", re.IGNORECASE
+)
+PAGE_FURNITURE_RE = re.compile(r"^(All messages|Contents|\d+\.\d+\.\d+\s*\d+ \(\d+\)|\d+ \(\d+\)\s*\d+\.\d+\.\d+|Parameter|Parameter ID|Byte|Value)$")
+# Payload data starts after the 20-byte header.
+DATA_START = 21
+
+
 @dataclass
 class MidMeta:
     mid: str
@@ -39,14 +74,78 @@ class MidMeta:
     profile_overrides: dict
 
 
-def _run_pdftotext(pdf_path: Path) -> str:
-    result = subprocess.run(
-        ["pdftotext", str(pdf_path), "-"],
-        check=True,
-        capture_output=True,
-        text=True,
-    )
-    return result.stdout
+def _pdf_objects(pdf: bytes) -> dict[int, bytes]:
+    return {int(m.group(1)): m.group(2) for m in PDF_OBJECT_RE.finditer(pdf)}
+
+
+def _pdf_stream(body: bytes) -> bytes:
+    head, _, rest = body.partition(b"stream")
+    data = rest.lstrip(b"\r\n")
+    data = data[: data.rfind(b"endstream")]
+    return zlib.decompress(data) if b"/FlateDecode" in head else data
+
+
+def _pdf_page_contents(pdf: bytes) -> list[tuple[bytes, ...]]:
+    """Content stream objects of every page, in page-tree order."""
+    objects = _pdf_objects(pdf)
+    roots = [num for num, body in objects.items() if re.search(rb"/Type\s*/Pages\b", body) and b"/Parent" not in body]
+    pages: list[int] = []
+
+    def walk(num: int) -> None:
+        body = objects.get(num, b"")
+        kids = re.search(rb"/Kids\s*\[(.*?)\]", body, re.S)
+        if re.search(rb"/Type\s*/Pages\b", body) and kids:
+            for ref in PDF_REF_RE.findall(kids.group(1)):
+                walk(int(ref))
+        elif re.search(rb"/Type\s*/Page\b", body):
+            pages.append(num)
+
+    for root in roots:
+        walk(root)
+    contents = []
+    for num in pages:
+        ref = re.search(rb"/Contents\s*(\[[^\]]*\]|\d+\s+0\s+R)", objects[num])
+        refs = PDF_REF_RE.findall(ref.group(1)) if ref else []
+        contents.append(tuple(objects[int(r)] for r in refs if int(r) in objects))
+    return contents
+
+
+def _unescape(raw: bytes) -> bytes:
+    def sub(m: re.Match[bytes]) -> bytes:
+        token = m.group(1)
+        if token[:1].isdigit():
+            return bytes([int(token, 8) & 0xFF])
+        return PDF_ESCAPES.get(token, token)
+
+    return PDF_ESCAPE_RE.sub(sub, raw)
+
+
+def _page_text(streams: tuple[bytes, ...]) -> str:
+    """Text of one page, one line per text object (``BT``...``ET``)."""
+    lines = []
+    for stream in streams:
+        for block in PDF_TEXT_BLOCK_RE.findall(_pdf_stream(stream)):
+            parts: list[bytes] = []
+            for m in PDF_SHOW_TEXT_RE.finditer(block):
+                if m.group(1) is not None:
+                    parts.extend(PDF_STRING_RE.findall(m.group(1)))
+                else:
+                    parts.append(m.group(2))
+            lines.append(_unescape(b"".join(parts)).decode("latin-1"))
+    return "\n".join(lines)
+
+
+def load_page_texts(spec_pdf: Path, cache_dir: Path | None, pool: Executor) -> list[str]:
+    """Page texts of ``spec_pdf``, cached under ``cache_dir`` by the SHA-256 of the file."""
+    pdf = spec_pdf.read_bytes()
+    cache = cache_dir / f"{hashlib.sha256(pdf).hexdigest()}.json" if cache_dir else None
+    if cache is not None and cache.exists():
+        return json.loads(cache.read_text(encoding="utf-8"))
+    pages = list(pool.map(_page_text, _pdf_page_contents(pdf), chunksize=16))
+    if cache is not None:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        cache.write_text(json.dumps(pages), encoding="utf-8")
+    return pages
 
 
 def _normalize_name(raw_name: str) -> str:
@@ -134,6 +233,10 @@ def _parse_revision_tokens(token_text: str) -> list[int]:
 def _extract_revisions(lines: Iterable[str]) -> dict[str, set[int]]:
     revisions: dict[str, set[int]] = defaultdict(set)
     for line in lines:
+        # In "Answer: MID 0005 Command accepted or MID 0004 Command error, ..." the
+        # revision notes belong to the error alternative.
+        if line.startswith("Answer:"):
+            line = line.split(" or ", 1)[-1]
         mids = MID_IN_LINE_RE.findall(line)
         if not mids:
             continue
@@ -166,9 +269,245 @@ def _extract_revisions(lines: Iterable[str]) -> dict[str, set[int]]:
     return revisions
 
 
-def build_catalog(spec_pdf: Path) -> list[MidMeta]:
-    text = _run_pdftotext(spec_pdf)
-    lines = [line.strip() for line in text.splitlines()]
+@dataclass
+class FieldRow:
+    begin: int
+    end: int
+    pid: str | None
+    name: str
+    description: str
+
+
+def _field_tables(lines: list[str]) -> dict[str, list[tuple[str, list[str]]]]:
+    """Body lines of every field table, per MID in document order."""
+    tables: dict[str, list[tuple[str, list[str]]]] = defaultdict(list)
+    i = 0
+    while i < len(lines):
+        m = TABLE_RE.match(lines[i])
+        # Index entries of the list of tables end in dot leaders.
+        if not m or "...." in lines[i]:
+            i += 1
+            continue
+        body = []
+        i += 1
+        while i < len(lines) and not TABLE_END_RE.match(lines[i]):
+            if lines[i] and not PAGE_FURNITURE_RE.match(lines[i]):
+                body.append(lines[i])
+            i += 1
+        tables[m.group(1).zfill(4)].append((m.group(2).strip(), body))
+    return tables
+
+
+def _pid_row_at(body: list[str], k: int) -> bool:
+    """Whether the byte range at ``body[k]`` covers a two-digit parameter id (``"21-22"``, ``"01"``)."""
+    m = BYTE_RANGE_RE.match(body[k])
+    end = int(m.group(2) or m.group(1))
+    return (
+        end - int(m.group(1)) == 1
+        and k + 1 < len(body)
+        and re.fullmatch(r"\d{2}", body[k + 1]) is not None
+        and int(body[k + 1]) != end + 1
+    )
+
+
+def _continues(body: list[str], k: int, cursor: int) -> bool:
+    """Whether the byte range at ``body[k]`` starts the row after ``cursor``; parameter id rows may be off by one."""
+    start = int(BYTE_RANGE_RE.match(body[k]).group(1))
+    return start == cursor or (abs(start - cursor) == 1 and _pid_row_at(body, k))
+
+
+def _is_name(line: str) -> bool:
+    return len(line) < 60 and not line.endswith(".") and not BYTE_RANGE_RE.match(line) and not REVISION_CELL_RE.match(line)
+
+
+def _name_before(lines: list[str]) -> str | None:
+    """The field name ending ``lines``, past any revision cells; ``None`` if the last line is not one."""
+    k = len(lines) - 1
+    while k >= 0 and REVISION_CELL_RE.match(lines[k]):
+        k -= 1
+    return lines[k] if k >= 0 and _is_name(lines[k]) else None
+
+
+def _table_rows(body: list[str]) -> tuple[list[FieldRow], bool]:
+    """Contiguous field rows of a table and whether a data-dependent range follows them.
+
+    Rows with a parameter id read ``bytes, id, name, bytes, description``, or
+    ``name, bytes, id, bytes, description`` where the name cell sits higher up;
+    rows without one read ``name, bytes, description``. The spec repeats a
+    parameter id in places ("03" for the fourth identifier of MID 0152); such an
+    id is renumbered after the previous one. A row whose name is not found has
+    an empty one.
+    """
+    rows: list[FieldRow] = []
+    cursor: int | None = None
+    name: list[str] = []
+    # A name ending the previous description, for a parameter id row that has none of its own.
+    above: str | None = None
+    k = 0
+    while k < len(body):
+        m = BYTE_RANGE_RE.match(body[k])
+        if not m or (cursor is not None and not _continues(body, k, cursor)):
+            k += 1
+            continue
+        begin = int(m.group(1))
+        end = int(m.group(2) or begin)
+        if not rows:
+            first = body[k - 1].rstrip(".") if k > 0 and not REVISION_CELL_RE.match(body[k - 1]) else _name_before(body[:k])
+            name, above = [], first
+        pid = None
+        if _pid_row_at(body, k):
+            pid = body[k + 1]
+            if rows and rows[-1].pid and pid in {row.pid for row in rows}:
+                pid = f"{int(rows[-1].pid) + 1:02d}"
+            k += 2
+            name = []
+            while k < len(body) and not BYTE_RANGE_RE.match(body[k]):
+                name.append(body[k])
+                k += 1
+            if k >= len(body):
+                break
+            m = BYTE_RANGE_RE.match(body[k])
+            end = int(m.group(2) or m.group(1))
+            if end < begin + 2:
+                break
+        if not name and above:
+            name = [above]
+        k += 1
+        description = []
+        while k < len(body):
+            if (BYTE_RANGE_RE.match(body[k]) and _continues(body, k, end + 1)) or VARIABLE_RANGE_RE.match(body[k]):
+                break
+            description.append(body[k])
+            k += 1
+        above = _name_before(description)
+        if not name and above:
+            # The name cell can also sit below the description ("VIN number" of MID 0052 revision 1).
+            name, above = [above], None
+        field_name, name = " ".join(name), []
+        if above and k < len(body) and (VARIABLE_RANGE_RE.match(body[k]) or not _pid_row_at(body, k)):
+            while description[-1] != above:
+                description.pop()
+            name = [description.pop()]
+        rows.append(FieldRow(begin, end, pid, field_name, " ".join(description)))
+        cursor = end + 1
+        if k < len(body) and VARIABLE_RANGE_RE.match(body[k]):
+            return rows, True
+    return rows, False
+
+
+def _revision_numbers(text: str) -> set[int]:
+    revisions: set[int] = set()
+    for lo, hi, single in re.findall(r"(\d{1,3})\s*-\s*(\d{1,3})|(\d{1,3})", text):
+        if single:
+            revisions.add(int(single))
+        else:
+            revisions.update(range(int(lo), int(hi) + 1))
+    return {r for r in revisions if r > 0}
+
+
+def _table_revisions(title: str) -> tuple[list[int], int | None, set[int]]:
+    """Revisions a table title covers, the revision it continues, and revisions it says carry no data."""
+    empty = re.search(r",?\s*no data.*$", title, re.IGNORECASE)
+    text = title[: empty.start()] if empty else title
+    base = None
+    cont = re.search(r"continuation of revision\s+(\d+)", text, re.IGNORECASE)
+    if cont:
+        base = int(cont.group(1))
+        text = text[: cont.start()]
+    no_data = _revision_numbers(empty.group(0)) if empty else set()
+    start = re.search(r"\brev(?:ision)?s?\b", text, re.IGNORECASE)
+    if not start:
+        return ([] if "extra data" in text.lower() else [1]), base, no_data
+    return sorted(_revision_numbers(text[start.start() :])), base, no_data
+
+
+def _snake(name: str, used: set[str]) -> str:
+    base = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "field"
+    if base[0].isdigit():
+        base = f"field_{base}"
+    base = base[:48].rstrip("_")
+    candidate, n = base, 2
+    while candidate in used:
+        candidate, n = f"{base}_{n}", n + 1
+    used.add(candidate)
+    return candidate
+
+
+def _schema_field(row: FieldRow, used: set[str]) -> dict:
+    width = row.end - row.begin + 1 - (2 if row.pid else 0)
+    stated = STATED_WIDTH_RE.search(row.description)
+    if stated:
+        token = (stated.group(1) or stated.group(2)).lower()
+        width = NUMBER_WORDS[token] if token in NUMBER_WORDS else int(token) or width
+    text = row.description.lower()
+    numeric = "digit" in text or "multiplied by" in text or "sent as an integer" in text
+    field = {"pid": row.pid, "name": _snake(row.name, used), "length": width, "type": "num" if numeric else "str"}
+    scale = re.search(r"multiplied by (10+)\b", text)
+    if numeric and scale:
+        field["scale"] = int(scale.group(1))
+    return field
+
+
+def mid_payload_schema(mid: str, tables: list[tuple[str, list[str]]]) -> dict[str, list[dict]]:
+    """Per-revision field layouts of one MID, in the catalog ``payload_schema`` format.
+
+    Tables listing a full revision start at the first data byte; tables of
+    additions start further in and extend the latest earlier revision (or the
+    one they say they continue). Rows stop at the first gap in the byte
+    ranges; a data-dependent range ends the layout with a rest-of-payload field.
+    Revisions a title says carry no data get an empty layout. A layout with an
+    unnamed field or a repeated parameter id raises ``ValueError``.
+    """
+    layouts: dict[int, list[FieldRow]] = {}
+    variable: dict[int, bool] = {}
+    for title, body in tables:
+        revisions, base, no_data = _table_revisions(title)
+        for revision in no_data:
+            layouts.setdefault(revision, [])
+            variable.setdefault(revision, False)
+        rows, tail = _table_rows(body)
+        if not revisions or not rows:
+            continue
+        if rows[0].begin != DATA_START:
+            earlier = [r for r in layouts if r < revisions[0]]
+            base = base if base in layouts else (max(earlier) if earlier else None)
+            if base is None or variable[base] or not layouts[base]:
+                continue
+            prefix = [row for row in layouts[base] if row.end < rows[0].begin]
+            if not prefix or prefix[-1].end + 1 != rows[0].begin:
+                continue
+            rows = prefix + rows
+        for revision in revisions:
+            layouts[revision] = rows
+            variable[revision] = tail
+    schema: dict[str, list[dict]] = {}
+    for revision in sorted(layouts):
+        # A layout the tables were misread for fails the extraction rather than shipping placeholders.
+        unnamed = [row for row in layouts[revision] if not row.name]
+        if unnamed:
+            raise ValueError(f"MID {mid} revision {revision}: no field name for bytes {unnamed[0].begin}-{unnamed[0].end}")
+        pids = [row.pid for row in layouts[revision] if row.pid]
+        if len(set(pids)) != len(pids):
+            raise ValueError(f"MID {mid} revision {revision}: repeated parameter ids {pids}")
+        used: set[str] = set()
+        fields = [_schema_field(row, used) for row in layouts[revision]]
+        if variable[revision]:
+            fields.append({"pid": None, "name": _snake("variable data", used), "length": 0, "type": "str"})
+        schema[str(revision)] = fields
+    return schema
+
+
+def _mid_schema_job(job: tuple[str, list[tuple[str, list[str]]]]) -> tuple[str, dict[str, list[dict]]]:
+    mid, tables = job
+    return mid, mid_payload_schema(mid, tables)
+
+
+def build_catalog(spec_pdf: Path, cache_dir: Path | None = None, jobs: int | None = None) -> list[MidMeta]:
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pages = load_page_texts(spec_pdf, cache_dir, pool)
+        lines = [line.strip() for page in pages for line in page.splitlines()]
+        tables = _field_tables(lines)
+        schemas = dict(pool.map(_mid_schema_job, tables.items(), chunksize=8))
     known_mids = sorted({m.group(1) for m in (re.match(r"^MID\s+(\d{4})\b", line) for line in lines) if m})
 
     names: dict[str, str] = {}
@@ -199,7 +538,7 @@ def build_catalog(spec_pdf: Path) -> list[MidMeta]:
                 category=category,
                 direction=direction,
                 supported_revisions=revs,
-                payload_schema={},
+                payload_schema=schemas.get(mid, {}),
                 ack_strategy=_infer_ack_strategy(category),
                 error_rules=[],
                 profile_overrides={},
@@ -220,17 +559,29 @@ def main() -> None:
         default="backend/data/mid_catalog.json",
         help="Output catalog path",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache/spec_text",
+        help="Directory for page text cached by PDF hash",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Extract page text even if it is cached")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes")
     args = parser.parse_args()
 
     spec_pdf = Path(args.spec_pdf)
     output = Path(args.output)
 
-    catalog = build_catalog(spec_pdf)
+    started = time.perf_counter()
+    catalog = build_catalog(spec_pdf, None if args.no_cache else Path(args.cache_dir), args.jobs)
     output.parent.mkdir(parents=True, exist_ok=True)
 
     payload = [m.__dict__ for m in catalog]
     output.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
-    print(f"Wrote {len(payload)} MID entries to {output}")
+    with_schema = sum(1 for m in catalog if m.payload_schema)
+    print(
+        f"Wrote {len(payload)} MID entries ({with_schema} with payload schemas) to {output} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
 
 
 if __name__ == "__main__":